@@ -0,0 +1,233 @@
+#importer/async_engine.py
+
+from importer.engine import *
+from pymongo import AsyncMongoClient
+import asyncio
+
+PARSED = "parsed"
+
+
+class AsyncEngine(Engine):
+    """
+    Importer Engine variant overlapping CSV parsing, document building and MongoDB writes with asyncio.
+    """
+
+    def __init__(self, config):
+        """
+        Initialize the async engine, queues are created for each run.
+        """
+        super().__init__(config)
+        self.aclient = None
+        self.adb = None
+        self.queues = {}
+        self.in_flight = {}
+        self.async_writers = {}
+        self.count_rows = 0
+        self.monitor_interval = 5
+
+
+    def connect_async(self):
+        """
+        Get the database of PyMongo's async client used by the writer tasks.
+        """
+        self.aclient = AsyncMongoClient(self.get_cnxstr(), **self.get_client_options())
+        self.adb = self.aclient[self.cfg[DBNAME]]
+        return self.adb
+
+
+    def queue_depths(self):
+        """
+        Get the number of items waiting in each pipeline queue.
+        """
+        return {name: queue.qsize() for name, queue in self.queues.items()}
+
+
+    def get_pipeline_state(self):
+        """
+        Get a printable state of queues and in flight writes, to tune concurrency.
+        """
+        depths = self.queue_depths()
+        state = [f"{PARSED} queue {depths.pop(PARSED, 0)}/{self.cfg[QUEUE_SIZE]}"]
+        for name, depth in depths.items():
+            state.append(f"{name} queue {depth}/{self.cfg[QUEUE_SIZE]} ({self.in_flight[name]} in flight)")
+        return ", ".join(state)
+
+
+    def next_clean_chunk(self, chunks, count_chunks):
+        """
+        Parse, clean and deduplicate the next chunk, run in a thread by the producer.
+        """
+        chunk = next(chunks, None)
+        if chunk is None:
+            return None
+        if not count_chunks and not self.check_columns(chunk):
+            handle_critical("End of migration due to wrong or empty data source")
+        self.log.info(f"Chunk {count_chunks + 1} : rows {chunk.index[0]} to {chunk.index[-1]}")
+        self.df = chunk
+        self.clean_df()
+        self.make_unic_df()
+        count_seen = self.mark_seen_keys()
+        if count_seen:
+            self.log.warning(f"Duplicates detected with previous chunks : {count_seen} rows, only latest is retained.")
+        return self.df, count_seen
+
+
+    async def produce(self, source):
+        """
+        Producer stage : parse and clean chunks, blocks when the parsed queue is full.
+        """
+        chunks = self.iter_chunks(source, self.cfg[CHUNK_SIZE] or DFT_CHUNK_SIZE)
+        count_chunks = 0
+        while (item := await asyncio.to_thread(self.next_clean_chunk, chunks, count_chunks)) is not None:
+            count_chunks += 1
+            await self.queues[PARSED].put(item)
+        await self.queues[PARSED].put(None)
+
+
+    async def build(self):
+        """
+        Building stage : turn cleaned chunks into batches of documents for each collection.
+        """
+        pending = None
+        while (item := await self.queues[PARSED].get()) is not None:
+            df, count_seen = item
+            if count_seen:
+                # older versions of the duplicated rows must be written first
+                await self.drain()
+            if pending is not None:
+                await self.apply_views(pending)
+            jsondocs, pks = await asyncio.to_thread(self.fm.get_docs, df)
+            for document_name, documents in jsondocs.items():
+                documents, doc_pks = await asyncio.to_thread(self.check_documents, document_name, documents, pks, df)
+                documents, doc_pks, fingerprints = await asyncio.to_thread(self.select_changed, document_name, documents, doc_pks)
+                start = 0
+                while start < len(documents):
+                    # batch size of the collection, adapted by its controller
+                    end = start + self.async_writers[document_name].batch_size
+                    await self.queues[document_name].put((documents[start:end], doc_pks[start:end], fingerprints[start:end]))
+                    start = end
+            self.count_rows += len(df)
+            pending = df if self.views is not None else None
+
+        if pending is not None:
+            await self.apply_views(pending)
+        for document_name in self.async_writers:
+            for _ in range(self.cfg[WRITERS]):
+                await self.queues[document_name].put(None)
+
+
+    async def drain(self):
+        """
+        Wait until every queued batch has been written.
+        """
+        for document_name in self.async_writers:
+            await self.queues[document_name].join()
+
+
+    async def apply_views(self, df):
+        """
+        Apply the rows of a chunk to the summary views once its documents are written.
+        The producer keeps parsing the next chunks meanwhile.
+        """
+        await self.drain()
+        await asyncio.to_thread(self.update_views, df)
+
+
+    def pop_unwritten(self):
+        """
+        Get and reset the _id of the documents not written since the last call, by collection.
+        """
+        for document_name, writer in self.async_writers.items():
+            self.unwritten.setdefault(document_name, set()).update(writer.failed_ids)
+            writer.failed_ids.clear()
+        return super().pop_unwritten()
+
+
+    async def write(self, document_name):
+        """
+        Writer task : send the batches of a collection until the end marker.
+        """
+        queue = self.queues[document_name]
+        writer = self.async_writers[document_name]
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                documents, pks, fingerprints = item
+                self.progress.update(document_name, len(documents))
+                if self.cfg[TRACE_ONLY]:
+                    writer.stats[SKIPPED] += len(documents)
+                    continue
+                self.in_flight[document_name] += 1
+                try:
+                    await writer.send(documents, pks, fingerprints)
+                finally:
+                    self.in_flight[document_name] -= 1
+            finally:
+                queue.task_done()
+
+
+    async def monitor(self):
+        """
+        Log the pipeline state periodically.
+        """
+        while True:
+            await asyncio.sleep(self.monitor_interval)
+            self.log.info(f"Pipeline : {self.get_pipeline_state()}")
+
+
+    async def import_async(self, source):
+        """
+        Transform and load a CSV file into MongoDB, stages connected by bounded queues.
+        """
+        self.log.info(f"Execution options - start: {self.cfg[START]}, limit: {self.cfg[LIMIT]}, chunk size: {self.cfg[CHUNK_SIZE] or DFT_CHUNK_SIZE}, batch size: {self.cfg[BATCH_SIZE]}, delta: {self.cfg[DELTA_MODE]}, writers: {self.cfg[WRITERS]}, queue size: {self.cfg[QUEUE_SIZE]}, TRACE_ONLY: {self.cfg[TRACE_ONLY]}")
+        if not os.path.exists(source):
+            handle_critical(f"DF loader : CSV {source} not found")
+        conflicts = self.cfg.get_async_conflicts()
+        if conflicts:
+            handle_critical(f"Not available in async mode : {', '.join(conflicts)}, use WRITERS for concurrency and a chunked run to resume")
+
+        self.connect_db()
+        self.open_manifest()
+        self.open_reject_sink()
+        self.initialize_db()
+        self.open_views()
+        if not self.cfg[TRACE_ONLY]:
+            self.connect_async()
+
+        self.seen_keys = set()
+        self.progress.start()
+        self.count_rows = 0
+        self.queues = {PARSED: asyncio.Queue(self.cfg[QUEUE_SIZE])}
+        for document_name in self.fm.get_masterdoc_list():
+            self.queues[document_name] = asyncio.Queue(self.cfg[QUEUE_SIZE])
+            self.in_flight[document_name] = 0
+            collection = self.adb.get_collection(document_name, write_concern=self.get_write_concern()) if self.adb is not None else None
+            batch_size = self.cfg[BATCH_SIZE] or DFT_CHUNK_SIZE
+            self.async_writers[document_name] = AsyncBulkWriter(collection, batch_size, ordered=self.cfg[BULK_ORDERED],
+                                                                stats=self.stats.setdefault(document_name, new_stats()),
+                                                                manifest=self.manifest, metrics=self.metrics,
+                                                                controller=self.get_controller(document_name, batch_size), failures=self.failures)
+
+        self.log.info(STARS)
+        self.log.info(f"Migration start, async pipeline on {source}.")
+        monitor = asyncio.create_task(self.monitor())
+        try:
+            async with asyncio.TaskGroup() as tasks:
+                tasks.create_task(self.produce(source))
+                tasks.create_task(self.build())
+                for document_name in self.async_writers:
+                    for _ in range(self.cfg[WRITERS]):
+                        tasks.create_task(self.write(document_name))
+        finally:
+            monitor.cancel()
+            if self.aclient is not None:
+                await self.aclient.close()
+            self.close_reject_sink()
+
+        self.finalize_db()
+        self.log_summary(self.count_rows)
+        self.close_views()
+        self.write_metrics()
+        self.log.info(BLANK)
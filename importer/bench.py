@@ -0,0 +1,323 @@
+#importer/bench.py
+
+from importer.engine import *
+from pymongo.results import BulkWriteResult, InsertManyResult, UpdateResult
+from datetime import datetime
+import argparse
+import json
+import platform
+import resource
+
+BENCH_DIR = "logs/bench"
+# dedicated database, the benchmark never writes to the import one
+BENCH_DB = "benchhealthcare"
+BLOCK_ROWS = 1000000
+REGRESSION_RATIO = 0.8
+
+FIRST_NAMES = ["james", "mary", "john", "patricia", "robert", "jennifer", "michael", "linda", "david", "elizabeth",
+               "william", "barbara", "richard", "susan", "joseph", "jessica", "thomas", "sarah", "charles", "karen"]
+LAST_NAMES = ["smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis", "rodriguez", "martinez",
+              "hernandez", "lopez", "gonzalez", "wilson", "anderson", "thomas", "taylor", "moore", "jackson", "martin"]
+CONDITIONS = ["Cancer", "Obesity", "Diabetes", "Asthma", "Hypertension", "Arthritis"]
+HOSPITALS = [f"{name.title()} {kind}" for name in LAST_NAMES for kind in ["Inc", "PLC", "Ltd", "Group", "LLC"]]
+DOCTORS = [f"{first.title()} {last.title()}" for first in FIRST_NAMES for last in LAST_NAMES]
+INSURANCES = ["Aetna", "Blue Cross", "Cigna", "Medicare", "UnitedHealthcare"]
+MEDICATIONS = ["Aspirin", "Ibuprofen", "Lipitor", "Paracetamol", "Penicillin"]
+GENDERS = ["Male", "Female"]
+BLOOD_TYPES = ["A+", "A-", "AB+", "AB-", "B+", "B-", "O+", "O-"]
+ADMISSION_TYPES = ["Elective", "Emergency", "Urgent"]
+TEST_RESULTS = ["Abnormal", "Inconclusive", "Normal"]
+
+# invalid values injected per column, each one is caught by a mask or a conversion
+INVALID_VALUES = {
+    "Age": "-5",
+    "Gender": "Unknown",
+    "Blood Type": "Z+",
+    "Date of Admission": "2022-19-19",
+    "Admission Type": "Walk-in",
+    "Billing Amount": "n/a",
+    "Test Results": "",
+}
+
+
+def generate_block(rng, rows:int, first_row:int):
+    """
+    Generate a block of valid rows matching the fields_settings.yml schema.
+    """
+    names = [f"{first} {last}" for first, last in zip(rng.choice(FIRST_NAMES, rows), rng.choice(LAST_NAMES, rows))]
+    # random case like the source dataset, plus a row number to keep names distinct
+    upper = rng.random(rows) < 0.5
+    names = [f"{name.upper() if up else name.title()} {first_row + i}" for i, (name, up) in enumerate(zip(names, upper))]
+    admission = np.datetime64("2019-01-01") + rng.integers(0, 5 * 365, rows).astype("timedelta64[D]")
+    discharge = admission + rng.integers(1, 31, rows).astype("timedelta64[D]")
+    return pd.DataFrame({
+        "Name": names,
+        "Age": rng.integers(1, 120, rows).astype(str),
+        "Gender": rng.choice(GENDERS, rows),
+        "Blood Type": rng.choice(BLOOD_TYPES, rows),
+        "Medical Condition": rng.choice(CONDITIONS, rows),
+        "Date of Admission": np.datetime_as_string(admission, unit="D"),
+        "Doctor": rng.choice(DOCTORS, rows),
+        "Hospital": rng.choice(HOSPITALS, rows),
+        "Insurance Provider": rng.choice(INSURANCES, rows),
+        "Billing Amount": (rng.random(rows) * 50000).astype(str),
+        "Room Number": rng.integers(100, 500, rows).astype(str),
+        "Admission Type": rng.choice(ADMISSION_TYPES, rows),
+        "Discharge Date": np.datetime_as_string(discharge, unit="D"),
+        "Medication": rng.choice(MEDICATIONS, rows),
+        "Test Results": rng.choice(TEST_RESULTS, rows),
+    })
+
+
+def generate_dataset(filepath:str, rows:int, duplicate_ratio:float=0.05, invalid_ratio:float=0.02, seed:int=0):
+    """
+    Write a synthetic healthcare CSV of rows lines, by blocks to keep memory bounded.
+    duplicate_ratio of the rows repeat the primary key of a previous row of their block,
+    invalid_ratio of the rows hold one invalid value.
+    """
+    rng = np.random.default_rng(seed)
+    pk_fields = ["Name", "Gender", "Date of Admission", "Doctor", "Hospital", "Medical Condition"]
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    if os.path.exists(filepath):
+        os.remove(filepath)
+    for first_row in range(0, rows, BLOCK_ROWS):
+        count = min(BLOCK_ROWS, rows - first_row)
+        df = generate_block(rng, count, first_row)
+
+        duplicates = np.flatnonzero(rng.random(count) < duplicate_ratio)
+        duplicates = duplicates[duplicates > 0]
+        sources = (rng.random(len(duplicates)) * duplicates).astype(int)
+        df.iloc[duplicates, [df.columns.get_loc(field) for field in pk_fields]] = df.iloc[sources][pk_fields].to_numpy()
+
+        invalids = np.flatnonzero(rng.random(count) < invalid_ratio)
+        columns = rng.choice(list(INVALID_VALUES), len(invalids))
+        for column in INVALID_VALUES:
+            df.loc[invalids[columns == column], column] = INVALID_VALUES[column]
+
+        df.to_csv(filepath, mode="a", header=not first_row, index=False)
+    return filepath
+
+
+class MemoryCollection():
+    """
+    In-process stand-in of a MongoDB collection, for the write calls of the engine.
+    """
+
+    def __init__(self, name:str):
+        self.name = name
+        self.documents = {}
+
+    def replace_one(self, filter:dict, document:dict, upsert=False):
+        exists = filter[PK_ID] in self.documents
+        self.documents[filter[PK_ID]] = document
+        return UpdateResult({"n": 1, "nModified": int(exists), "upserted": None if exists else filter[PK_ID]}, True)
+
+    def bulk_write(self, ops:list, ordered=True):
+        upserted = 0
+        for op in ops:
+            result = self.replace_one(op._filter, op._doc)
+            upserted += result.upserted_id is not None
+        return BulkWriteResult({"nUpserted": upserted, "nMatched": len(ops) - upserted, "upserted": []}, True)
+
+    def insert_many(self, documents:list, ordered=True):
+        errors = []
+        for index, document in enumerate(documents):
+            if document[PK_ID] in self.documents:
+                errors.append({"index": index, "code": DUPLICATE_KEY, "errmsg": f"E11000 duplicate key error {document[PK_ID]}"})
+                if ordered:
+                    break
+            else:
+                self.documents[document[PK_ID]] = document
+        if errors:
+            count = len(documents) if not ordered else errors[0]["index"] + 1
+            raise BulkWriteError({"nInserted": count - len(errors), "writeErrors": errors})
+        return InsertManyResult([document[PK_ID] for document in documents], True)
+
+    def find(self, filter:dict, projection:dict, batch_size=None):
+        return ({PK_ID: id} for id in self.documents)
+
+    def estimated_document_count(self):
+        return len(self.documents)
+
+
+class MemoryDatabase(dict):
+    """
+    In-process stand-in of a MongoDB database, collections are created on first access.
+    """
+
+    def __missing__(self, name:str):
+        self[name] = MemoryCollection(name)
+        return self[name]
+
+    def list_collection_names(self):
+        return list(self.keys())
+
+    def get_collection(self, name:str, **options):
+        return self[name]
+
+
+def get_peak_rss():
+    """
+    Get the peak resident memory of the process, in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def bench_config(batch_size:int, id_index=False, adaptive=False, clean=False):
+    """
+    Get an engine configuration for a benchmark run on the BENCH_DB database, dropped first with clean.
+    """
+    return Config({
+        DBNAME: BENCH_DB,
+        USERNAME: os.getenv("MONGO_INITDB_ROOT_USERNAME"),
+        PASSWORD: os.getenv("MONGO_INITDB_ROOT_PASSWORD"),
+        HOST: os.getenv("MONGO_HOST", "localhost"),
+        PORT: int(os.getenv("MONGO_PORT", 27017)),
+        BATCH_SIZE: batch_size,
+        STATE_DIR: BENCH_DIR,
+        REJECTS_FORMAT: "",
+        METRICS_DIR: "",
+        ID_INDEX: id_index,
+        CACHE_DIR: "",
+        EXPORT_PART_SIZE: 0,
+        ADAPTIVE_BATCH: adaptive,
+        SOURCE: "",
+        VIEWS_SETTINGS: "",
+        TRACE_ONLY: False,
+        CLEAN_DB: clean,
+    })
+
+
+class Benchmark():
+    """
+    Times every stage of the engine on a synthetic dataset.
+    """
+
+    def __init__(self, engine:Engine):
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.engine = engine
+        self.stages = []
+
+    def record(self, name:str):
+        """
+        Record the totals of a stage from the engine metrics, with the peak RSS after it.
+        """
+        stage = self.engine.metrics.get_report()["stages"][name]
+        self.stages.append({
+            "stage": name,
+            "rows": stage[ROWS],
+            "wall_s": round(stage[WALL], 4),
+            "cpu_s": round(stage[CPU], 4),
+            "rows_per_s": stage[ROWS_PER_S],
+            "peak_rss_mb": round(get_peak_rss(), 1),
+        })
+        self.log.info(f"{name}: {stage[ROWS]} rows in {stage[WALL]:.3f}s ({stage[ROWS_PER_S]} rows/s)")
+
+    def run(self, source:str):
+        """
+        Run load, clean, dedupe, document building and writes on a CSV file.
+        """
+        engine = self.engine
+        metrics = engine.metrics = RunMetrics()
+        # the engine stages record their own metrics
+        engine.load_df(source)
+        self.record("load_df")
+        engine.clean_df()
+        self.record("clean_df")
+        engine.make_unic_df()
+        self.record("make_unic_df")
+        with metrics.time_stage("build_docs", len(engine.df)):
+            jsondocs, pks = engine.fm.get_docs(engine.df)
+        self.record("build_docs")
+        with metrics.time_stage("write", sum(len(documents) for documents in jsondocs.values())):
+            engine.write_docs(jsondocs, pks)
+            engine.flush_writers()
+        self.record("write")
+        return self.stages
+
+
+def compare_results(results:dict, previous:dict):
+    """
+    Compare rows/sec with a previous result file, return the stages slower than REGRESSION_RATIO.
+    """
+    regressions = []
+    before = {(run["rows"], stage["stage"]): stage for run in previous["runs"] for stage in run["stages"]}
+    for run in results["runs"]:
+        for stage in run["stages"]:
+            old = before.get((run["rows"], stage["stage"]))
+            if old and old["rows_per_s"] and stage["rows_per_s"]:
+                ratio = stage["rows_per_s"] / old["rows_per_s"]
+                stage["vs_previous"] = round(ratio, 3)
+                if ratio < REGRESSION_RATIO:
+                    regressions.append(f"{run['rows']} rows, {stage['stage']} : {ratio:.2f}x previous throughput")
+    return regressions
+
+
+def main(argv=None):
+    """
+    Benchmark entry point : python -m importer.bench --sizes 10000 1000000
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the importer stages on synthetic datasets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000], help="dataset sizes in rows (10000 1000000 10000000)")
+    parser.add_argument("--duplicates", type=float, default=0.05, help="ratio of duplicated primary keys")
+    parser.add_argument("--invalid", type=float, default=0.02, help="ratio of rows holding an invalid value")
+    parser.add_argument("--target", choices=["memory", "mongo"], default="memory", help="write to an in-process stand-in or a local mongod")
+    parser.add_argument("--clean", action="store_true", help=f"drop the {BENCH_DB} database before each mongo run")
+    parser.add_argument("--batch-size", type=int, default=1000, help="bulk_write batch size")
+    parser.add_argument("--id-index", action="store_true", help="insert new documents and replace existing ones with the local _id index")
+    parser.add_argument("--adaptive", action="store_true", help="adapt the batch size to the write latency")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the generator")
+    parser.add_argument("--compare", help="previous JSON result file to compare with")
+    parser.add_argument("--output", help="JSON result file, default logs/bench/bench_<timestamp>.json")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.target == "mongo" and os.getenv("MONGO_DB_NAME") == BENCH_DB:
+        print(f"The benchmark database {BENCH_DB} is the import database MONGO_DB_NAME, choose another one", file=sys.stderr)
+        return 2
+    config = bench_config(args.batch_size, args.id_index, args.adaptive, args.target == "mongo" and args.clean)
+    results = {
+        "date": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "target": args.target,
+        "batch_size": args.batch_size,
+        "id_index": args.id_index,
+        "adaptive": args.adaptive,
+        "duplicates": args.duplicates,
+        "invalid": args.invalid,
+        "runs": [],
+    }
+    for rows in args.sizes:
+        source = os.path.join(BENCH_DIR, f"dataset_{rows}_{args.duplicates}_{args.invalid}_{args.seed}.csv")
+        if not os.path.exists(source):
+            generate_dataset(source, rows, args.duplicates, args.invalid, args.seed)
+        engine = Engine(config)
+        if args.target == "mongo":
+            engine.connect_db()
+            engine.initialize_db()
+        else:
+            engine.db = MemoryDatabase()
+        engine.open_id_index()
+        stages = Benchmark(engine).run(source)
+        results["runs"].append({"rows": rows, "source": source, "stages": stages})
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, "r", encoding="utf8") as f:
+            regressions = compare_results(results, json.load(f))
+        for regression in regressions:
+            logging.warning(f"Regression : {regression}")
+
+    output = args.output or os.path.join(BENCH_DIR, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf8") as f:
+        json.dump(results, f, indent=2)
+    logging.info(f"Benchmark results saved in {output}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
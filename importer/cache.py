@@ -0,0 +1,99 @@
+#importer/cache.py
+
+import pandas as pd
+import hashlib
+import logging
+import os
+
+SNAPSHOT_VERSION = "1"
+SNAPSHOT_PREFIX = "snapshot_"
+SNAPSHOT_EXT = ".feather"
+
+
+class SnapshotCache():
+    """
+    Directory of cleaned DataFrame snapshots in Feather files, bounded in size, least recently used evicted first.
+    """
+
+    def __init__(self, directory:str, max_bytes:int):
+        """
+        Initialize the cache directory and its maximum size.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def get_key(self, source_hash:str, settings_hash:str, start:int, limit:int):
+        """
+        Get the key of a snapshot : source file hash, fields settings hash and row range.
+        """
+        return hashlib.sha256(f"{SNAPSHOT_VERSION}|{source_hash}|{settings_hash}|{start}|{limit}".encode("utf-8")).hexdigest()[:32]
+
+    def get_path(self, key:str):
+        """
+        Get the file path of a snapshot.
+        """
+        return os.path.join(self.directory, f"{SNAPSHOT_PREFIX}{key}{SNAPSHOT_EXT}")
+
+    def list_snapshots(self):
+        """
+        Get the snapshot files as (modification time, size, path), least recently used first.
+        """
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if filename.startswith(SNAPSHOT_PREFIX) and filename.endswith(SNAPSHOT_EXT):
+                stat = os.stat(os.path.join(self.directory, filename))
+                snapshots.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, filename)))
+        return sorted(snapshots)
+
+    def load(self, key:str):
+        """
+        Load a snapshot through a memory map, None when there is none.
+        """
+        from pyarrow import feather
+        filepath = self.get_path(key)
+        if not os.path.exists(filepath):
+            return None
+        df = feather.read_table(filepath, memory_map=True).to_pandas()
+        # modification time is the last use of the snapshot
+        os.utime(filepath)
+        self.log.info(f"Snapshot {filepath} loaded : {len(df)} rows.")
+        return df
+
+    def save(self, key:str, df:pd.DataFrame):
+        """
+        Write a snapshot, uncompressed to be memory mapped, then evict the least recently used ones above the size limit.
+        """
+        import pyarrow as pa
+        from pyarrow import feather
+        filepath = self.get_path(key)
+        tmp_path = f"{filepath}.tmp"
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=True), tmp_path, compression="uncompressed")
+        os.replace(tmp_path, filepath)
+        self.log.info(f"Snapshot {filepath} saved : {len(df)} rows, {os.path.getsize(filepath) >> 20} MB.")
+        self.evict()
+        return filepath if os.path.exists(filepath) else None
+
+    def evict(self):
+        """
+        Delete the least recently used snapshots until the cache fits in its maximum size.
+        """
+        snapshots = self.list_snapshots()
+        total = sum(size for _, size, _ in snapshots)
+        for _, size, filepath in snapshots:
+            if total <= self.max_bytes:
+                break
+            os.remove(filepath)
+            total -= size
+            self.log.info(f"Snapshot {filepath} evicted, cache size {total >> 20} MB.")
+
+    def clear(self):
+        """
+        Delete every snapshot.
+        """
+        snapshots = self.list_snapshots()
+        for _, _, filepath in snapshots:
+            os.remove(filepath)
+        self.log.warning(f"Snapshot cache {self.directory} cleared : {len(snapshots)} snapshots deleted.")
+        return len(snapshots)
@@ -0,0 +1,282 @@
+#importer/config.py
+
+import os
+
+PROD_DBNAME = "prod_dbname"
+DBNAME = "dbname"
+USERNAME = "username"
+PASSWORD  = "password"
+HOST = "host"
+PORT = "port"
+DEBUG_MODE = "debug_mode"
+START = "start"
+LIMIT = "limit"
+TRACE_ONLY = "trace_only"
+CLEAN_DB = "clean_db"
+DOCKMODE = "dockmode"
+BATCH_SIZE = "batch_size"
+BULK_ORDERED = "bulk_ordered"
+CHUNK_SIZE = "chunk_size"
+WORKERS = "workers"
+ASYNC_MODE = "async_mode"
+WRITERS = "writers"
+QUEUE_SIZE = "queue_size"
+DELTA_MODE = "delta_mode"
+STATE_DIR = "state_dir"
+RESUME = "resume"
+REJECTS_FORMAT = "rejects_format"
+METRICS_DIR = "metrics_dir"
+ID_INDEX = "id_index"
+CACHE_DIR = "cache_dir"
+CACHE_SIZE = "cache_size"
+CLEAR_CACHE = "clear_cache"
+EXPORT_DIR = "export_dir"
+EXPORT_FORMAT = "export_format"
+EXPORT_PART_SIZE = "export_part_size"
+BULK_LOAD = "bulk_load"
+LOAD_PROFILE = "load_profile"
+MAX_POOL_SIZE = "max_pool_size"
+MIN_POOL_SIZE = "min_pool_size"
+WRITE_CONCERN_W = "write_concern_w"
+JOURNAL = "journal"
+WTIMEOUT = "wtimeout"
+SOCKET_TIMEOUT = "socket_timeout"
+SERVER_SELECTION_TIMEOUT = "server_selection_timeout"
+COMPRESSORS = "compressors"
+ADAPTIVE_BATCH = "adaptive_batch"
+MIN_BATCH_SIZE = "min_batch_size"
+MAX_BATCH_SIZE = "max_batch_size"
+TARGET_LATENCY = "target_latency"
+MAX_RETRIES = "max_retries"
+RETRY_BACKOFF = "retry_backoff"
+SOURCE = "source"
+VIEWS_SETTINGS = "views_settings"
+PROGRESS_INTERVAL = "progress_interval"
+LOG_SAMPLE = "log_sample"
+SCHEMA_CHECK = "schema_check"
+DRY_RUN = "dry_run"
+
+DFT_SOURCE = "data/healthcare_dataset.csv"
+DFT_VIEWS_SETTINGS = "data/views_settings.yml"
+
+# settings of a library run, the environment ones are read by Config.from_env
+DEFAULTS = {
+    DBNAME: "healthcare",
+    USERNAME: None,
+    PASSWORD: None,
+    HOST: "localhost",
+    PORT: 27017,
+    DEBUG_MODE: False,
+    START: 0,
+    LIMIT: 0,
+    BATCH_SIZE: 1000,
+    BULK_ORDERED: False,
+    CHUNK_SIZE: 0,
+    WORKERS: 1,
+    ASYNC_MODE: False,
+    WRITERS: 4,
+    QUEUE_SIZE: 8,
+    DELTA_MODE: False,
+    STATE_DIR: "logs",
+    RESUME: False,
+    REJECTS_FORMAT: "csv",
+    METRICS_DIR: "logs",
+    ID_INDEX: False,
+    CACHE_DIR: "logs/cache",
+    CACHE_SIZE: 0,
+    CLEAR_CACHE: False,
+    EXPORT_DIR: "",
+    EXPORT_FORMAT: "jsonl",
+    EXPORT_PART_SIZE: 1000000,
+    BULK_LOAD: False,
+    LOAD_PROFILE: "",
+    MAX_POOL_SIZE: None,
+    MIN_POOL_SIZE: None,
+    WRITE_CONCERN_W: None,
+    JOURNAL: None,
+    WTIMEOUT: None,
+    SOCKET_TIMEOUT: None,
+    SERVER_SELECTION_TIMEOUT: None,
+    COMPRESSORS: "",
+    ADAPTIVE_BATCH: False,
+    MIN_BATCH_SIZE: None,
+    MAX_BATCH_SIZE: None,
+    TARGET_LATENCY: 500,
+    MAX_RETRIES: 5,
+    RETRY_BACKOFF: 100,
+    SOURCE: DFT_SOURCE,
+    VIEWS_SETTINGS: DFT_VIEWS_SETTINGS,
+    PROGRESS_INTERVAL: 10,
+    LOG_SAMPLE: 0,
+    SCHEMA_CHECK: True,
+    TRACE_ONLY: True,
+    CLEAN_DB: False,
+    DRY_RUN: False,
+    PROD_DBNAME: "healthcare",
+    DOCKMODE: False,
+}
+
+# allowed values of the enumerated settings
+CHOICES = {
+    REJECTS_FORMAT: ["", "csv", "parquet"],
+    EXPORT_FORMAT: ["jsonl", "bson"],
+    LOAD_PROFILE: ["", "bulk", "incremental"],
+}
+POSITIVE_INTS = [WORKERS, WRITERS, QUEUE_SIZE, PORT, PROGRESS_INTERVAL]
+NON_NEGATIVE_INTS = [START, LIMIT, BATCH_SIZE, CHUNK_SIZE, CACHE_SIZE, EXPORT_PART_SIZE, TARGET_LATENCY, MAX_RETRIES, RETRY_BACKOFF, LOG_SAMPLE]
+OPTIONAL_INTS = [MAX_POOL_SIZE, MIN_POOL_SIZE, WTIMEOUT, SOCKET_TIMEOUT, SERVER_SELECTION_TIMEOUT, MIN_BATCH_SIZE, MAX_BATCH_SIZE]
+
+
+def get_bool(value):
+    return value.lower() in ["true", "1", "yes"]
+
+def get_int(value):
+    """
+    Get an integer setting, the raw value when it is not a number : reported by Config.validate.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+def get_optional_int(value):
+    return get_int(value) if value else None
+
+def get_optional_bool(value):
+    return get_bool(value) if value else None
+
+
+class Config(dict):
+    """
+    Settings of a migration run, keyed by the setting constants, defaults for the missing ones.
+    """
+
+    def __init__(self, values:dict=None, **settings):
+        """
+        Initialize the settings from the defaults, then values, then keyword settings (Config(batch_size=500)).
+        """
+        super().__init__(DEFAULTS)
+        self.update(values or {})
+        self.update(settings)
+
+    def copy(self):
+        return Config(self)
+
+    @classmethod
+    def from_env(cls, env_file:str=".env", test_env_file:str=".test.env"):
+        """
+        Read the settings from the environment, `.env` then `.test.env` out of dock mode.
+        """
+        from dotenv import load_dotenv
+        load_dotenv(env_file)
+
+        dockmode = get_bool(os.getenv("DOCKMODE", "0"))
+        dbname = prod_dbname = os.getenv("MONGO_DB_NAME","healthcare")
+
+        # possibly overwrite CFG in interactive/test mode
+        if not dockmode and os.path.exists(test_env_file):
+            load_dotenv(test_env_file, override=True)
+            # ensure dbname in test mode is different from dock mode
+            dbname = os.getenv("MONGO_DB_NAME", "healthcare")
+            if dbname == prod_dbname:
+                dbname = f"test{prod_dbname}"
+
+        return cls({
+            DBNAME : dbname,
+            USERNAME : os.getenv("MONGO_INITDB_ROOT_USERNAME",None),
+            PASSWORD : os.getenv("MONGO_INITDB_ROOT_PASSWORD", None),
+            HOST : os.getenv("MONGO_HOST", "mongo") if dockmode else "localhost" ,
+            PORT: get_int(os.getenv("MONGO_PORT", "27017")),
+            DEBUG_MODE : get_bool(os.getenv("MIGRATION_DEBUG", "0")),
+            START : get_int(os.getenv("START", "0")),
+            LIMIT : get_int(os.getenv("LIMIT", "0")),
+            BATCH_SIZE : get_int(os.getenv("BATCH_SIZE", "1000")),
+            BULK_ORDERED : get_bool(os.getenv("BULK_ORDERED", "0")),
+            CHUNK_SIZE : get_int(os.getenv("CHUNK_SIZE", "0")),
+            WORKERS : get_int(os.getenv("WORKERS", "1")),
+            ASYNC_MODE : get_bool(os.getenv("ASYNC_MODE", "0")),
+            WRITERS : get_int(os.getenv("WRITERS", "4")),
+            QUEUE_SIZE : get_int(os.getenv("QUEUE_SIZE", "8")),
+            DELTA_MODE : get_bool(os.getenv("DELTA_MODE", "0")),
+            STATE_DIR : os.getenv("STATE_DIR", "logs"),
+            RESUME : get_bool(os.getenv("RESUME", "0")),
+            REJECTS_FORMAT : os.getenv("REJECTS_FORMAT", "csv").lower().replace("none", ""),
+            METRICS_DIR : os.getenv("METRICS_DIR", "logs"),
+            ID_INDEX : get_bool(os.getenv("ID_INDEX", "0")),
+            CACHE_DIR : os.getenv("CACHE_DIR", "logs/cache"),
+            CACHE_SIZE : get_int(os.getenv("CACHE_SIZE", "0")),
+            CLEAR_CACHE : get_bool(os.getenv("CLEAR_CACHE", "0")),
+            EXPORT_DIR : os.getenv("EXPORT_DIR", ""),
+            EXPORT_FORMAT : os.getenv("EXPORT_FORMAT", "jsonl").lower(),
+            EXPORT_PART_SIZE : get_int(os.getenv("EXPORT_PART_SIZE", "1000000")),
+            BULK_LOAD : get_bool(os.getenv("BULK_LOAD", "0")),
+            LOAD_PROFILE : os.getenv("LOAD_PROFILE", "").lower(),
+            MAX_POOL_SIZE : get_optional_int(os.getenv("MAX_POOL_SIZE")),
+            MIN_POOL_SIZE : get_optional_int(os.getenv("MIN_POOL_SIZE")),
+            WRITE_CONCERN_W : os.getenv("WRITE_CONCERN_W") or None,
+            JOURNAL : get_optional_bool(os.getenv("JOURNAL")),
+            WTIMEOUT : get_optional_int(os.getenv("WTIMEOUT_MS")),
+            SOCKET_TIMEOUT : get_optional_int(os.getenv("SOCKET_TIMEOUT_MS")),
+            SERVER_SELECTION_TIMEOUT : get_optional_int(os.getenv("SERVER_SELECTION_TIMEOUT_MS")),
+            COMPRESSORS : os.getenv("COMPRESSORS", ""),
+            ADAPTIVE_BATCH : get_bool(os.getenv("ADAPTIVE_BATCH", "0")),
+            MIN_BATCH_SIZE : get_optional_int(os.getenv("MIN_BATCH_SIZE")),
+            MAX_BATCH_SIZE : get_optional_int(os.getenv("MAX_BATCH_SIZE")),
+            TARGET_LATENCY : get_int(os.getenv("TARGET_LATENCY_MS", "500")),
+            MAX_RETRIES : get_int(os.getenv("MAX_RETRIES", "5")),
+            RETRY_BACKOFF : get_int(os.getenv("RETRY_BACKOFF_MS", "100")),
+            SOURCE : os.getenv("SOURCE", DFT_SOURCE),
+            VIEWS_SETTINGS : os.getenv("VIEWS_SETTINGS", DFT_VIEWS_SETTINGS),
+            PROGRESS_INTERVAL : get_int(os.getenv("PROGRESS_INTERVAL_S", "10")),
+            LOG_SAMPLE : get_int(os.getenv("LOG_SAMPLE", "0")),
+            SCHEMA_CHECK : get_bool(os.getenv("SCHEMA_CHECK", "1")),
+            TRACE_ONLY : get_bool(os.getenv("DEBUG_TRACE_ONLY", "1")) and not dockmode,
+            CLEAN_DB : get_bool(os.getenv("CLEAN_DB", "0")) and not dockmode,  # ONLY IN TEST MODE !!!
+            PROD_DBNAME : prod_dbname,
+            DOCKMODE : dockmode,
+        })
+
+    def get_async_conflicts(self):
+        """
+        Get the settings the async pipeline does not apply : it streams a single process with bulk replaces,
+        and its writers complete out of order so no checkpoint is saved.
+        """
+        conflicts = []
+        if self[RESUME]:
+            conflicts.append(RESUME)
+        if self[ID_INDEX]:
+            conflicts.append(ID_INDEX)
+        if self[CACHE_SIZE]:
+            # snapshots are taken of full loads only
+            conflicts.append(CACHE_SIZE)
+        if isinstance(self[WORKERS], int) and self[WORKERS] > 1:
+            conflicts.append(WORKERS)
+        return conflicts
+
+    def validate(self, connect:bool=True):
+        """
+        Check the settings, return the list of errors. Credentials are only required to connect to MongoDB.
+        """
+        errors = []
+        if connect and (not self[USERNAME] or not self[PASSWORD]):
+            errors.append("Invalid username and/or password in your .env, must be both filled")
+        for key in POSITIVE_INTS + NON_NEGATIVE_INTS + OPTIONAL_INTS:
+            value = self[key]
+            if value is None and key in OPTIONAL_INTS:
+                continue
+            if not isinstance(value, int) or isinstance(value, bool) or value < (1 if key in POSITIVE_INTS else 0):
+                errors.append(f"{key} must be a {'positive' if key in POSITIVE_INTS else 'non negative'} integer, not {value!r}")
+        for key, choices in CHOICES.items():
+            if self[key] not in choices:
+                errors.append(f"{key} must be one of {', '.join(choice or 'empty' for choice in choices)}, not {self[key]!r}")
+        if self[RESUME] and self[EXPORT_DIR]:
+            errors.append("resume is not available in export mode")
+        if self[RESUME] and self[CLEAN_DB]:
+            # the collections committed before the checkpoint would be dropped
+            errors.append("resume is not available with clean_db")
+        if self[ASYNC_MODE] and not self[EXPORT_DIR]:
+            errors.extend(f"{key} is not available in async mode" for key in self.get_async_conflicts())
+        if str(self[WRITE_CONCERN_W]) == "0":
+            # unacknowledged writes return no counts nor errors to report
+            errors.append("write_concern_w must acknowledge the writes, not 0")
+        return errors
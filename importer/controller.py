@@ -0,0 +1,137 @@
+#importer/controller.py
+
+from pymongo.errors import BulkWriteError, ConnectionFailure, NotPrimaryError, OperationFailure, PyMongoError
+import asyncio
+import logging
+import random
+import time
+
+GROW = "grow"
+SHRINK = "shrink"
+RETRY = "retry"
+GIVE_UP = "give_up"
+
+DFT_TARGET_LATENCY = 0.5
+DFT_MAX_RETRIES = 5
+DFT_BACKOFF = 0.1
+MAX_BACKOFF = 10.0
+GROWTH = 1.5
+# server error codes worth a retry : write conflict, elections, shutdowns, network and time limits
+TRANSIENT_CODES = {6, 7, 50, 89, 91, 112, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+TRANSIENT_LABELS = ("RetryableWriteError", "TransientTransactionError")
+
+
+def is_transient(e:Exception):
+    """
+    Tell if a write error may succeed when replayed : network errors, primary step-downs, write conflicts.
+    """
+    if isinstance(e, (ConnectionFailure, NotPrimaryError)):
+        return True
+    if isinstance(e, PyMongoError) and any(e.has_error_label(label) for label in TRANSIENT_LABELS):
+        return True
+    if isinstance(e, BulkWriteError):
+        # replay only when every document error is transient
+        write_errors = e.details.get("writeErrors", [])
+        return bool(write_errors) and all(error.get("code") in TRANSIENT_CODES for error in write_errors)
+    if isinstance(e, OperationFailure):
+        return e.code in TRANSIENT_CODES
+    return False
+
+
+class BatchController():
+    """
+    Adaptive batch size of a collection writer, from the observed batch latency and errors,
+    and replay of the batches failing on transient errors with exponential backoff.
+    Writes are keyed on _id, so replaying a batch is idempotent.
+    """
+
+    def __init__(self, name:str, batch_size:int, min_size:int=None, max_size:int=None, target_latency:float=DFT_TARGET_LATENCY,
+                 max_retries:int=DFT_MAX_RETRIES, backoff:float=DFT_BACKOFF, adaptive:bool=True):
+        """
+        Initialize the controller of a collection with its initial batch size and bounds.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.name = name
+        self.batch_size = max(1, batch_size)
+        self.min_size = max(1, min_size or self.batch_size // 10)
+        self.max_size = max(self.batch_size, max_size or self.batch_size * 10)
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.adaptive = adaptive
+        self.decisions = {GROW: 0, SHRINK: 0, RETRY: 0, GIVE_UP: 0}
+        self.sizes = [self.batch_size, self.batch_size]
+
+    def update(self, count:int, seconds:float, errors:int=0):
+        """
+        Adjust the batch size after a batch : halved on errors or above the target latency, grown well below it.
+        """
+        if not self.adaptive or not count:
+            return self.batch_size
+        size = self.batch_size
+        if errors or seconds > self.target_latency:
+            size = max(self.min_size, size // 2)
+        elif seconds < self.target_latency / 2 and count >= self.batch_size:
+            size = min(self.max_size, int(size * GROWTH))
+        if size != self.batch_size:
+            decision = GROW if size > self.batch_size else SHRINK
+            self.decisions[decision] += 1
+            self.log.debug("%s collection : batch size %d -> %d (%d documents in %.3fs, %d errors)", self.name, self.batch_size, size, count, seconds, errors)
+            self.batch_size = size
+            self.sizes = [min(self.sizes[0], size), max(self.sizes[1], size)]
+        return self.batch_size
+
+    def get_delay(self, attempt:int):
+        """
+        Get the backoff delay before a retry, exponential with jitter.
+        """
+        return min(MAX_BACKOFF, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def should_retry(self, e:Exception, attempt:int):
+        """
+        Tell if a failed write is replayed, count and log the decision.
+        """
+        if not is_transient(e):
+            return False
+        if attempt >= self.max_retries:
+            self.decisions[GIVE_UP] += 1
+            self.log.warning(f"{self.name} collection : write failed after {attempt} retries : {e}")
+            return False
+        self.decisions[RETRY] += 1
+        self.log.warning(f"{self.name} collection : transient write error, retry {attempt + 1}/{self.max_retries} : {e}")
+        return True
+
+    def call(self, operation):
+        """
+        Run a write, replayed on transient errors.
+        """
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except PyMongoError as e:
+                if not self.should_retry(e, attempt):
+                    raise
+                time.sleep(self.get_delay(attempt))
+                attempt += 1
+
+    async def acall(self, operation):
+        """
+        Await a write of the async client, replayed on transient errors.
+        """
+        attempt = 0
+        while True:
+            try:
+                return await operation()
+            except PyMongoError as e:
+                if not self.should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self.get_delay(attempt))
+                attempt += 1
+
+    def get_summary(self):
+        """
+        Get a printable summary of the controller decisions.
+        """
+        return (f"batch size {self.batch_size} (range {self.sizes[0]}-{self.sizes[1]}), {self.decisions[GROW]} grown, "
+                f"{self.decisions[SHRINK]} shrunk, {self.decisions[RETRY]} retries, {self.decisions[GIVE_UP]} given up")
@@ -1,36 +1,123 @@
-#importer/manager.py
+#importer/engine.py
 
+from importer.config import *
 from importer.manager import * 
+from importer.writer import *
+from importer.state import *
+from importer.rejects import *
+from importer.metrics import *
+from importer.cache import *
+from importer.export import *
+from importer.controller import *
+from importer.views import *
+from importer.logger import Progress
+from importer.schema import SchemaValidator
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from pymongo.write_concern import WriteConcern
+import importlib.util
+import glob
+import hashlib
 import pandas as pd
+import numpy as np
 import os
+import time
 import pymongo
 import logging
 import sys
 
-PROD_DBNAME = "prod_dbname"
-DBNAME = "dbname"
-USERNAME = "username" 
-PASSWORD  = "password" 
-HOST = "host"
-PORT = "port" 
-DEBUG_MODE = "debug_mode"
-START = "start" 
-LIMIT = "limit"
-TRACE_ONLY = "trace_only"
-CLEAN_DB = "clean_db"
-DOCKMODE = "dockmode"
 
+DFT_CHUNK_SIZE = 10000
+# plain, gzip or zstd (zstandard package) CSV files, decompressed by pandas
+CSV_EXTENSIONS = (".csv", ".csv.gz", ".csv.zst")
+FILE = "file"
+LOADED = "loaded"
+EXCLUDED = "excluded"
+REJECTED = "rejected"
+DUPLICATES = "duplicates"
+SUPERSEDED = "superseded"
+KEPT = "kept"
+DUPLICATES_SAMPLE = 10
+VALIDATION_LEVEL = "strict"
+VALIDATION_ACTION = "error"
+# mask function of the rejects of the local schema check
+JSON_SCHEMA_CHECK = "$jsonSchema"
+
+# connection settings of a load profile, used when not set in the environment
+LOAD_PROFILES = {
+    "bulk": {WRITE_CONCERN_W: 1, JOURNAL: False},
+    "incremental": {WRITE_CONCERN_W: "majority", JOURNAL: True, WTIMEOUT: 10000},
+}
+# wire compressors and the module they need
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
 
 
-CFG= {}
 STARS = "*" * 50
-BLANK = ""
 
 def handle_critical(message):
     logging.critical(message)
     logging.critical(f"Abnormal end of execution")
     sys.exit(1)
 
+def is_csv_file(filepath:str):
+    """
+    Tell if a file is a plain or compressed CSV file.
+    """
+    return filepath.lower().endswith(CSV_EXTENSIONS)
+
+def get_source_files(source:str):
+    """
+    Get the CSV files of a source : a file, a directory or a glob pattern, sorted by path.
+    Sorted paths are the order of the files for duplicates, name daily drops by date.
+    """
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name) for name in os.listdir(source) if is_csv_file(name))
+    if glob.has_magic(source):
+        return sorted(path for path in glob.glob(source) if is_csv_file(path))
+    return [source]
+
+worker_engine = None
+
+def clean_file(config, filepath):
+    """
+    Load, clean and deduplicate a CSV file from a worker process.
+    Rejected rows are buffered and returned, to be written in the quarantine file of the run.
+    """
+    global worker_engine
+    if worker_engine is None:
+        worker_engine = Engine(config)
+    worker_engine.fm.reject_sink = RejectSink(None) if config[REJECTS_FORMAT] else None
+    stats = worker_engine.clean_source(filepath)
+    rejects = worker_engine.fm.reject_sink.frames if worker_engine.fm.reject_sink is not None else []
+    return worker_engine.df, stats, rejects
+
+def import_partition(config, df):
+    """
+    Write a DataFrame partition from a worker process, over the worker own MongoClient.
+    """
+    global worker_engine
+    if worker_engine is None:
+        worker_engine = Engine(config)
+        worker_engine.connect_db()
+        worker_engine.open_manifest(refresh=False)
+        worker_engine.open_id_index(refresh=False)
+    # rejects and failed writes are buffered and returned, to be written in the files of the run
+    worker_engine.fm.reject_sink = RejectSink(None) if config[REJECTS_FORMAT] else None
+    worker_engine.failures = RejectSink(None) if config[REJECTS_FORMAT] else None
+    worker_engine.stats = {}
+    worker_engine.writers = {}
+    worker_engine.controllers = {}
+    worker_engine.metrics = RunMetrics()
+    worker_engine.progress.start(len(df) * len(set(worker_engine.fm.get_masterdoc_list())))
+    worker_engine.df = df
+    worker_engine.write_df()
+    worker_engine.flush_writers()
+    worker_engine.log_controllers()
+    rejects = worker_engine.fm.reject_sink.frames if worker_engine.fm.reject_sink is not None else []
+    failures = worker_engine.failures.frames if worker_engine.failures is not None else []
+    metrics = worker_engine.metrics
+    return os.getpid(), len(df), worker_engine.stats, (metrics.latencies, metrics.documents), rejects, failures, worker_engine.pop_unwritten()
+
 class Engine():
     """
     Importer Engine for processing and migrating healthcare data.
@@ -40,16 +127,37 @@ class Engine():
         """
         Initialize the Engine with logging and configuration.
         """ 
-        global CFG
-        CFG = config
+        self.cfg = config
         self.log = logging.getLogger(self.__class__.__name__)
         self.log.info(STARS)
         self.log.info("Importer Engine starts ")
         self.df = None
         self.db = None
         self.fm = FieldManager()
+        self.writers = {}
+        self.stats = {}
+        self.seen_keys = set()
+        self.manifest = None
+        self.id_index = None
+        self.cache = None
+        self.exporter = None
+        self.failures = None
+        self.views = None
+        # _id of the documents not written (invalid or failed), by collection, until the views are updated
+        self.unwritten = {}
+        self.validators = {}
+        self.collections = {}
+        self.collections_db = None
+        self.controllers = {}
+        self.deferred = []
+        self.file_stats = []
+        self.snapshot_key = None
+        self.cleaned = False
+        self.metrics = RunMetrics()
+        self.progress = Progress(self.log, config[PROGRESS_INTERVAL], config[LOG_SAMPLE])
 
 
+    @timed_stage("load_df")
     def load_df(self, source):
         """
         Load a DataFrame, Dictionary or CSV file into the engine.
@@ -59,7 +167,7 @@ class Engine():
             if isinstance(source,pd.DataFrame) or isinstance(source,dict):
                 df = pd.DataFrame(source,dtype=str)                
                 self.log.info(f"Dictionnary loaded")
-            elif os.path.exists(source) and (source[-4:]).lower() == ".csv":
+            elif os.path.exists(source) and is_csv_file(source):
                 df = pd.read_csv(source,dtype=str)
                 self.log.info(f"CSV {source} loaded")
             else:
@@ -68,63 +176,676 @@ class Engine():
             handle_critical("DF loader : Error with your entry, must be a dataframe, a dictionnary or a csv file" )
         
         
-        for fieldname in self.fm.fields.keys():
-            if fieldname not in df.columns and not fieldname.startswith("_id"):
-                self.log.critical("DF loader : Error with your entry, field {fieldname} not in the dataframe" )
-                return pd.DataFrame()
+        if not self.check_columns(df):
+            return pd.DataFrame()
                 
-        if CFG[START] or CFG[LIMIT]:
-            df = df.iloc[CFG[START]:CFG[START]+CFG[LIMIT]]
-        self.df = df
+        if self.cfg[START] or self.cfg[LIMIT]:
+            df = df.iloc[self.cfg[START]:self.cfg[START]+self.cfg[LIMIT]]
+        self.df = self.fm.compact_df(df)
+        self.cleaned = False
+        self.snapshot_key = None
         self.log.info(BLANK)
         return self.df
 
+    def load_source(self, source:str):
+        """
+        Load a CSV file : its cleaned snapshot when the file and the fields settings are unchanged, else the file itself.
+        """
+        key = None
+        if self.open_cache() is not None and os.path.exists(source):
+            key = self.cache.get_key(get_file_hash(source), self.fm.settings_hash, self.cfg[START], self.cfg[LIMIT])
+            if self.load_snapshot(key) is not None:
+                return self.df
+            self.log.info(f"No snapshot of {source} with these fields settings, full load and cleaning.")
+        df = self.load_df(source)
+        self.snapshot_key = key
+        return df
+
+    def load_sources(self, source:str):
+        """
+        Load a CSV file, a directory or a glob of CSV files, possibly gzip or zstd compressed.
+        Several files are loaded, cleaned and deduplicated in parallel (WORKERS processes), then merged :
+        the latest version of a row wins, by file path then row.
+        """
+        filepaths = get_source_files(source)
+        if len(filepaths) == 1:
+            return self.load_source(filepaths[0])
+        if not filepaths:
+            self.log.error(f"DF loader : no CSV file in {source}")
+            self.df = pd.DataFrame()
+            return self.df
+
+        self.log.info(f"{len(filepaths)} CSV files in {source} : {', '.join(os.path.basename(path) for path in filepaths)}")
+        key = None
+        if self.open_cache() is not None:
+            sources_hash = hashlib.sha256("|".join(get_file_hash(path) for path in filepaths).encode("utf-8")).hexdigest()
+            key = self.cache.get_key(sources_hash, self.fm.settings_hash, self.cfg[START], self.cfg[LIMIT])
+            if self.load_snapshot(key) is not None:
+                return self.df
+
+        self.open_reject_sink()
+        self.file_stats = []
+        frames = []
+        if self.cfg[WORKERS] > 1:
+            with ProcessPoolExecutor(max_workers=min(self.cfg[WORKERS], len(filepaths))) as executor:
+                for df, stats, rejects in executor.map(clean_file, [self.cfg] * len(filepaths), filepaths):
+                    if self.fm.reject_sink is not None:
+                        self.fm.reject_sink.extend(rejects)
+                    frames.append(df)
+                    self.file_stats.append(stats)
+        else:
+            for filepath in filepaths:
+                self.file_stats.append(self.clean_source(filepath))
+                frames.append(self.df)
+        self.merge_sources(frames)
+        self.snapshot_key = key
+        self.save_snapshot()
+        return self.df
+
+    def clean_source(self, filepath:str):
+        """
+        Load, clean and deduplicate one file of a multi-file source, return its counts.
+        """
+        count_rejected = self.fm.reject_sink.count if self.fm.reject_sink is not None else 0
+        if not is_csv_file(filepath) or self.load_df(filepath).empty:
+            handle_critical(f"DF loader : wrong or empty CSV file {filepath}")
+        count_loaded = len(self.df)
+        self.clean_df()
+        count_cleaned = len(self.df)
+        self.make_unic_df()
+        return {
+            FILE: filepath,
+            LOADED: count_loaded,
+            EXCLUDED: count_loaded - count_cleaned,
+            REJECTED: (self.fm.reject_sink.count if self.fm.reject_sink is not None else 0) - count_rejected,
+            DUPLICATES: count_cleaned - len(self.df),
+        }
+
+    def merge_sources(self, frames:list):
+        """
+        Concatenate the cleaned files in order and keep the latest version of each row.
+        """
+        files = np.repeat(np.arange(len(frames)), [len(df) for df in frames])
+        self.df = self.fm.compact_df(pd.concat(frames, ignore_index=True))
+        count_rows = len(self.df)
+        self.make_unic_df()
+        kept = np.bincount(files[self.df.index.to_numpy()], minlength=len(frames))
+        for stats, df, count_kept in zip(self.file_stats, frames, kept):
+            stats[SUPERSEDED] = len(df) - int(count_kept)
+            stats[KEPT] = int(count_kept)
+        self.df = self.df.reset_index(drop=True)
+        self.cleaned = True
+        self.log.info(f"{len(frames)} files merged : {count_rows} rows, {len(self.df)} after duplicates removal.")
+        return self.df
+
+    @timed_stage("load_snapshot")
+    def load_snapshot(self, key:str):
+        """
+        Load a cleaned snapshot, memory mapped, the cleaning stages are skipped.
+        """
+        df = self.cache.load(key)
+        if df is not None:
+            self.df = df
+            self.cleaned = True
+            self.snapshot_key = None
+        return df
+
+    def open_cache(self):
+        """
+        Open the snapshot cache when CACHE_SIZE is set, cleared first with CLEAR_CACHE.
+        """
+        if self.cfg[CACHE_SIZE] and self.cache is None:
+            self.cache = SnapshotCache(self.cfg[CACHE_DIR], self.cfg[CACHE_SIZE] << 20)
+            if self.cfg[CLEAR_CACHE]:
+                self.cache.clear()
+        return self.cache
+
+    def save_snapshot(self):
+        """
+        Save the cleaned DataFrame of a CSV file loaded by load_source in the snapshot cache.
+        """
+        if self.cache is not None and self.snapshot_key is not None:
+            self.cache.save(self.snapshot_key, self.df)
+            self.snapshot_key = None
+
+    def check_columns(self, df:pd.DataFrame):
+        """
+        Check every field of the settings is a column of the DataFrame.
+        """
+        for fieldname in self.fm.fields.keys():
+            if fieldname not in df.columns and not fieldname.startswith("_id"):
+                self.log.critical(f"DF loader : Error with your entry, field {fieldname} not in the dataframe" )
+                return False
+        return True
+
+    def iter_chunks(self, source, chunksize=None, start=None, limit=None):
+        """
+        Read a CSV file by chunks of CHUNK_SIZE rows, START/LIMIT mapped onto row offsets.
+        """
+        start = self.cfg[START] if start is None else start
+        limit = self.cfg[LIMIT] if limit is None else limit
+        skiprows = range(1, start + 1) if start else None
+        nrows = limit or None
+        offset = start
+        reader = pd.read_csv(source, dtype=str, chunksize=chunksize or self.cfg[CHUNK_SIZE] or DFT_CHUNK_SIZE, skiprows=skiprows, nrows=nrows)
+        for chunk in reader:
+            # keep row labels identical to a full load, whatever the chunk
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield self.fm.compact_df(chunk)
+
+    @timed_stage("clean_df")
     def clean_df(self):
         """
         Clean the DataFrame by converting and validating fields.
         """
         self.log.info("Clean data before migration...")
 
-        for fieldname in self.fm.fields :
-            if not fieldname.startswith(PK_ID):
-                self.fm.convert_df_values(self.df,fieldname)      
-                self.fm.apply_mask(self.df,fieldname)
+        self.df = self.fm.apply_validation_plan(self.df)
         self.log.info(BLANK)
         return self.df
 
+    @timed_stage("make_unic_df")
     def make_unic_df(self):
         """
         Make the DataFrame unique by removing duplicates.
         """
-        subset=self.fm.get_pk_fields('care')
-        mask = self.df.duplicated(subset=subset, keep="last")
-        duplicated = self.df[mask].sort_values("Name")
-        to_delete = len(duplicated)
+        self.df = self.fm.add_key_columns(self.df)
+        mask = self.df[self.fm.get_id_field('care')].duplicated(keep="last").to_numpy()
+        to_delete = int(mask.sum())
         if to_delete:
-            logging.warning("Duplicates detected. Only latest is retained, suppressing following elements.")
-            logging.warning(duplicated.to_string())
-            self.df.drop(duplicated.index, inplace=True)
+            logging.warning(f"Duplicates detected : {to_delete} rows. Only latest is retained, sample of suppressed elements :")
+            logging.warning(self.df.loc[mask, self.fm.get_pk_fields('care')].head(DUPLICATES_SAMPLE).to_string())
+            self.df = self.df.take(np.flatnonzero(~mask))
         else:
             logging.info("No duplicate detected in the dataset.")
         self.log.info(BLANK)
         return self.df
 
 
+    @timed_stage("upsert_rows")
     def upsert_rows(self):
         """
-        Iterate dataframe rows to upsert
+        Build the documents of the dataframe and upsert them
         """
-        count_inserted = 0
         total = len(self.df)
         self.log.info(STARS)
         self.log.info(f"Migration start with {total} documents after cleaning and merging.")
-        for i, row in self.df.iterrows():
-            self.upsert_row(row.to_dict())
-            count_inserted += 1
-        self.log.info(f"Migration complete: {count_inserted} documents inserted out of {total} rows processed.")
+        if self.cfg[BATCH_SIZE] and not self.cfg[TRACE_ONLY]:
+            self.log.info(f"Bulk write mode : batches of {self.cfg[BATCH_SIZE]} documents, ordered: {self.cfg[BULK_ORDERED]}")
+        if self.id_index is not None:
+            self.log_id_plan()
+        self.progress.start(total * len(set(self.fm.get_masterdoc_list())))
+        if self.is_parallel():
+            with ProcessPoolExecutor(max_workers=self.cfg[WORKERS]) as executor:
+                self.collect_partitions(self.submit_partitions(executor))
+        else:
+            self.write_df()
+            self.flush_writers()
+        self.update_views(self.df)
+        self.log_summary(total)
+
+
+    def is_parallel(self):
+        """
+        Parallel import runs with several workers, never in trace only or export mode.
+        """
+        return self.cfg[WORKERS] > 1 and not self.cfg[TRACE_ONLY] and not self.cfg[EXPORT_DIR]
+
+
+    def partition_df(self, count):
+        """
+        Split the dataframe in count partitions by a hash of the care primary key.
+        All documents of a row share the same key, so no two partitions write the same _id.
+        """
+        self.df = self.fm.add_key_columns(self.df)
+        hashes = [int(key[:16], 16) for key in self.df[self.fm.get_id_field('care')]]
+        partitions = np.array(hashes, dtype=np.uint64) % np.uint64(count)
+        return [self.df[partitions == i] for i in range(count)]
+
+
+    def submit_partitions(self, executor):
+        """
+        Send each partition of the dataframe to a worker process.
+        """
+        return [executor.submit(import_partition, self.cfg, part)
+                for part in self.partition_df(self.cfg[WORKERS]) if len(part)]
+
+
+    def collect_partitions(self, futures):
+        """
+        Wait for the worker processes and merge their counters into the engine ones.
+        """
+        for future in futures:
+            pid, count_rows, worker_stats, worker_latencies, rejects, failures, unwritten = future.result()
+            self.metrics.merge_latencies(*worker_latencies)
+            for document_name, ids in unwritten.items():
+                self.unwritten.setdefault(document_name, set()).update(ids)
+            if self.fm.reject_sink is not None:
+                self.fm.reject_sink.extend(rejects)
+            if self.failures is not None:
+                self.failures.extend(failures)
+            for document_name, stats in worker_stats.items():
+                self.log.info(f"Worker {pid} : {document_name} collection, {count_rows} rows, {stats[INSERTED]} inserted, {stats[UPDATED]} updated, {stats[UNCHANGED]} unchanged, {stats[INVALID]} invalid, {stats[ERRORS]} errors.")
+                self.progress.update(document_name, count_rows)
+                totals = self.stats.setdefault(document_name, new_stats())
+                for key in totals:
+                    totals[key] += stats[key]
+
+
+    @timed_stage("write_df")
+    def write_df(self):
+        """
+        Build the documents of the dataframe and send them to their collections.
+        """
+        jsondocs, pks = self.fm.get_docs(self.df)
+        self.write_docs(jsondocs, pks, self.df)
+        return len(self.df)
+
+
+    def write_docs(self, jsondocs, pks, df=None):
+        """
+        Send documents built by FieldManager.get_docs to their collections, once checked against their schema.
+        df is the DataFrame of the documents, its rows are quarantined with the invalid documents.
+        """
+        for document_name, documents in jsondocs.items():
+            documents, doc_pks = self.check_documents(document_name, documents, pks, df)
+            if self.exporter is not None:
+                self.progress.update(document_name, len(documents))
+                self.stats.setdefault(document_name, new_stats())[EXPORTED] += self.exporter.write(document_name, documents)
+                continue
+            documents, doc_pks, fingerprints = self.select_changed(document_name, documents, doc_pks)
+            for document, pk, fingerprint in zip(documents, doc_pks, fingerprints):
+                self.write_document(document_name, document, pk, fingerprint)
+
+
+    def open_target(self):
+        """
+        Open the destination of the documents : export files, or MongoDB with the local run state.
+        """
+        if self.cfg[EXPORT_DIR]:
+            self.open_exporter()
+            return
+        if self.cfg[DRY_RUN]:
+            self.log.info("Dry run : no connection to MongoDB")
+            self.open_views()
+            return
+        self.connect_db()
+        self.open_manifest()
+        self.initialize_db()
+        self.open_id_index()
+        self.open_views()
+
+
+    def open_exporter(self):
+        """
+        Export mode : documents are written to compressed part files under EXPORT_DIR/<dbname> instead of MongoDB.
+        """
+        if self.exporter is None:
+            directory = os.path.join(self.cfg[EXPORT_DIR], self.cfg[DBNAME])
+            self.exporter = Exporter(directory, self.cfg[EXPORT_FORMAT], self.cfg[EXPORT_PART_SIZE] or DFT_PART_DOCS, self.fm.settings_hash)
+            self.log.info(f"Export mode : {self.cfg[EXPORT_FORMAT]} files in {directory}, parts of {self.exporter.part_docs} documents.")
+        return self.exporter
+
+
+    def close_exporter(self):
+        """
+        Close the export files and write their manifest.
+        """
+        if self.exporter is not None:
+            manifest = self.exporter.close()
+            for document_name, collection in manifest["collections"].items():
+                self.log.info(f"{document_name} collection : {collection['documents']} documents exported in {len(collection['parts'])} parts.")
+            self.exporter = None
+
+
+    def open_reject_sink(self):
+        """
+        Open the quarantine file of the rows rejected during the run, under logs/.
+        """
+        if self.cfg[REJECTS_FORMAT] and self.fm.reject_sink is None:
+            filepath = os.path.join("logs", f"rejects_{datetime.now():%Y%m%d_%H%M%S}.{self.cfg[REJECTS_FORMAT]}")
+            self.fm.reject_sink = RejectSink(filepath, self.cfg[REJECTS_FORMAT])
+        self.open_failure_sink()
+        return self.fm.reject_sink
+
+
+    def open_failure_sink(self):
+        """
+        Open the file of the documents which could not be written, under logs/.
+        """
+        if self.cfg[REJECTS_FORMAT] and self.failures is None:
+            filepath = os.path.join("logs", f"failed_writes_{datetime.now():%Y%m%d_%H%M%S}.{self.cfg[REJECTS_FORMAT]}")
+            self.failures = RejectSink(filepath, self.cfg[REJECTS_FORMAT])
+        return self.failures
+
+
+    def close_reject_sink(self):
+        """
+        Write the pending rejects and close the quarantine file.
+        """
+        if self.fm.reject_sink is not None:
+            self.fm.reject_sink.close()
+            self.fm.reject_sink = None
+        if self.failures is not None:
+            self.failures.close()
+            self.failures = None
+
+
+    def open_manifest(self, refresh=True):
+        """
+        Delta mode : open the local manifest of the fingerprints of the documents written.
+        With refresh, the fingerprints of a collection are deleted when they outnumber its documents on the server
+        (collection dropped or restored) : documents missing from the server would be skipped as unchanged.
+        """
+        if not self.cfg[DELTA_MODE] or self.manifest is not None:
+            return self.manifest
+        self.manifest = DocumentManifest(os.path.join(self.cfg[STATE_DIR], f"manifest_{self.cfg[DBNAME]}.sqlite"))
+        if refresh and self.db is not None:
+            for document_name in sorted(set(self.fm.get_masterdoc_list())):
+                count = self.db[document_name].estimated_document_count()
+                stored = self.manifest.count(document_name)
+                if stored > count:
+                    self.log.warning(f"Document manifest of collection {document_name} : {stored} fingerprints for {count} documents.")
+                    self.manifest.clear(document_name)
+        return self.manifest
+
+
+    def open_views(self):
+        """
+        Open the summary views of VIEWS_SETTINGS and the local contributions of the rows, not stored in a dry run.
+        A view without contributions is rebuilt : its collection is dropped, then filled by the run.
+        """
+        if not self.cfg[VIEWS_SETTINGS] or self.views is not None:
+            return self.views
+        if not os.path.exists(self.cfg[VIEWS_SETTINGS]):
+            self.log.warning(f"Views settings {self.cfg[VIEWS_SETTINGS]} not found, no summary views.")
+            return None
+        try:
+            store = ViewContributions(os.path.join(self.cfg[STATE_DIR], f"views_{self.cfg[DBNAME]}.sqlite")) if self.db is not None else None
+            self.views = ViewManager(self.cfg[VIEWS_SETTINGS], self.fm.fields, store, self.fm.get_masterdoc_list())
+        except ValueError as e:
+            handle_critical(f"Views settings {self.cfg[VIEWS_SETTINGS]} : {e}")
+        if self.cfg[TRACE_ONLY] or self.db is None:
+            return self.views
+        for view in self.views.views:
+            if self.cfg[CLEAN_DB]:
+                store.clear(view.name)
+            if not store.count(view.name):
+                self.log.warning(f"View {view.name} : no stored contributions, collection rebuilt.")
+                self.db.drop_collection(view.name)
+        return self.views
+
+
+    def pop_unwritten(self):
+        """
+        Get and reset the _id of the documents not written since the last call, by collection.
+        """
+        for document_name, writer in self.writers.items():
+            self.unwritten.setdefault(document_name, set()).update(writer.failed_ids)
+            writer.failed_ids.clear()
+        unwritten, self.unwritten = self.unwritten, {}
+        return unwritten
+
+
+    def update_views(self, df):
+        """
+        Apply the written rows of a cleaned and deduplicated DataFrame to the summary views, by deltas on the changed groups.
+        Called once the documents of df are written : a row is left out of a view when its document of the view collection was not.
+        Contributions are stored once the view is written, in trace only mode nothing is written.
+        """
+        unwritten = self.pop_unwritten()
+        if self.views is None or df.empty:
+            return
+        df = self.fm.add_key_columns(df)
+        ids = {document_name: df[self.fm.get_id_field(document_name)].tolist() for document_name in self.views.get_collections()}
+        for name, (operations, contributions) in self.views.get_updates(df, ids, unwritten).items():
+            self.log.info(f"View {name} : {len(contributions)} rows changed, {max(0, len(operations) - 1)} groups updated.")
+            if self.cfg[TRACE_ONLY] or self.db is None:
+                continue
+            if operations:
+                collection = self.get_collection(name)
+                try:
+                    self.get_controller(name).call(lambda: collection.bulk_write(operations, ordered=True))
+                except (BulkWriteError, PyMongoError) as e:
+                    # groups before the error are updated, the stored contributions no longer match the view
+                    errors = e.details.get("writeErrors", []) if isinstance(e, BulkWriteError) else []
+                    self.views.stats[name][FAILED] += len(contributions)
+                    self.log.error(f"View {name} : update failed, {errors[0].get('errmsg') if errors else e}. Rebuild the view with CLEAN_DB or by deleting its contributions file.")
+                    continue
+            self.views.store.save(name, contributions)
+
+
+    def close_views(self):
+        """
+        Close the contributions of the summary views.
+        """
+        if self.views is not None:
+            if self.views.store is not None:
+                self.views.store.close()
+            self.views = None
+
+
+    def open_id_index(self, refresh=True):
+        """
+        _id index mode : open the local index of the _id of each collection, bulk writes only.
+        With refresh, the index of a collection is rebuilt by a projected _id scan when its count differs from the server one.
+        """
+        if not self.cfg[ID_INDEX] or not self.cfg[BATCH_SIZE] or self.cfg[TRACE_ONLY] or self.id_index is not None:
+            return self.id_index
+        self.id_index = IdIndex(os.path.join(self.cfg[STATE_DIR], f"ids_{self.cfg[DBNAME]}.sqlite"))
+        if refresh:
+            for document_name in self.fm.get_masterdoc_list():
+                count = self.db[document_name].estimated_document_count()
+                if count != self.id_index.count(document_name):
+                    cursor = self.db[document_name].find({}, {PK_ID: 1}, batch_size=DFT_CHUNK_SIZE)
+                    count = self.id_index.rebuild(document_name, (document[PK_ID] for document in cursor))
+                    self.log.info(f"_id index of collection {document_name} rebuilt from a projected scan : {count} documents.")
+                else:
+                    self.log.info(f"_id index of collection {document_name} up to date : {count} documents.")
+        return self.id_index
+
+
+    def log_id_plan(self):
+        """
+        Log the number of new and existing documents of the dataframe for each collection, from the _id index.
+        """
+        self.df = self.fm.add_key_columns(self.df)
+        for document_name in self.fm.get_masterdoc_list():
+            ids = self.df[self.fm.get_id_field(document_name)].unique().tolist()
+            count_existing = len(self.id_index.get_existing(document_name, ids))
+            self.log.info(f"{document_name} collection : {len(ids) - count_existing} new documents to insert, {count_existing} existing to replace.")
+
+
+    def get_validator(self, document_name):
+        """
+        Get (or compile) the local validator of a collection, from the JSON Schema of its MongoDB validator.
+        """
+        if document_name not in self.validators:
+            schema = self.fm.build_mongodb_schema()[document_name]
+            self.validators[document_name] = SchemaValidator(document_name, schema)
+        return self.validators[document_name]
+
+
+    def check_documents(self, document_name, documents, pks, df=None):
+        """
+        Check a batch of documents against the JSON Schema of their collection before they are sent.
+        Invalid documents are counted and their rows of df quarantined with the failing field, return the valid documents and primary keys.
+        """
+        if not self.cfg[SCHEMA_CHECK] or not documents:
+            return documents, pks
+        invalid = self.get_validator(document_name).validate_batch(documents)
+        if not invalid:
+            return documents, pks
+        self.stats.setdefault(document_name, new_stats())[INVALID] += len(invalid)
+        self.unwritten.setdefault(document_name, set()).update(documents[i][PK_ID] for i in invalid)
+        positions = list(invalid)
+        path, reason = invalid[positions[0]][0]
+        self.log.warning(f"{document_name} collection : {len(invalid)} documents do not match the JSON Schema, first {pks[positions[0]]} : {path} {reason}")
+        if self.fm.reject_sink is not None:
+            # one reject per document and failing field, grouped by field and reason
+            groups = {}
+            for position, errors in invalid.items():
+                for error in errors:
+                    groups.setdefault(error, []).append(position)
+            for (path, reason), group in groups.items():
+                if df is not None:
+                    # source columns, without the key columns
+                    rows = df.take(group)[[column for column in df.columns if not column.startswith(PK_ID)]]
+                else:
+                    rows = pd.DataFrame({PK_ID: [documents[i][PK_ID] for i in group], "pk": [pks[i] for i in group]})
+                self.fm.reject_sink.add(rows, f"{document_name}.{path}", JSON_SCHEMA_CHECK, reason, FAILED_ACTION)
+        kept = [i for i in range(len(documents)) if i not in invalid]
+        return [documents[i] for i in kept], [pks[i] for i in kept]
+
+
+    def select_changed(self, document_name, documents, pks):
+        """
+        Delta mode : keep only new or changed documents, comparing their fingerprint with the manifest.
+        Return the kept documents, primary keys and fingerprints.
+        """
+        if self.manifest is None:
+            return documents, pks, [None] * len(documents)
+        fingerprints = [get_fingerprint(document) for document in documents]
+        stored = self.manifest.get_fingerprints(document_name, [document[PK_ID] for document in documents])
+        kept = [i for i, document in enumerate(documents)
+                if fingerprints[i] is None or stored.get(document[PK_ID]) != fingerprints[i]]
+        stats = self.stats.setdefault(document_name, new_stats())
+        stats[UNCHANGED] += len(documents) - len(kept)
+        return [documents[i] for i in kept], [pks[i] for i in kept], [fingerprints[i] for i in kept]
+
+
+    def mark_seen_keys(self):
+        """
+        Record the primary keys of the dataframe, return how many were already seen in previous chunks.
+        """
+        count_seen = 0
+        self.df = self.fm.add_key_columns(self.df)
+        for pk_hash in self.df[self.fm.get_id_field('care')]:
+            # 16 bytes of the _id keep the set compact on multi-million rows files
+            key = bytes.fromhex(pk_hash[:32])
+            if key in self.seen_keys:
+                count_seen += 1
+            else:
+                self.seen_keys.add(key)
+        return count_seen
+
+
+    def log_summary(self, count_rows):
+        """
+        Log the per collection counters at the end of the migration.
+        """
+        if self.progress.count:
+            self.progress.report()
+        totals = new_stats()
+        for document_name, stats in self.stats.items():
+            self.log.info(f"{document_name} collection : {stats[INSERTED]} inserted, {stats[UPDATED]} updated, {stats[UNCHANGED]} unchanged, {stats[SKIPPED]} skipped, {stats[EXPORTED]} exported, {stats[INVALID]} invalid, {stats[ERRORS]} errors.")
+            for key in totals:
+                totals[key] += stats[key]
+        self.log.info(f"Migration complete: {totals[INSERTED]} documents inserted, {totals[UPDATED]} updated, {totals[UNCHANGED]} unchanged, {totals[SKIPPED]} skipped, {totals[EXPORTED]} exported, {totals[INVALID]} invalid, {totals[ERRORS]} errors out of {count_rows} rows processed.")
+        for stats in self.file_stats:
+            self.log.info(f"File {stats[FILE]} : {stats[LOADED]} rows loaded, {stats[EXCLUDED]} excluded, {stats[REJECTED]} values rejected, {stats[DUPLICATES]} duplicates, {stats[SUPERSEDED]} superseded by later files, {stats[KEPT]} kept.")
+        self.log_controllers()
+        if self.views is not None:
+            for name, stats in self.views.stats.items():
+                self.log.info(f"View {name} : {stats[CHANGED]} rows changed, {stats[GROUPS]} group updates, {stats[FAILED]} rows failed.")
         self.log.info(BLANK)
 
 
+    def log_controllers(self):
+        """
+        Log the decisions of the batch controllers : batch sizes and retries.
+        """
+        for document_name, controller in self.controllers.items():
+            self.log.info(f"{document_name} collection : {controller.get_summary()}")
+
+
+    def get_controller(self, document_name, batch_size=None):
+        """
+        Get (or create) the batch controller of a collection, starting from batch_size or BATCH_SIZE.
+        """
+        if document_name not in self.controllers:
+            self.controllers[document_name] = BatchController(document_name, batch_size or self.cfg[BATCH_SIZE] or 1, self.cfg[MIN_BATCH_SIZE], self.cfg[MAX_BATCH_SIZE],
+                                                              target_latency=self.cfg[TARGET_LATENCY] / 1000, max_retries=self.cfg[MAX_RETRIES],
+                                                              backoff=self.cfg[RETRY_BACKOFF] / 1000, adaptive=self.cfg[ADAPTIVE_BATCH])
+        return self.controllers[document_name]
+
+
+    def write_metrics(self):
+        """
+        Write the run metrics under METRICS_DIR : a JSON report and a Prometheus textfile collector file.
+        """
+        if not self.cfg[METRICS_DIR]:
+            return None
+        for name, stage in self.metrics.get_report()["stages"].items():
+            self.log.info(f"Stage {name} : {stage[CALLS]} calls, {stage[WALL]:.3f}s wall, {stage[CPU]:.3f}s CPU, {stage[ROWS]} rows, {stage[ROWS_PER_S]} rows/s")
+        filepath = self.metrics.write_json(os.path.join(self.cfg[METRICS_DIR], f"metrics_{datetime.now():%Y%m%d_%H%M%S}.json"), self.stats)
+        self.metrics.write_prometheus(os.path.join(self.cfg[METRICS_DIR], PROM_FILE), self.stats)
+        self.log.info(f"Run metrics written in {filepath}")
+        return filepath
+
+
+    def get_writer(self, document_name):
+        """
+        Get (or create) the bulk writer of a collection.
+        """
+        if document_name not in self.writers:
+            self.writers[document_name] = BulkWriter(self.get_collection(document_name), self.cfg[BATCH_SIZE], ordered=self.cfg[BULK_ORDERED],
+                                                     stats=self.stats.setdefault(document_name, new_stats()),
+                                                     manifest=self.manifest, metrics=self.metrics, id_index=self.id_index,
+                                                     controller=self.get_controller(document_name), failures=self.failures)
+        return self.writers[document_name]
+
+
+    def flush_writers(self):
+        """
+        Send the pending batches of every collection.
+        """
+        for writer in self.writers.values():
+            writer.flush()
+        if self.id_index is not None:
+            self.id_index.commit()
+
+
+    def write_document(self, document_name, document, pk, fingerprint=None):
+        """
+        Send a document to its collection : bulk writer, single upsert or trace only.
+        Progress is aggregated, only sampled documents get a detail line.
+        """
+        self.progress.update(document_name)
+        if self.progress.is_sampled():
+            self.log.info("%s collection : sampled document %s, trace only: %s", document_name, document, self.cfg[TRACE_ONLY])
+        if self.cfg[TRACE_ONLY]:
+            self.stats.setdefault(document_name, new_stats())[SKIPPED] += 1
+        elif self.cfg[BATCH_SIZE]:
+            self.get_writer(document_name).add(document, pk, fingerprint)
+        else:
+            self.replace_document(document_name, document, pk, fingerprint)
+
+
+    def replace_document(self, document_name, document, pk, fingerprint=None):
+        """
+        Upsert a single document into the MongoDB collection.
+        """
+        stats = self.stats.setdefault(document_name, new_stats())
+        collection = self.get_collection(document_name)
+        try:
+            started = time.perf_counter()
+            result = self.get_controller(document_name).call(lambda: collection.replace_one({PK_ID: document[PK_ID]}, document, upsert=True))
+            self.metrics.record_write(document_name, time.perf_counter() - started, 1)
+            operation = INSERTED if result.upserted_id else UPDATED
+            stats[operation] += 1
+            self.log.debug("%s collection : %s %s: %s", document_name, document[PK_ID], operation, pk)
+            if self.manifest is not None:
+                self.manifest.save(document_name, [(document[PK_ID], fingerprint)])
+        except Exception as e:
+            stats[ERRORS] += 1
+            self.unwritten.setdefault(document_name, set()).add(document[PK_ID])
+            self.log.warning(f"Error inserting row {e}  /n{pk}")
+            if self.failures is not None:
+                self.failures.add(pd.DataFrame({PK_ID: [document[PK_ID]], "pk": [pk]}), document_name, FAILED_WRITE, str(e), FAILED_ACTION)
+
+
     def upsert_row(self, row : dict):
         """
         Upsert a dataframe row into the MongoDB collection.
@@ -132,69 +853,67 @@ class Engine():
         jsondoc , pk = self.fm.get_doc(row)
         
         for document_name, document in jsondoc.items():
-
-            self.log.debug(f"Document constructed: {document}")
-            if not CFG[TRACE_ONLY]:
-                try:
-                    result = self.db[document_name].replace_one({PK_ID: document[PK_ID]}, document, upsert=True)
-                    operation = "inserted" if result.upserted_id else "updated"
-                    self.log.info(f"{document_name} collection : {document[PK_ID]} {operation}: {pk}")
-                except Exception as e:
-                    self.log.warning(f"Error inserting row {e}  /n{pk}")
-            else:
-                self.log.info("Document non upserted - Trace Only mode")
+            self.progress.update(document_name)
+            self.log.debug("Document constructed: %s", document)
+            if not self.cfg[TRACE_ONLY]:
+                self.replace_document(document_name, document, pk)
         return jsondoc
                 
 
+    @timed_stage("initialize_db", data=False)
     def initialize_db(self):
         """
-        Initialize the database collections, schema, indexes and roles.
+        Initialize the database collections, schema, indexes and roles, each collection independently.
+        In bulk load mode, new collections are created bare : indexes and validation are deferred to finalize_db.
         """
         self.log.info("Try to initialize MongoDB.")
 
-        if CFG[TRACE_ONLY] :
+        if self.cfg[TRACE_ONLY] :
             self.log.info("Db initialization non performed - Trace Only mode")
             return
         self.log.info("Db initialization started")
 
         json_schema = self.fm.build_mongodb_schema()
-        dbname = CFG[DBNAME]                
+        dbname = self.cfg[DBNAME]                
 
         # browse through master collections to delete
         for docname, schema_doc in json_schema.items():
 
             # Clean DB, security, schema and index , only in test mode
-            if CFG[CLEAN_DB]:
+            if self.cfg[CLEAN_DB]:
                 self.log.warning(f"Collection '{docname}': data, schema and index deletion.")
                 self.db.drop_collection(docname)
+                if self.manifest is not None:
+                    self.manifest.clear(docname)
+                if self.id_index is not None:
+                    self.id_index.clear(docname)
        
-            # exit function if collection already exists in db
+            # skip collection already existing in db, a bulk load without validation yet is finalized again
             if docname in self.db.list_collection_names():
-                self.log.info(f"Collection {docname} already exists, no modification applied.")
-                return
+                if self.cfg[BULK_LOAD] and not self.db[docname].options().get("validator"):
+                    self.log.info(f"Collection {docname} already exists without validation, indexes and validation deferred to the end of the load.")
+                    self.deferred.append(docname)
+                else:
+                    self.log.info(f"Collection {docname} already exists, no modification applied.")
+                continue
 
-        
             try:
-                self.log.debug(f"Collection {docname} JSON Schema validation : ")
-                self.log.debug(schema_doc)
+                if self.cfg[BULK_LOAD]:
+                    self.db.create_collection(docname)
+                    self.deferred.append(docname)
+                    self.log.info(f"Collection {docname} created for bulk load, indexes and validation deferred to the end of the load.")
+                    continue
+                self.log.debug("Collection %s JSON Schema validation : %s", docname, schema_doc)
                 self.db.create_collection(docname, validator=schema_doc)
                 self.log.info(f"Collection {docname} created with JSON Schema validation.")
             except pymongo.errors.CollectionInvalid as e:
                 self.log.warning(f"Error creating collection {docname} : {e}")
-                return
-            
+                continue
 
-            for index in self.fm.get_indexes(docname):
-                try:
-                    self.log.debug(f"Index de {docname}  : {index} ")
-                    self.log.debug(schema_doc)
-                    self.db[docname].create_index(index)
-                    self.log.info(f"Index {index} created.")
-                except pymongo.errors.OperationFailure as e:
-                    self.log.warning(f"Failed to create index {index}.", e)
+            self.create_indexes(docname)
 
         
-        if CFG[CLEAN_DB]:
+        if self.cfg[CLEAN_DB]:
             self.log.warning(f"All roles of Mongodb deletion.")
             self.db.command("dropAllRolesFromDatabase")
         replace_dict= {"${dbname}": dbname}
@@ -203,35 +922,143 @@ class Engine():
 
         for role in roles:
             try:
-                self.log.debug(f"JSON role : {str(role)} ")
+                self.log.debug("JSON role : %s", role)
                 self.db.command(role)
                 self.log.info(f"Role {role['createRole']} created.")
             except pymongo.errors.OperationFailure as e:
-                self.log.warning(f"Error during role {role['createRole']} creation :", e)
+                self.log.warning(f"Error during role {role['createRole']} creation : {e}")
         return self.db
 
 
+    def create_indexes(self, docname):
+        """
+        Create the indexes of a collection in one create_indexes call.
+        """
+        indexes = self.fm.get_indexes(docname)
+        if not indexes:
+            return
+        try:
+            self.log.debug("Index de %s : %s", docname, indexes)
+            self.db[docname].create_indexes([pymongo.IndexModel(index) for index in indexes])
+            self.log.info(f"Collection {docname} : indexes {indexes} created.")
+        except pymongo.errors.OperationFailure as e:
+            self.log.warning(f"Failed to create indexes {indexes} of collection {docname} : {e}")
+
+
+    @timed_stage("finalize_db", data=False)
+    def finalize_db(self):
+        """
+        Bulk load mode : build the deferred indexes of the loaded collections, then apply their validation with collMod.
+        """
+        if not self.deferred:
+            return
+        json_schema = self.fm.build_mongodb_schema()
+        for docname in self.deferred:
+            self.create_indexes(docname)
+            try:
+                self.db.command("collMod", docname, validator=json_schema[docname],
+                                validationLevel=VALIDATION_LEVEL, validationAction=VALIDATION_ACTION)
+                self.log.info(f"Collection {docname} : JSON Schema validation applied, level {VALIDATION_LEVEL}, action {VALIDATION_ACTION}.")
+                # documents loaded before the validation are not checked by collMod
+                count_invalid = self.db[docname].count_documents({"$nor": [json_schema[docname]]})
+                if count_invalid:
+                    self.log.warning(f"Collection {docname} : {count_invalid} documents loaded do not match the JSON Schema.")
+            except pymongo.errors.OperationFailure as e:
+                self.log.warning(f"Failed to apply the validation of collection {docname} : {e}")
+        self.deferred = []
+
+
+    def get_cnxstr(self):
+        """
+        Get the MongoDB connection string.
+        """
+        return f"mongodb://{self.cfg[USERNAME]}:{self.cfg[PASSWORD]}@{self.cfg[HOST]}:{self.cfg[PORT]}/"
+
+
+    def get_setting(self, key):
+        """
+        Get a connection setting : from the environment, else from the load profile.
+        """
+        if self.cfg[key] is not None:
+            return self.cfg[key]
+        return LOAD_PROFILES.get(self.cfg[LOAD_PROFILE], {}).get(key)
+
+
+    def get_compressors(self):
+        """
+        Get the wire compressors available among COMPRESSORS, as a MongoClient option.
+        """
+        compressors = []
+        for name in [name.strip().lower() for name in self.cfg[COMPRESSORS].split(",") if name.strip()]:
+            if name not in COMPRESSOR_MODULES:
+                self.log.warning(f"Unknown wire compressor {name}, ignored.")
+            elif importlib.util.find_spec(COMPRESSOR_MODULES[name]) is None:
+                self.log.warning(f"Wire compressor {name} needs the {COMPRESSOR_MODULES[name]} package, ignored.")
+            else:
+                compressors.append(name)
+        return ",".join(compressors) or None
+
+
+    def get_client_options(self):
+        """
+        Get the MongoClient options : pool sizes, timeouts and wire compression.
+        """
+        options = {
+            "maxPoolSize": self.get_setting(MAX_POOL_SIZE),
+            "minPoolSize": self.get_setting(MIN_POOL_SIZE),
+            "socketTimeoutMS": self.get_setting(SOCKET_TIMEOUT),
+            "serverSelectionTimeoutMS": self.get_setting(SERVER_SELECTION_TIMEOUT),
+            "compressors": self.get_compressors(),
+        }
+        return {name: value for name, value in options.items() if value is not None}
+
+
+    def get_write_concern(self):
+        """
+        Get the write concern of the write path : w, j and wtimeout.
+        """
+        w = self.get_setting(WRITE_CONCERN_W)
+        if isinstance(w, str) and w.isdigit():
+            w = int(w)
+        return WriteConcern(w=w, j=self.get_setting(JOURNAL), wtimeout=self.get_setting(WTIMEOUT))
+
+
+    def get_collection(self, document_name):
+        """
+        Get a collection of the write path, with the run write concern, built once per collection and database.
+        """
+        if self.collections_db is not self.db:
+            self.collections = {}
+            self.collections_db = self.db
+        if document_name not in self.collections:
+            self.collections[document_name] = self.db.get_collection(document_name, write_concern=self.get_write_concern())
+        return self.collections[document_name]
+
+
+    @timed_stage("connect_db", data=False)
     def connect_db(self):
         """
         Get the MongoDB database connection.
         """
         self.log.info("Try to connect to MongoDB.")
         try:
-            cnxstr = f"mongodb://{CFG[USERNAME]}:{CFG[PASSWORD]}@{CFG[HOST]}:{CFG[PORT]}/"
-            client = pymongo.MongoClient(cnxstr)
+            options = self.get_client_options()
+            write_concern = self.get_write_concern()
+            self.log.info(f"Connection settings - load profile: {self.cfg[LOAD_PROFILE] or 'default'}, client: {options or 'driver defaults'}, write concern: {write_concern.document or 'server default'}")
+            client = pymongo.MongoClient(self.get_cnxstr(), **options)
             # check if mongodb prod server
-            self.db = client[CFG[PROD_DBNAME]]
+            self.db = client[self.cfg[PROD_DBNAME]]
             coll_names = self.db.list_collection_names()
             first_collection = self.fm.get_masterdoc_list()[0]
-            if not CFG[DOCKMODE] and first_collection in coll_names:
+            if not self.cfg[DOCKMODE] and first_collection in coll_names:
                 handle_critical(f"Connected to Production MongoDB server not allowed")
                 return
 
-            self.db = client[CFG[DBNAME]]
+            self.db = client[self.cfg[DBNAME]]
             self.log.info("Connection established.")
             self.log.info(BLANK)
-        except pymongo.errors.OperationFailure as e:
-            handle_critical(f"No connection : review your .env settings", e)
+        except (pymongo.errors.PyMongoError, ValueError) as e:
+            handle_critical(f"No connection : review your .env settings : {e}")
         return self.db
     
     
@@ -239,18 +1066,149 @@ class Engine():
         """
         Transform and load the loaded DataFrame into MongoDB.
         """
-        self.log.info(f"Execution options - start: {CFG[START]}, limit: {CFG[LIMIT]}, TRACE_ONLY: {CFG[TRACE_ONLY]}")
+        self.log.info(f"Execution options - start: {self.cfg[START]}, limit: {self.cfg[LIMIT]}, batch size: {self.cfg[BATCH_SIZE]}, delta: {self.cfg[DELTA_MODE]}, TRACE_ONLY: {self.cfg[TRACE_ONLY]}")
 
-        self.connect_db()
-        self.initialize_db()
+        self.open_target()
+        self.open_reject_sink()
 
-        self.clean_df()
+        if self.cleaned:
+            self.log.info("Cleaned snapshot loaded : cleaning and duplicates removal skipped.")
+        else:
+            self.clean_df()
 
-        self.log.info("Remove  duplicates...")
-        self.df = self.make_unic_df()
+            self.log.info("Remove  duplicates...")
+            self.df = self.make_unic_df()
+            self.save_snapshot()
 
         self.upsert_rows()
+        self.finalize_db()
+        self.close_exporter()
+        self.close_reject_sink()
+        self.close_views()
+        self.write_metrics()
+
+        self.log.info(BLANK)
+
+
+    def import_stream(self, source):
+        """
+        Transform and load a CSV file into MongoDB chunk by chunk, memory stays bounded by CHUNK_SIZE.
+        A checkpoint is saved after each committed chunk, RESUME continues from the last one.
+        """
+        chunksize = self.cfg[CHUNK_SIZE] or DFT_CHUNK_SIZE
+        self.log.info(f"Execution options - start: {self.cfg[START]}, limit: {self.cfg[LIMIT]}, chunk size: {chunksize}, batch size: {self.cfg[BATCH_SIZE]}, delta: {self.cfg[DELTA_MODE]}, resume: {self.cfg[RESUME]}, TRACE_ONLY: {self.cfg[TRACE_ONLY]}")
+        if not os.path.exists(source):
+            handle_critical(f"DF loader : CSV {source} not found")
+        if self.cfg[EXPORT_DIR]:
+            # the export files are not rewritten, a row found in several chunks would be exported several times
+            handle_critical("Streaming is not available in export mode, export files need a full load deduplicated on _id")
+        if self.cfg[RESUME] and self.cfg[CLEAN_DB]:
+            handle_critical("Resume is not available with CLEAN_DB, the rows committed before the checkpoint would be dropped")
+
+        checkpoint = Checkpoint(os.path.join(self.cfg[STATE_DIR], f"checkpoint_{self.cfg[DBNAME]}.json"))
+        state = self.get_stream_state(checkpoint, source)
+        if state["complete"]:
+            self.log.info(f"Migration of {source} already complete at row {state['offset']}, nothing to resume.")
+            return
+
+        self.open_target()
+        self.open_reject_sink()
+
+        # duplicates of rows committed before a resume are not reported, latest still wins on _id
+        self.seen_keys = set()
+        self.progress.start()
+        count_rows = state["rows"]
+        count_chunks = 0
+        start = state["offset"]
+        limit = state["start"] + state["limit"] - start if state["limit"] else 0
+        executor = ProcessPoolExecutor(max_workers=self.cfg[WORKERS]) if self.is_parallel() else None
+        futures = []
+        pending = None
+        self.log.info(STARS)
+        self.log.info(f"Migration start, streaming {source} from row {start} by chunks of {chunksize} rows.")
+        for chunk in self.iter_chunks(source, chunksize, start, limit):
+            if not count_chunks and not self.check_columns(chunk):
+                handle_critical("End of migration due to wrong or empty data source")
+            count_chunks += 1
+            offset = chunk.index[-1] + 1
+            self.log.info(f"Chunk {count_chunks} : rows {chunk.index[0]} to {chunk.index[-1]}")
+            self.df = chunk
+            self.clean_df()
+            self.make_unic_df()
+
+            count_seen = self.mark_seen_keys()
+            if count_seen:
+                self.log.warning(f"Duplicates detected with previous chunks : {count_seen} rows, only latest is retained.")
+            if executor:
+                # previous chunk is written while this one was parsed, wait for it to keep latest wins
+                self.collect_partitions(futures)
+                if pending:
+                    self.update_views(pending[2])
+                    self.commit_chunk(checkpoint, state, *pending[:2])
+                futures = self.submit_partitions(executor)
+                count_rows += len(self.df)
+                pending = (offset, count_rows, self.df)
+            else:
+                count_rows += self.write_df()
+                self.flush_writers()
+                self.update_views(self.df)
+                self.commit_chunk(checkpoint, state, offset, count_rows)
 
+        if executor:
+            self.collect_partitions(futures)
+            executor.shutdown()
+            if pending:
+                self.update_views(pending[2])
+                self.commit_chunk(checkpoint, state, *pending[:2])
+        self.flush_writers()
+        self.finalize_db()
+        state["complete"] = True
+        self.commit_chunk(checkpoint, state, state["offset"], count_rows)
+        self.close_exporter()
+        self.close_reject_sink()
+        self.log_summary(count_rows)
+        self.close_views()
+        self.write_metrics()
         self.log.info(BLANK)
 
 
+    def get_stream_state(self, checkpoint, source):
+        """
+        Get the state of a streamed migration : a new one, or the last checkpoint when resuming.
+        """
+        identity = get_source_identity(source)
+        if self.cfg[RESUME]:
+            state = checkpoint.load()
+            if state is None:
+                self.log.warning(f"No checkpoint found in {checkpoint.filepath}, migration starts from the beginning.")
+            elif state["source"] != identity:
+                handle_critical(f"Checkpoint source {state['source']['path']} differs from {source} (size, date or hash), resume not possible")
+            elif state["settings_hash"] != self.fm.settings_hash:
+                handle_critical("Fields settings changed since the checkpoint, resume not possible")
+            else:
+                self.log.info(f"Resume from checkpoint {checkpoint.filepath} at row {state['offset']}, {state['rows']} rows already committed.")
+                for document_name, stats in state["stats"].items():
+                    self.stats[document_name] = {**new_stats(), **stats}
+                return state
+        return {
+            "source": identity,
+            "settings_hash": self.fm.settings_hash,
+            "start": self.cfg[START],
+            "limit": self.cfg[LIMIT],
+            "offset": self.cfg[START],
+            "rows": 0,
+            "stats": {},
+            "complete": False,
+        }
+
+
+    def commit_chunk(self, checkpoint, state, offset, count_rows):
+        """
+        Save a checkpoint once the writes of a chunk are committed.
+        """
+        if self.cfg[TRACE_ONLY] or self.cfg[EXPORT_DIR]:
+            return
+        state["offset"] = int(offset)
+        state["rows"] = count_rows
+        state["stats"] = self.stats
+        checkpoint.save(state)
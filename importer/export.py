@@ -0,0 +1,148 @@
+#importer/export.py
+
+from importer.state import get_file_hash
+from bson import json_util
+from bson.json_util import RELAXED_JSON_OPTIONS
+from datetime import datetime
+import bson
+import glob
+import gzip
+import json
+import logging
+import os
+
+JSONL = "jsonl"
+BSON = "bson"
+DFT_PART_DOCS = 1000000
+# fast compression, export files are transient
+GZIP_LEVEL = 1
+MANIFEST_FILE = "manifest.json"
+
+
+class ExportWriter():
+    """
+    Gzip compressed part files of the documents of one collection, Extended JSON lines or BSON.
+    """
+
+    def __init__(self, directory:str, collection:str, fmt:str=JSONL, part_docs:int=DFT_PART_DOCS):
+        """
+        Initialize the writer, part files of a previous export of the collection are deleted.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.directory = directory
+        self.collection = collection
+        self.fmt = fmt
+        self.part_docs = max(1, part_docs)
+        self.parts = []
+        self.file = None
+        self.filepath = None
+        self.count_part = 0
+        for filepath in glob.glob(os.path.join(directory, self.get_part_file("*"))):
+            os.remove(filepath)
+
+    def get_part_file(self, part:str):
+        """
+        Get the file of a part relative to the export directory : <collection>.<part>.jsonl.gz,
+        or <part>/<collection>.bson.gz as mongorestore takes the collection from the file name.
+        """
+        if self.fmt == BSON:
+            return os.path.join(part, f"{self.collection}.{self.fmt}.gz")
+        return f"{self.collection}.{part}.{self.fmt}.gz"
+
+    def open_part(self):
+        """
+        Open the next part file.
+        """
+        self.filepath = os.path.join(self.directory, self.get_part_file(f"{len(self.parts) + 1:04d}"))
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        self.file = gzip.open(self.filepath, "wb", compresslevel=GZIP_LEVEL)
+        self.count_part = 0
+
+    def close_part(self):
+        """
+        Close the current part file and record its count, size and sha256.
+        """
+        if self.file is None:
+            return
+        self.file.close()
+        self.parts.append({
+            "file": os.path.relpath(self.filepath, self.directory),
+            "documents": self.count_part,
+            "bytes": os.path.getsize(self.filepath),
+            "sha256": get_file_hash(self.filepath),
+        })
+        self.log.info(f"{self.collection} collection : part {self.filepath} written, {self.count_part} documents.")
+        self.file = None
+
+    def encode(self, documents:list):
+        """
+        Encode documents in the export format.
+        """
+        if self.fmt == BSON:
+            return b"".join(bson.encode(document) for document in documents)
+        return "".join(json_util.dumps(document, json_options=RELAXED_JSON_OPTIONS) + "\n" for document in documents).encode("utf-8")
+
+    def write(self, documents:list):
+        """
+        Append documents, a new part is started every part_docs documents.
+        """
+        start = 0
+        while start < len(documents):
+            if self.file is None or self.count_part >= self.part_docs:
+                self.close_part()
+                self.open_part()
+            end = start + self.part_docs - self.count_part
+            self.file.write(self.encode(documents[start:end]))
+            self.count_part += len(documents[start:end])
+            start = end
+
+    def close(self):
+        """
+        Close the last part, return the collection summary.
+        """
+        self.close_part()
+        return {"documents": sum(part["documents"] for part in self.parts), "parts": self.parts}
+
+
+class Exporter():
+    """
+    Export of the documents of every collection to files for mongoimport or mongorestore, with a manifest.
+    """
+
+    def __init__(self, directory:str, fmt:str=JSONL, part_docs:int=DFT_PART_DOCS, settings_hash:str=None):
+        """
+        Initialize the export directory.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.directory = directory
+        self.fmt = fmt
+        self.part_docs = part_docs
+        self.settings_hash = settings_hash
+        self.writers = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, collection:str, documents:list):
+        """
+        Append documents to the files of a collection.
+        """
+        if collection not in self.writers:
+            self.writers[collection] = ExportWriter(self.directory, collection, self.fmt, self.part_docs)
+        self.writers[collection].write(documents)
+        return len(documents)
+
+    def close(self):
+        """
+        Close every collection and write the manifest of counts and checksums.
+        """
+        manifest = {
+            "created": datetime.now().isoformat(),
+            "format": self.fmt,
+            "compression": "gzip",
+            "settings_hash": self.settings_hash,
+            "collections": {collection: writer.close() for collection, writer in self.writers.items()},
+        }
+        filepath = os.path.join(self.directory, MANIFEST_FILE)
+        with open(filepath, "w", encoding="utf8") as f:
+            json.dump(manifest, f, indent=2)
+        self.log.info(f"Export manifest {filepath} written.")
+        return manifest
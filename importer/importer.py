@@ -1,69 +1,193 @@
 #importer/importer.py
 
-from importer.engine import *
-import os
-from dotenv import load_dotenv
+# only the settings are imported here : pandas, pymongo and the engine are loaded by the commands
+from importer.config import *
+from importer.logger import LOG_FILE, start_logging, stop_logging
+import argparse
 import logging
+import sys
 
-load_dotenv(".env")
-
-def get_bool(value):
-    return value.lower() in ["true", "1", "yes"]
-
-dockmode = get_bool(os.getenv("DOCKMODE", "0"))
-dbname = prod_dbname = os.getenv("MONGO_DB_NAME","healthcare")
-
-# possibly overwrite CFG in interactive/test mode 
-if not dockmode and os.path.exists(".test.env"):
-    load_dotenv(".test.env", override=True)
-    # ensure dbname in test mode is different from dock mode
-    dbname = os.getenv("MONGO_DB_NAME", "healthcare")
-    if dbname == prod_dbname:
-        dbname = f"test{prod_dbname}"
-
-# Loads environment variables from `.env`(+`.test.env`)
-CFG = {
-    DBNAME : dbname,
-    USERNAME : os.getenv("MONGO_INITDB_ROOT_USERNAME",None),
-    PASSWORD : os.getenv("MONGO_INITDB_ROOT_PASSWORD", None),
-    HOST : os.getenv("MONGO_HOST", "mongo") if dockmode else "localhost" ,
-    PORT: int(os.getenv("MONGO_PORT", 27017)),
-    DEBUG_MODE : get_bool(os.getenv("MIGRATION_DEBUG", "0")),
-    START : int(os.getenv("START", 0)),
-    LIMIT : int(os.getenv("LIMIT", 0)),
-    TRACE_ONLY : get_bool(os.getenv("DEBUG_TRACE_ONLY", "1")) and not dockmode,
-    CLEAN_DB : get_bool(os.getenv("CLEAN_DB", "0")) and not dockmode,  # ONLY IN TEST MODE !!!
-    PROD_DBNAME : prod_dbname,
-    DOCKMODE : dockmode,
-}
-
-
-# Logger configuration
-loglvl = logging.INFO if not CFG[DEBUG_MODE] else logging.DEBUG
-logging.basicConfig(
-    filename="logs/migration_healthcare.log", 
-    level=loglvl, 
-    format="%(asctime)s - %(levelname)s - %(message)s")
-logging.info("Logger configured")
-
-if not CFG[USERNAME] or not CFG[PASSWORD]:
-    logging.critical("Invalid username and/or password in your .env, must be both filled")
-    handle_critical("Consult readme about .env, environment variables and setup process")
-
-
-importer = Engine(CFG)
+COMMANDS = ["import", "init-db", "dry-run", "validate", "export", "bench"]
+# commands working without MongoDB
+OFFLINE_COMMANDS = ["dry-run", "validate", "export", "bench"]
+
+
+def configure_logging(config:Config):
+    """
+    Log to logs/migration_healthcare.log from a background thread, debug level with MIGRATION_DEBUG.
+    """
+    loglvl = logging.INFO if not config[DEBUG_MODE] else logging.DEBUG
+    start_logging(LOG_FILE, loglvl)
+    logging.info("Logger configured")
+
+
+def get_engine(config:Config):
+    """
+    Get the engine of a run : async pipeline or synchronous engine, export mode writes files from the synchronous one.
+    """
+    if config[ASYNC_MODE] and not config[EXPORT_DIR]:
+        from importer.async_engine import AsyncEngine
+        return AsyncEngine(config)
+    from importer.engine import Engine
+    return Engine(config)
+
+
+def run_import(config:Config):
+    """
+    Migrate the source : async pipeline, chunked stream or full load, return the engine.
+    """
+    import asyncio
+    from importer.engine import get_source_files, handle_critical, BLANK, STARS
+    importer = get_engine(config)
+    # several files are merged in one full load, streaming modes read a single file
+    filepaths = get_source_files(config[SOURCE])
+    multi_files = len(filepaths) != 1
+    async_mode = hasattr(importer, "import_async")
 
-if __name__ == "__main__":
     logging.info(STARS)
-    logging.info(f"Starting migration to DB {CFG[DBNAME]}")
-    logging.info(f"Running environment : {'PRODUCTION' if dockmode else 'TESTING'}")
-    
-    if importer.load_df("data/healthcare_dataset.csv").empty:
+    logging.info(f"Starting migration to DB {config[DBNAME]}")
+    logging.info(f"Running environment : {'PRODUCTION' if config[DOCKMODE] else 'TESTING'}")
+
+    # a chunked export would write again the _id of the rows found in several chunks
+    stream = (config[CHUNK_SIZE] or config[RESUME]) and not multi_files and not config[EXPORT_DIR]
+    if multi_files and (async_mode or config[CHUNK_SIZE] or config[RESUME]):
+        logging.warning(f"Several source files : async and chunked modes not available, full load of {config[SOURCE]}")
+    elif config[EXPORT_DIR] and config[CHUNK_SIZE]:
+        logging.warning(f"Export mode : chunked mode not available, full load of {config[SOURCE]}")
+    if async_mode and not multi_files:
+        asyncio.run(importer.import_async(filepaths[0]))
+    elif stream:
+        importer.import_stream(filepaths[0])
+    elif importer.load_sources(config[SOURCE]).empty:
         handle_critical("End of migration due to wrong or empty data source")
     else:
         importer.import_df()
-    
-    logging.info(f"End of migration to DB {CFG[DBNAME]}")
+
+    logging.info(f"End of migration to DB {config[DBNAME]}")
     logging.info(BLANK)
     logging.info(STARS)
-    logging.info(BLANK)
\ No newline at end of file
+    logging.info(BLANK)
+    return importer
+
+
+def report_validation(importer):
+    """
+    Print the JSON Schema check of each collection, return the number of invalid documents.
+    """
+    invalid = 0
+    for name, validator in importer.validators.items():
+        print(f"{name} collection : {validator.count} documents checked, {validator.invalid} invalid")
+        invalid += validator.invalid
+    return invalid
+
+
+def run_init_db(config:Config):
+    """
+    Create the collections with their validators, indexes and roles, without data.
+    """
+    from importer.engine import Engine
+    engine = Engine(config)
+    engine.connect_db()
+    engine.initialize_db()
+    engine.finalize_db()
+
+
+def run_bench(argv:list):
+    """
+    Run the stages benchmark, arguments of python -m importer.bench, return its exit code.
+    """
+    from importer.bench import main
+    return main(argv)
+
+
+def get_parser():
+    """
+    Get the command line parser, a subcommand per mode.
+    """
+    parser = argparse.ArgumentParser(description="Healthcare CSV migration to MongoDB")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    source = argparse.ArgumentParser(add_help=False)
+    source.add_argument("source", nargs="?", help="CSV file, directory or glob of CSV files (.csv, .csv.gz, .csv.zst), default SOURCE")
+    source.add_argument("--clear-cache", action="store_true", help="delete the cleaned snapshots before the migration")
+    source.add_argument("--check", action="store_true", help="only validate the settings")
+
+    command = commands.add_parser("import", parents=[source], help="migrate the source into MongoDB (default command)")
+    command.add_argument("--resume", action="store_true", help="continue a streamed migration from its last checkpoint")
+    command = commands.add_parser("init-db", help="create collections, validators, indexes and roles without data")
+    command.add_argument("--check", action="store_true", help="only validate the settings")
+    commands.add_parser("dry-run", parents=[source], help="load, clean and build the documents without MongoDB")
+    commands.add_parser("validate", parents=[source], help="check the documents of the source against the collections JSON Schema, without MongoDB")
+    command = commands.add_parser("export", parents=[source], help="write mongoimport / mongorestore files instead of MongoDB")
+    command.add_argument("--dir", help="export directory, default EXPORT_DIR or export")
+    command.add_argument("--format", choices=CHOICES[EXPORT_FORMAT], help="export files format, default EXPORT_FORMAT")
+    commands.add_parser("bench", add_help=False, help="benchmark the stages on synthetic datasets, see bench --help")
+    return parser
+
+
+def get_config(args, config:Config=None):
+    """
+    Apply the command line to the environment settings.
+    """
+    config = Config.from_env() if config is None else config
+    config[SOURCE] = getattr(args, "source", None) or config[SOURCE]
+    config[CLEAR_CACHE] = config[CLEAR_CACHE] or getattr(args, "clear_cache", False)
+    config[RESUME] = config[RESUME] or getattr(args, "resume", False)
+    if args.command in ["dry-run", "validate"]:
+        config[TRACE_ONLY] = True
+        config[DRY_RUN] = True
+        config[ASYNC_MODE] = False
+    if args.command == "validate":
+        config[SCHEMA_CHECK] = True
+        config[VIEWS_SETTINGS] = ""
+    elif args.command == "export":
+        config[EXPORT_DIR] = args.dir or config[EXPORT_DIR] or "export"
+        config[EXPORT_FORMAT] = args.format or config[EXPORT_FORMAT]
+    elif args.command == "init-db":
+        # indexes and validators are created at once
+        config[BULK_LOAD] = False
+        config[TRACE_ONLY] = False
+    return config
+
+
+def main(argv:list=None, config:Config=None):
+    """
+    Command line entry point : python importer.py [import|init-db|dry-run|export|bench] ...
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ["-h", "--help"]):
+        argv = ["import"] + argv
+    if argv[0] == "bench":
+        return run_bench(argv[1:])
+    args = get_parser().parse_args(argv)
+
+    config = get_config(args, config)
+    errors = config.validate(connect=args.command not in OFFLINE_COMMANDS)
+    if errors:
+        for error in errors:
+            print(f"Configuration error : {error}", file=sys.stderr)
+        sys.exit(2)
+    if args.check:
+        print("Configuration valid")
+        return config
+
+    configure_logging(config)
+    try:
+        if args.command == "init-db":
+            run_init_db(config)
+        elif args.command == "validate":
+            invalid = report_validation(run_import(config))
+        else:
+            run_import(config)
+    finally:
+        stop_logging()
+    if args.command == "validate" and invalid:
+        sys.exit(1)
+    return config
+
+
+if __name__ == "__main__":
+    # the bench command returns its exit code, the other commands their config
+    result = main()
+    if isinstance(result, int):
+        sys.exit(result)
@@ -0,0 +1,140 @@
+#importer/logger.py
+
+# standard library only : imported by the command line before pandas and pymongo
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import logging
+import os
+import queue
+import time
+
+LOG_FILE = "logs/migration_healthcare.log"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+DFT_PROGRESS_INTERVAL = 10
+
+listener = None
+
+
+def start_logging(filename:str=LOG_FILE, level:int=logging.INFO, fmt:str=LOG_FORMAT):
+    """
+    Log to a file from a background thread : the root logger only puts records in a queue (QueueHandler),
+    a QueueListener formats and writes them. Stopped at exit, so that every queued record is written.
+    """
+    global listener
+    stop_logging()
+    handler = logging.FileHandler(filename)
+    handler.setFormatter(logging.Formatter(fmt))
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    for previous in root.handlers[:]:
+        if isinstance(previous, QueueHandler):
+            root.removeHandler(previous)
+    root.addHandler(QueueHandler(records))
+    root.setLevel(level)
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logging():
+    """
+    Stop the listener thread once the queued records are written, the file handler is closed.
+    """
+    global listener
+    if listener is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    listener = None
+
+
+def log_directly():
+    """
+    Replace the queue by the file handler in a forked worker process : the listener thread is not copied by fork.
+    """
+    global listener
+    if listener is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    for handler in listener.handlers:
+        root.addHandler(handler)
+    listener = None
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=log_directly)
+
+
+class Progress():
+    """
+    Aggregated progress of the documents sent to their collections, instead of a log line per document :
+    counts, rate and ETA logged every interval seconds, and a detail line every sample_every documents (0 : none).
+    """
+
+    def __init__(self, log:logging.Logger, interval:float=DFT_PROGRESS_INTERVAL, sample_every:int=0):
+        """
+        Initialize the progress of a run.
+        """
+        self.log = log
+        self.interval = interval
+        self.sample_every = sample_every
+        self.start()
+
+    def start(self, total:int=0):
+        """
+        Start counting, total is the number of documents expected, 0 when unknown (no ETA).
+        """
+        self.total = total
+        self.count = 0
+        self.counts = {}
+        self.sampled = 0
+        self.started = self.reported = time.monotonic()
+
+    def update(self, name:str, count:int=1):
+        """
+        Count documents sent to a collection, log a progress record when the interval has elapsed.
+        """
+        self.count += count
+        self.counts[name] = self.counts.get(name, 0) + count
+        now = time.monotonic()
+        if now - self.reported >= self.interval:
+            self.report(now)
+
+    def is_sampled(self):
+        """
+        Tell if the current document gets a detail line.
+        """
+        if not self.sample_every:
+            return False
+        self.sampled += 1
+        return self.sampled % self.sample_every == 0
+
+    def get_rate(self, now:float=None):
+        """
+        Get the documents per second since the start.
+        """
+        seconds = (now or time.monotonic()) - self.started
+        return self.count / seconds if seconds > 0 else 0.0
+
+    def report(self, now:float=None):
+        """
+        Log the counts per collection, the rate and the ETA when the total is known.
+        """
+        now = now or time.monotonic()
+        self.reported = now
+        rate = self.get_rate(now)
+        counts = ", ".join(f"{name} {count}" for name, count in self.counts.items())
+        if self.total:
+            eta = (self.total - self.count) / rate if rate else 0
+            self.log.info("Progress : %d/%d documents (%.1f%%), %.0f documents/s, ETA %.0fs (%s)",
+                          self.count, self.total, 100 * self.count / self.total, rate, max(0, eta), counts)
+        else:
+            self.log.info("Progress : %d documents, %.0f documents/s (%s)", self.count, rate, counts)
@@ -1,7 +1,8 @@
-#importer/managerer.py
+#importer/manager.py
 
 from datetime import datetime
 import pandas as pd
+import numpy as np
 import hashlib
 import logging
 import yaml
@@ -21,6 +22,19 @@ TEST = "test"
 VALUE = "value"
 
 ROOT = "root"
+BLANK = ""
+
+# column of the primary key string of a document, next to its _id column
+KEY_SUFFIX = "_key"
+
+# nullable dtypes of converted columns, missing values are pd.NA
+NULLABLE_DTYPES = {"int": "Int64", "float": "Float64"}
+# string columns with less distinct values than this ratio of rows are stored as categoricals
+CATEGORY_RATIO = 0.5
+FIELDS_SETTINGS = "data/fields_settings.yml"
+
+# parsed fields settings by sha256 of the settings file
+SETTINGS_CACHE = {}
 
 def load_yaml(filepath:str, replace=None):
     with open(filepath, 'r', encoding='utf8') as f:
@@ -30,6 +44,13 @@ def load_yaml(filepath:str, replace=None):
             yml_obj = replace_placeholder(yml_obj,placeholer,value)
     return yml_obj
 
+def get_settings_hash(filepath:str):
+    """
+    Get the sha256 of a settings file.
+    """
+    with open(filepath, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
 def replace_placeholder(obj, placeholder, value):
     if isinstance(obj, dict):
         return {k: replace_placeholder(v, placeholder, value) for k, v in obj.items()}
@@ -68,12 +89,22 @@ class Field():
         else:
             return Field.dft_values[param_name]            
 
+def get_fields_settings(filepath:str=FIELDS_SETTINGS):
+    """
+    Get the hash and the Field definitions of a settings file, parsed once per file content.
+    """
+    settings_hash = get_settings_hash(filepath)
+    if settings_hash not in SETTINGS_CACHE:
+        SETTINGS_CACHE[settings_hash] = {fieldname: Field(fieldname, params) for fieldname, params in load_yaml(filepath).items()}
+    return settings_hash, SETTINGS_CACHE[settings_hash]
+
+
 class FieldManager():
     """
     Manages field definitions and their transformations.
     """
 
-    def __init__(self):
+    def __init__(self, settings_file:str=FIELDS_SETTINGS):
         """
         Initialize FieldManager with logging and field definitions.
         """
@@ -82,25 +113,140 @@ class FieldManager():
         self.convert_dft = None
         self.convert_fmt_date =  "%Y-%m-%d"
         self.float_round = 2
+        self.reject_sink = None
         
-        fields_def = load_yaml("data/fields_settings.yml")
-        for fieldname, params in fields_def.items():
-            self.fields[fieldname] = Field(fieldname,params)
+        self.settings_hash, fields = get_fields_settings(settings_file)
+        self.fields.update(fields)
+        self.validation_plan = self.compile_validation_plan()
         self.log.info(f"Field Manager starts : loading fields params")
 
+    def compact_df(self, df:pd.DataFrame):
+        """
+        Store enumerated (is_in) and low cardinality string columns as categoricals.
+        """
+        for fieldname, field in self.fields.items():
+            if fieldname.startswith(PK_ID) or field.get_param(TYPE) != "str" or fieldname not in df.columns:
+                continue
+            column = df[fieldname]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                continue
+            if field.get_param(ERROR_MASK)[MASK_FUNC] == "is_in" or column.nunique() <= len(column) * CATEGORY_RATIO:
+                df[fieldname] = column.astype("category")
+        return df
+
+    def compile_validation_plan(self):
+        """
+        Compile the fields settings into a validation plan : one step per field to convert and check,
+        with its mask function resolved once.
+        """
+        plan = []
+        for fieldname, field in self.fields.items():
+            if fieldname.startswith(PK_ID):
+                continue
+            error_mask = field.get_param(ERROR_MASK)
+            plan.append((fieldname, getattr(self, error_mask[MASK_FUNC]), error_mask[MASK_FUNC],
+                         error_mask[MASK_PARAM], field.get_param(REPLACE)))
+        return plan
+
+    def apply_validation_plan(self, df:pd.DataFrame):
+        """
+        Convert and check every field of a DataFrame with the validation plan.
+        Exclusion masks are OR-ed into a single row filter applied once, replacements are assigned column by column.
+        Counts per field are those of a field by field cleaning : rows excluded by a previous field are not counted.
+        """
+        for fieldname, *_ in self.validation_plan:
+            self.convert_df_values(df, fieldname)
+
+        excluded = np.zeros(len(df), dtype=bool)
+        replacements = {}
+        for fieldname, mask_func, func_name, param, replace in self.validation_plan:
+            self.log.debug("Check column %s : Error mask function: %s, Param : %s", fieldname, func_name, param)
+            error_mask = mask_func(df, fieldname, param).fillna(False).to_numpy(dtype=bool) & ~excluded
+            count = int(error_mask.sum())
+            if not count:
+                self.log.info(f"No anomaly detected in column {fieldname}.")
+                continue
+            self.log.warning(f"Incorrect values detected in column {fieldname} : {count} rows.")
+            if replace is not False:
+                self.quarantine(df[error_mask], fieldname, "replaced")
+                replacements[fieldname] = self.replace_values(df[fieldname], error_mask, replace)
+                self.log.info(f"Replacement of column {fieldname} with {replace} for above rows.")
+            else:
+                self.quarantine(df[error_mask], fieldname, "excluded")
+                excluded |= error_mask
+                self.log.info(f"Excluding rows with incorrect values in {fieldname}.")
+
+        for fieldname, column in replacements.items():
+            df[fieldname] = column
+        if excluded.any():
+            df = df.take(np.flatnonzero(~excluded))
+        return df
+
     def convert_df_values(self, df:pd.DataFrame,fieldname:str):
         """
         Convert DataFrame column values based on field type.
+        Distinct values are parsed once, failures are logged as one count with a sample.
         """
         ftype = self.fields[fieldname].get_param(TYPE)
         match ftype :
             case "int":
-                df[fieldname] = df[fieldname].apply(self.convert_to_int)
+                parse = self.parse_int_values
             case 'float':
-                df[fieldname] = df[fieldname].apply(self.convert_to_float)
+                parse = self.parse_float_values
             case 'date':
-                df[fieldname] = df[fieldname].apply(self.convert_to_date)
+                parse = self.parse_date_values
+            case _:
+                return df
+
+        codes, uniques = pd.factorize(df[fieldname])
+        uniques = pd.Series(uniques, dtype=object)
+        values, failed = parse(uniques)
+        fill_value = pd.NaT if ftype == 'date' else np.nan
+        converted = pd.Series(pd.api.extensions.take(values, codes, allow_fill=True, fill_value=fill_value), index=df.index)
+
+        # missing values have no code : a failure for numbers, a silent default for dates
+        count_missing = (codes == -1).sum() if ftype != 'date' else 0
+        count_failed = np.isin(codes, np.flatnonzero(failed)).sum() + count_missing
+        if count_failed:
+            sample = uniques[failed].head(5).tolist() + ([None] if count_missing else [])
+            self.log.error(f"Error converting {count_failed} values of column {fieldname} to {ftype}, sample: {sample}")
+
+        if self.convert_dft is not None:
+            converted = converted.fillna(self.convert_dft)
+        elif ftype in NULLABLE_DTYPES:
+            converted = converted.astype(NULLABLE_DTYPES[ftype])
+        df[fieldname] = converted
         return df
+
+    def parse_int_values(self, uniques:pd.Series):
+        """
+        Parse distinct values to int like int() : integer strings or numbers.
+        """
+        is_str = uniques.map(lambda val: isinstance(val, str)).astype(bool)
+        int_str = uniques[is_str].str.fullmatch(r"\s*[+-]?\d+\s*").reindex(uniques.index, fill_value=False).astype(bool)
+        numbers = pd.to_numeric(uniques.where(~is_str | int_str), errors="coerce").astype("float64")
+        values = np.trunc(numbers.to_numpy())
+        failed = ~np.isfinite(values)
+        return values, failed
+
+    def parse_float_values(self, uniques:pd.Series):
+        """
+        Parse distinct values to float like float().
+        """
+        values = pd.to_numeric(uniques, errors="coerce").astype("float64").to_numpy()
+        # float("nan") is a valid conversion
+        nan_str = uniques.astype(str).str.strip().str.lower().isin(["nan", "+nan", "-nan"]).to_numpy()
+        failed = np.isnan(values) & ~nan_str
+        return values, failed
+
+    def parse_date_values(self, uniques:pd.Series):
+        """
+        Parse distinct string values to dates with the convert format.
+        """
+        is_str = uniques.map(lambda val: isinstance(val, str)).astype(bool)
+        values = pd.to_datetime(uniques.where(is_str), format=self.convert_fmt_date, errors="coerce").to_numpy()
+        failed = pd.isna(values)
+        return values, failed
     
     def get_df_error_mask(self,df : pd.DataFrame, fieldname : str):
         """
@@ -109,9 +255,10 @@ class FieldManager():
         error_mask = self.fields[fieldname].get_param(ERROR_MASK)
         mask_func = error_mask[MASK_FUNC]
         param = error_mask[MASK_PARAM]
-        self.log.debug(f"Check column {fieldname} : Error mask function: {error_mask[MASK_FUNC]}, Param : {str(error_mask[MASK_PARAM])}")
+        self.log.debug("Check column %s : Error mask function: %s, Param : %s", fieldname, error_mask[MASK_FUNC], error_mask[MASK_PARAM])
         mask = getattr(self,mask_func)(df,fieldname,param)
-        return mask
+        # comparisons of nullable columns are missing for missing values : not an error, as with NaN
+        return mask.fillna(False).astype(bool)
 
     def is_na(self,df:pd.DataFrame, fieldname:str,param=None):
         """
@@ -121,9 +268,13 @@ class FieldManager():
 
     def is_in(self,df:pd.DataFrame, fieldname:str, param ):
         """
-        Mask missing values in a DataFrame column.
+        Mask values not in the param list, compared on the codes of categorical columns.
         """
-        return ~df[fieldname].isin(param)
+        column = df[fieldname]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            allowed = column.cat.categories.get_indexer(param)
+            return pd.Series(~np.isin(column.cat.codes.to_numpy(), allowed[allowed >= 0]), index=df.index)
+        return ~column.isin(param)
 
     def is_inrange(self,df:pd.DataFrame, fieldname:str, param ):
         """
@@ -153,15 +304,17 @@ class FieldManager():
     def apply_mask(self,df:pd.DataFrame, fieldname:str):
         """
         Apply error mask to DataFrame column based on field validation.
+        Rejected rows go to the reject sink, the log only holds their count.
         """
         error_mask = self.get_df_error_mask(df,fieldname)
         replace = self.fields[fieldname].get_param(REPLACE) 
-        rows_to_log = df[error_mask]
-        if len(rows_to_log):
-            self.log.warning(f"Incorrect values detected in column {fieldname}.")
-            self.log.warning(f"Concerned rows: {rows_to_log}")
+        count = int(error_mask.sum())
+        if count:
+            self.log.warning(f"Incorrect values detected in column {fieldname} : {count} rows.")
+            action = "replaced" if replace is not False else "excluded"
+            self.quarantine(df[error_mask], fieldname, action)
             if replace is not False:
-                df.loc[error_mask, fieldname] = replace
+                df[fieldname] = self.replace_values(df[fieldname], error_mask, replace)
                 self.log.info(f"Replacement of column {fieldname} with {replace} for above rows.")
             else:
                 df.drop(df[error_mask].index, inplace=True)
@@ -170,6 +323,24 @@ class FieldManager():
             self.log.info(f"No anomaly detected in column {fieldname}.")
         return df
 
+    def replace_values(self, column:pd.Series, mask, replace):
+        """
+        Replace the masked values of a column, a new replacement value is added to the categories.
+        """
+        if isinstance(column.dtype, pd.CategoricalDtype) and replace is not None and replace not in column.cat.categories:
+            column = column.cat.add_categories([replace])
+        return column.mask(mask, replace)
+
+    def quarantine(self, rows:pd.DataFrame, fieldname:str, action:str):
+        """
+        Send rejected rows of a field to the reject sink, if any.
+        """
+        if self.reject_sink is None:
+            return
+        error_mask = self.fields[fieldname].get_param(ERROR_MASK)
+        reason = "value " + rows[fieldname].astype(str) + f" fails {error_mask[MASK_FUNC]} {error_mask[MASK_PARAM]}"
+        self.reject_sink.add(rows, fieldname, error_mask[MASK_FUNC], reason, action)
+
         
     def get_doc(self,row:dict):
         """
@@ -202,6 +373,109 @@ class FieldManager():
         return jsondoc , pk_values
     
 
+    def get_docs(self, df:pd.DataFrame):
+        """
+        Get the MongoDB documents of a whole DataFrame, built column by column.
+        Return {document name: [documents]} and the primary key strings, same documents as get_doc row by row, with missing values as None.
+        """
+        pks = [BLANK] * len(df)
+        layout = {}
+        if not self.has_key_columns(df):
+            df = self.add_key_columns(df.copy(deep=False))
+
+        for field in self.fields.values():
+            if field.name.startswith(PK_ID):
+                pks = self.get_column(df, field.name + KEY_SUFFIX)
+            values = self.get_column(df, field.name)
+
+            doc = field.get_param(DOC)
+            parent = field.get_param(PARENT)
+            if parent == ROOT:
+                entries = layout.setdefault(doc, {})
+                entries[field.camel_name] = values
+            else:
+                entries = layout[parent].setdefault(doc, {})
+                entries[field.camel_name] = values
+
+        jsondocs = {}
+        for masterdoc, entries in layout.items():
+            keys = []
+            flat_columns = []
+            for key, entry in entries.items():
+                if isinstance(entry, dict):
+                    start = len(flat_columns)
+                    flat_columns.extend(entry.values())
+                    keys.append((key, list(entry.keys()), start, len(flat_columns)))
+                else:
+                    keys.append((key, None, len(flat_columns), None))
+                    flat_columns.append(entry)
+
+            documents = []
+            for values in zip(*flat_columns):
+                document = {}
+                for key, sub_keys, start, end in keys:
+                    if sub_keys is None:
+                        document[key] = values[start]
+                    else:
+                        document[key] = dict(zip(sub_keys, values[start:end]))
+                documents.append(document)
+            jsondocs[masterdoc] = documents
+
+        return jsondocs, pks
+
+    def get_pk_strings(self, df:pd.DataFrame, document):
+        """
+        Return the primary key strings of a MongoDB document for every DataFrame row.
+        A key made of another document _id uses the key string of that document.
+        """
+        pk_columns = [self.get_column(df, name + KEY_SUFFIX if name.startswith(PK_ID) else name)
+                      for name in self.get_pk_fields(document)]
+        if not pk_columns:
+            return [BLANK] * len(df)
+        return ["_".join(map(str, values)) for values in zip(*pk_columns)]
+
+    def has_key_columns(self, df:pd.DataFrame):
+        """
+        Check the key columns of every document have been added to the DataFrame.
+        """
+        return all(name in df.columns for name in self.fields if name.startswith(PK_ID))
+
+    def add_key_columns(self, df:pd.DataFrame):
+        """
+        Add, once, the primary key string and its sha256 of every document as columns : <_id field>_key and <_id field>.
+        The hash column is the document _id, also used to deduplicate and partition the rows.
+        """
+        for field in self.fields.values():
+            if not field.name.startswith(PK_ID) or field.name in df.columns:
+                continue
+            pk_fields = self.get_pk_fields(field.get_param(DOC))
+            if len(pk_fields) == 1 and pk_fields[0].startswith(PK_ID):
+                # key of another document only : same strings and hashes, columns are shared
+                df[field.name + KEY_SUFFIX] = df[pk_fields[0] + KEY_SUFFIX]
+                df[field.name] = df[pk_fields[0]]
+                continue
+            keys = self.get_pk_strings(df, field.get_param(DOC))
+            df[field.name + KEY_SUFFIX] = pd.Series(keys, index=df.index, dtype=object)
+            df[field.name] = pd.Series([hashlib.sha256(key.encode("utf-8")).hexdigest() for key in keys], index=df.index, dtype=object)
+        return df
+
+    def get_id_field(self, document):
+        """
+        Get the _id field of a MongoDB document.
+        """
+        return next(field.name for field in self.fields.values()
+                    if field.name.startswith(PK_ID) and field.get_param(DOC) == document)
+
+    def get_column(self, df:pd.DataFrame, fieldname:str):
+        """
+        Return a DataFrame column as a list of python values, missing values (NaN, NA, NaT) as None.
+        """
+        column = df[fieldname]
+        values = column.astype(object)
+        if column.hasnans:
+            values = values.where(column.notna(), None)
+        return values.tolist()
+
     def get_pk_values(self,row:dict, document):
         """
         Return a list the primary key values for a MongoDB document.
@@ -243,7 +517,7 @@ class FieldManager():
             return float(val)  # Compatible with MongoDB
         except (ValueError, TypeError) as e:
             self.log.error(f"Error converting to float for value {val}: {e}")
-            return self.convert_dft.round(self.float_round)
+            return self.convert_dft
 
     def convert_to_date(self, val):
         """
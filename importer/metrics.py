@@ -0,0 +1,192 @@
+#importer/metrics.py
+
+from array import array
+from datetime import datetime
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+WALL = "wall_s"
+CPU = "cpu_s"
+CALLS = "calls"
+ROWS = "rows"
+ROWS_PER_S = "rows_per_s"
+QUANTILES = [0.5, 0.9, 0.95, 0.99]
+PROM_FILE = "importer.prom"
+
+
+def percentile(values, quantile:float):
+    """
+    Get the nearest-rank percentile of sorted values.
+    """
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(quantile * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def timed_stage(name:str, data:bool=True):
+    """
+    Decorator recording wall time, CPU time and rows of an Engine stage in its metrics.
+    Rows of a data stage are the dataframe rows before the stage, or after it when there were none,
+    other stages (connection, database setup) count no rows.
+    In a thread of the async pipeline, the stage is not charged with the CPU of the stages running beside it.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            get_rows = lambda: len(self.df) if data and self.df is not None else 0
+            with self.metrics.time_stage(name, get_rows()) as call:
+                try:
+                    return method(self, *args, **kwargs)
+                finally:
+                    call[ROWS] = call[ROWS] or get_rows()
+        return wrapper
+    return decorator
+
+
+class RunMetrics():
+    """
+    Per stage timing, throughput and per collection write latency of a migration run.
+    """
+
+    def __init__(self):
+        """
+        Initialize empty metrics, the run starts now.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.started = time.time()
+        self.stages = {}
+        self.latencies = {}
+        self.documents = {}
+        # stages being timed by each thread
+        self.timing = threading.local()
+
+    def record_stage(self, name:str, wall:float, cpu:float, rows:int):
+        """
+        Add a stage call to the stage totals.
+        """
+        stage = self.stages.setdefault(name, {CALLS: 0, WALL: 0.0, CPU: 0.0, ROWS: 0})
+        stage[CALLS] += 1
+        stage[WALL] += wall
+        stage[CPU] += cpu
+        stage[ROWS] += rows
+
+    @contextlib.contextmanager
+    def time_stage(self, name:str, rows:int=0):
+        """
+        Record the wall time, CPU time and rows of a block as a stage call, rows can be updated in the yielded call.
+        CPU is the process time in the main thread, the time of the calling thread only in another thread.
+        A stage run inside another one is counted in the outer stage only, not to count the same time twice.
+        """
+        call = {ROWS: rows}
+        depth = getattr(self.timing, "depth", 0)
+        clock = time.process_time if threading.current_thread() is threading.main_thread() else time.thread_time
+        wall, cpu = time.perf_counter(), clock()
+        self.timing.depth = depth + 1
+        try:
+            yield call
+        finally:
+            self.timing.depth = depth
+            if not depth:
+                self.record_stage(name, time.perf_counter() - wall, clock() - cpu, call[ROWS])
+
+    def record_write(self, collection:str, seconds:float, count:int):
+        """
+        Record the latency of a write call (a batch or a single document) on a collection.
+        """
+        # compact storage : 8 bytes per write call
+        self.latencies.setdefault(collection, array("d")).append(seconds)
+        self.documents[collection] = self.documents.get(collection, 0) + count
+
+    def merge_latencies(self, latencies:dict, documents:dict):
+        """
+        Merge the write latencies recorded by a worker process.
+        """
+        for collection, values in latencies.items():
+            self.latencies.setdefault(collection, array("d")).extend(values)
+        for collection, count in documents.items():
+            self.documents[collection] = self.documents.get(collection, 0) + count
+
+    def get_report(self, stats:dict=None):
+        """
+        Get the run report : stages with rows/sec, write latency percentiles per collection and counters.
+        """
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = {**stage, ROWS_PER_S: round(stage[ROWS] / stage[WALL], 1) if stage[WALL] and stage[ROWS] else None}
+        writes = {}
+        for collection, values in self.latencies.items():
+            ordered = sorted(values)
+            writes[collection] = {
+                "calls": len(ordered),
+                "documents": self.documents.get(collection, 0),
+                "total_s": sum(ordered),
+                "latency_s": {f"p{int(q * 100)}": percentile(ordered, q) for q in QUANTILES},
+                "max_s": ordered[-1],
+            }
+        return {
+            "started": datetime.fromtimestamp(self.started).isoformat(),
+            "duration_s": time.time() - self.started,
+            "stages": stages,
+            "writes": writes,
+            "collections": stats or {},
+        }
+
+    def write_json(self, filepath:str, stats:dict=None):
+        """
+        Write the run report as JSON.
+        """
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        with open(filepath, "w", encoding="utf8") as f:
+            json.dump(self.get_report(stats), f, indent=2)
+        return filepath
+
+    def write_prometheus(self, filepath:str, stats:dict=None):
+        """
+        Write the run report in Prometheus text format, atomically for the textfile collector.
+        """
+        report = self.get_report(stats)
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.append(f"# HELP importer_{name} {help}")
+            lines.append(f"# TYPE importer_{name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_str = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"importer_{name}{{{label_str}}} {value}" if label_str else f"importer_{name} {value}")
+
+        metric("run_start_timestamp_seconds", "gauge", "Start time of the last run.", [({}, self.started)])
+        metric("run_duration_seconds", "gauge", "Duration of the last run.", [({}, report["duration_s"])])
+        stages = report["stages"]
+        metric("stage_wall_seconds", "gauge", "Wall time spent in each stage.", [({"stage": name}, stage[WALL]) for name, stage in stages.items()])
+        metric("stage_cpu_seconds", "gauge", "CPU time spent in each stage.", [({"stage": name}, stage[CPU]) for name, stage in stages.items()])
+        metric("stage_rows", "gauge", "Rows processed by each stage.", [({"stage": name}, stage[ROWS]) for name, stage in stages.items()])
+        metric("stage_rows_per_second", "gauge", "Throughput of each stage.", [({"stage": name}, stage[ROWS_PER_S]) for name, stage in stages.items()])
+
+        samples = []
+        for collection, writes in report["writes"].items():
+            for q in QUANTILES:
+                samples.append(({"collection": collection, "quantile": q}, writes["latency_s"][f"p{int(q * 100)}"]))
+            samples.append(({"collection": collection, "quantile": 1.0}, writes["max_s"]))
+        metric("write_latency_seconds", "gauge", "Write call latency quantiles per collection.", samples)
+        metric("write_calls", "gauge", "Write calls per collection.", [({"collection": c}, w["calls"]) for c, w in report["writes"].items()])
+
+        samples = []
+        for collection, counters in report["collections"].items():
+            for operation, count in counters.items():
+                samples.append(({"collection": collection, "operation": operation}, count))
+        metric("documents", "gauge", "Documents per collection and outcome.", samples)
+
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, filepath)
+        return filepath
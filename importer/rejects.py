@@ -0,0 +1,74 @@
+#importer/rejects.py
+
+import pandas as pd
+import logging
+import os
+import threading
+
+CSV = "csv"
+PARQUET = "parquet"
+
+ROW = "_row"
+FIELD = "_field"
+FUNCTION = "_function"
+REASON = "_reason"
+ACTION = "_action"
+
+
+class RejectSink():
+    """
+    Quarantine file of the rows rejected by the field validations, appended in bulk.
+    Without file path, rejects are only buffered, to be merged into another sink (worker processes).
+    """
+
+    def __init__(self, filepath:str, fmt:str=CSV):
+        """
+        Initialize the sink, the file is only created with the first rejected rows.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.filepath = filepath
+        self.fmt = fmt
+        self.frames = []
+        self.count = 0
+        # rejects of the cleaning and of the schema checks come from different threads in the async pipeline
+        self.lock = threading.Lock()
+        if filepath is not None:
+            os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+
+    def add(self, rows:pd.DataFrame, fieldname:str, mask_func:str, reason, action:str):
+        """
+        Append rejected rows with their row number, failing field, mask function, reason and action.
+        """
+        if rows.empty:
+            return
+        rejects = rows.astype(str)
+        rejects.insert(0, ROW, rows.index)
+        rejects.insert(1, FIELD, fieldname)
+        rejects.insert(2, FUNCTION, mask_func)
+        rejects.insert(3, REASON, reason)
+        rejects.insert(4, ACTION, action)
+        self.extend([rejects])
+
+    def extend(self, frames:list):
+        """
+        Append rejects already formatted by another sink.
+        """
+        with self.lock:
+            for rejects in frames:
+                self.count += len(rejects)
+                if self.fmt == PARQUET or self.filepath is None:
+                    # parquet files cannot be appended, written once at close
+                    self.frames.append(rejects)
+                else:
+                    rejects.to_csv(self.filepath, mode="a", header=not os.path.exists(self.filepath), index=False)
+
+    def close(self):
+        """
+        Write the buffered rejects and log where they are.
+        """
+        if self.frames and self.filepath is not None:
+            pd.concat(self.frames).to_parquet(self.filepath, index=False)
+            self.frames = []
+        if self.count:
+            self.log.warning(f"{self.count} rejected values quarantined in {self.filepath}")
+        return self.count
@@ -0,0 +1,107 @@
+#importer/schema.py
+
+from datetime import datetime
+import logging
+
+JSON_SCHEMA = "$jsonSchema"
+BSON_TYPE = "bsonType"
+PROPERTIES = "properties"
+REQUIRED = "required"
+ROOT_PATH = "$"
+INT32 = 2 ** 31
+INT64 = 2 ** 63
+
+# python values encoded by PyMongo to each BSON type, ints outside 32 bits are encoded as long
+TYPE_CHECKS = {
+    "string": lambda value: isinstance(value, str),
+    "int": lambda value: isinstance(value, int) and not isinstance(value, bool) and -INT32 <= value < INT32,
+    "long": lambda value: isinstance(value, int) and not isinstance(value, bool) and -INT64 <= value < INT64,
+    "double": lambda value: isinstance(value, float),
+    "bool": lambda value: isinstance(value, bool),
+    # NaT is a datetime which cannot be encoded, the only value not equal to itself
+    "date": lambda value: isinstance(value, datetime) and value == value,
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, (list, tuple)),
+    "null": lambda value: value is None,
+}
+
+
+def get_type_check(bson_type, path:str):
+    """
+    Get the check of a bsonType keyword, a type name or a list of them, and its label.
+    """
+    if bson_type is None:
+        return None
+    names = [bson_type] if isinstance(bson_type, str) else list(bson_type)
+    unknown = [name for name in names if name not in TYPE_CHECKS]
+    if unknown:
+        raise ValueError(f"Schema of {path or ROOT_PATH} : unsupported bsonType {', '.join(unknown)}")
+    checks = [TYPE_CHECKS[name] for name in names]
+    if len(checks) == 1:
+        return checks[0], names[0]
+    return (lambda value: any(check(value) for check in checks)), " or ".join(names)
+
+
+def compile_node(node:dict, path:str=""):
+    """
+    Compile a schema node into a function appending the (path, reason) errors of a value to a list.
+    Only bsonType, required and properties are checked : the keywords of FieldManager.build_mongodb_schema.
+    """
+    type_check = get_type_check(node.get(BSON_TYPE), path)
+    required = [(key, f"{path}.{key}" if path else key) for key in node.get(REQUIRED) or []]
+    properties = []
+    for key, sub_node in (node.get(PROPERTIES) or {}).items():
+        sub_path = f"{path}.{key}" if path else key
+        properties.append((key, compile_node(sub_node, sub_path)))
+
+    def validate(value, errors):
+        if type_check is not None and not type_check[0](value):
+            errors.append((path or ROOT_PATH, f"bsonType {type_check[1]} expected, not {type(value).__name__}"))
+            return errors
+        if isinstance(value, dict):
+            for key, key_path in required:
+                if key not in value:
+                    errors.append((key_path, "required field missing"))
+            for key, check in properties:
+                if key in value:
+                    check(value[key], errors)
+        return errors
+
+    return validate
+
+
+class SchemaValidator():
+    """
+    Local validation of the documents of a collection against its $jsonSchema validator, before they are sent.
+    The schema is compiled once into nested checks, a document is valid when MongoDB would accept it.
+    """
+
+    def __init__(self, name:str, schema:dict):
+        """
+        Compile the validator of a collection, schema is the {"$jsonSchema": ...} document or its content.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.name = name
+        self.check = compile_node(schema.get(JSON_SCHEMA, schema))
+        self.count = 0
+        self.invalid = 0
+
+    def validate(self, document:dict):
+        """
+        Get the (path, reason) errors of a document, empty when valid.
+        """
+        return self.check(document, [])
+
+    def validate_batch(self, documents:list):
+        """
+        Validate a batch of documents, return the errors of the invalid ones by position in the batch.
+        """
+        invalid = {}
+        check = self.check
+        for position, document in enumerate(documents):
+            errors = check(document, [])
+            if errors:
+                invalid[position] = errors
+        self.count += len(documents)
+        self.invalid += len(invalid)
+        return invalid
@@ -0,0 +1,257 @@
+#importer/state.py
+
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import bson
+
+SQL_MAX_PARAMS = 900
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def get_fingerprint(document:dict):
+    """
+    Get a stable content fingerprint of a document, computed on its BSON encoding.
+    """
+    try:
+        return hashlib.blake2b(bson.encode(document), digest_size=16).hexdigest()
+    except Exception:
+        # not encodable : never considered unchanged, the write will report the error
+        return None
+
+
+def get_file_hash(filepath:str):
+    """
+    Get the sha256 of a file, read by blocks.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_source_identity(filepath:str):
+    """
+    Get the identity of a source file : path, size, modification time and hash.
+    """
+    stat = os.stat(filepath)
+    return {
+        "path": os.path.abspath(filepath),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "hash": get_file_hash(filepath),
+    }
+
+
+class Checkpoint():
+    """
+    Durable record of the last committed chunk of a streamed migration, in a JSON file.
+    """
+
+    def __init__(self, filepath:str):
+        """
+        Initialize the checkpoint file path.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.filepath = filepath
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+
+    def load(self):
+        """
+        Load the last checkpoint, None when there is none.
+        """
+        if not os.path.exists(self.filepath):
+            return None
+        with open(self.filepath, "r", encoding="utf8") as f:
+            return json.load(f)
+
+    def save(self, state:dict):
+        """
+        Write the checkpoint atomically : a crash leaves either the previous or the new one.
+        """
+        state["updated"] = datetime.now().isoformat()
+        tmp_path = f"{self.filepath}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.filepath)
+        self.log.debug("Checkpoint saved at row offset %s", state.get('offset'))
+
+
+class SqliteStore():
+    """
+    Local on-disk SQLite table of the run state, with rows keyed by a collection (or view) and an _id.
+    The connection is shared by the async pipeline threads, calls are serialized by the lock.
+    Subclasses set the table, its key column, its value columns and their journal mode.
+    """
+
+    NAME = "SQLite store"
+    TABLE = None
+    KEY = "collection"
+    COLUMNS = []
+    JOURNAL_MODE = "DELETE"
+    SYNCHRONOUS = "FULL"
+
+    def __init__(self, filepath:str):
+        """
+        Open (or create) the SQLite file and its table.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.filepath = filepath
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        self.cnx = sqlite3.connect(filepath, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.cnx.execute(f"PRAGMA journal_mode={self.JOURNAL_MODE}")
+        self.cnx.execute(f"PRAGMA synchronous={self.SYNCHRONOUS}")
+        columns = "".join(f"{column} TEXT NOT NULL, " for column in self.COLUMNS)
+        self.cnx.execute(f"""CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                            {self.KEY} TEXT NOT NULL,
+                            id TEXT NOT NULL,
+                            {columns}PRIMARY KEY ({self.KEY}, id)) WITHOUT ROWID""")
+        self.cnx.commit()
+        self.log.info(f"{self.NAME} {filepath} opened.")
+
+    def count(self, key:str):
+        """
+        Get the number of _id stored for a collection.
+        """
+        with self.lock:
+            return self.cnx.execute(f"SELECT COUNT(*) FROM {self.TABLE} WHERE {self.KEY} = ?", [key]).fetchone()[0]
+
+    def select(self, key:str, ids:list):
+        """
+        Get the stored rows (_id and value columns) of a list of _id, by parts of SQL_MAX_PARAMS parameters.
+        """
+        rows = []
+        with self.lock:
+            for start in range(0, len(ids), SQL_MAX_PARAMS):
+                part = ids[start:start + SQL_MAX_PARAMS]
+                placeholders = ",".join("?" * len(part))
+                cursor = self.cnx.execute(f"SELECT {', '.join(['id', *self.COLUMNS])} FROM {self.TABLE} WHERE {self.KEY} = ? AND id IN ({placeholders})",
+                                          [key, *part])
+                rows.extend(cursor.fetchall())
+        return rows
+
+    def commit(self):
+        """
+        Commit the pending transaction.
+        """
+        with self.lock:
+            self.cnx.commit()
+
+    def clear(self, key:str):
+        """
+        Forget every _id of a collection.
+        """
+        with self.lock:
+            self.cnx.execute(f"DELETE FROM {self.TABLE} WHERE {self.KEY} = ?", [key])
+            self.cnx.commit()
+        self.log.warning(f"{self.NAME} : rows of {self.KEY} {key} deleted.")
+
+    def close(self):
+        """
+        Commit and close the file.
+        """
+        self.commit()
+        self.cnx.close()
+
+
+class DocumentManifest(SqliteStore):
+    """
+    Local on-disk manifest of the fingerprints of the documents written, keyed by collection and _id.
+    """
+
+    NAME = "Document manifest"
+    TABLE = "fingerprints"
+    COLUMNS = ["fingerprint"]
+    # written after each batch : a lost commit only makes unchanged documents be written again
+    JOURNAL_MODE = "WAL"
+    SYNCHRONOUS = "NORMAL"
+
+    def get_fingerprints(self, collection:str, ids:list):
+        """
+        Get the stored fingerprints of a list of _id, as a dict.
+        """
+        return dict(self.select(collection, ids))
+
+    def save(self, collection:str, items:list):
+        """
+        Store (_id, fingerprint) pairs of written documents.
+        """
+        if not items:
+            return
+        with self.lock:
+            self.cnx.executemany("INSERT OR REPLACE INTO fingerprints (collection, id, fingerprint) VALUES (?, ?, ?)",
+                                 [(collection, id, fingerprint) for id, fingerprint in items if fingerprint])
+            self.cnx.commit()
+
+
+class IdIndex(SqliteStore):
+    """
+    Local on-disk index of the _id of the documents of each collection, to split inserts from replaces.
+    """
+
+    NAME = "_id index"
+    TABLE = "ids"
+    # a lost commit only makes an insert fall back to a replace, the index is rebuilt when counts differ
+    JOURNAL_MODE = "WAL"
+    SYNCHRONOUS = "NORMAL"
+
+    def get_existing(self, collection:str, ids:list):
+        """
+        Get the set of the given _id already in the collection.
+        """
+        return {id for id, in self.select(collection, ids)}
+
+    def add(self, collection:str, ids):
+        """
+        Index the _id of written documents, kept in the pending transaction until commit.
+        """
+        with self.lock:
+            self.cnx.executemany("INSERT OR IGNORE INTO ids (collection, id) VALUES (?, ?)", ((collection, id) for id in ids))
+
+    def rebuild(self, collection:str, ids):
+        """
+        Replace the index of a collection with the _id of a projected scan.
+        """
+        with self.lock:
+            self.cnx.execute("DELETE FROM ids WHERE collection = ?", [collection])
+            self.cnx.executemany("INSERT OR IGNORE INTO ids (collection, id) VALUES (?, ?)", ((collection, id) for id in ids))
+            self.cnx.commit()
+        return self.count(collection)
+
+
+class ViewContributions(SqliteStore):
+    """
+    Local on-disk contributions of each row to the summary views : group key and measures, keyed by view and row _id.
+    The previous contribution of a row is subtracted when it is imported again, so views are updated by deltas.
+    """
+
+    NAME = "View contributions"
+    TABLE = "contributions"
+    KEY = "view"
+    COLUMNS = ["grp", "measures"]
+    # saved once the $inc of the view are applied : a lost commit would apply the same deltas again, commits are synced
+    JOURNAL_MODE = "WAL"
+    SYNCHRONOUS = "FULL"
+
+    def get(self, view:str, ids:list):
+        """
+        Get the stored contributions of a list of row _id, as a dict _id -> (group key, measures list).
+        """
+        return {id: (grp, json.loads(measures)) for id, grp, measures in self.select(view, ids)}
+
+    def save(self, view:str, items):
+        """
+        Store (_id, group key, measures list) contributions, replacing the previous ones.
+        """
+        with self.lock:
+            self.cnx.executemany("INSERT OR REPLACE INTO contributions (view, id, grp, measures) VALUES (?, ?, ?, ?)",
+                                 ((view, id, grp, json.dumps(measures)) for id, grp, measures in items))
+            self.cnx.commit()
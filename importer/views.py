@@ -0,0 +1,149 @@
+#importer/views.py
+
+from importer.manager import PK_ID, TYPE, load_yaml
+from pymongo import DeleteMany, UpdateOne
+import pandas as pd
+import numpy as np
+import json
+import logging
+
+GROUP_BY = "group_by"
+# collection whose documents are the rows of a view, their _id identifies the rows
+VIEW_COLLECTION = "collection"
+DFT_VIEW_COLLECTION = "care"
+MEASURES = "measures"
+MEASURE_FUNCTION = "function"
+MEASURE_FIELD = "field"
+COUNT = "count"
+SUM = "sum"
+# rows of a group, in every view : groups without rows are deleted
+ROWS = "rows"
+GROUP = "_group"
+GROUP_TYPES = ["str", "int"]
+SUM_TYPES = ["int", "float"]
+GROUPS = "groups"
+CHANGED = "changed"
+FAILED = "failed"
+
+
+class View():
+    """
+    Summary collection of a view : rows, counts and sums of the cleaned rows, per group of fields.
+    Only additive measures, so that a view can be updated by deltas.
+    """
+
+    def __init__(self, name:str, params:dict, fields:dict, collections:list=None):
+        """
+        Initialize a view from its settings, fields are the Field definitions of the fields settings,
+        collections the documents of the fields settings.
+        """
+        self.name = name
+        self.collection = params.get(VIEW_COLLECTION, DFT_VIEW_COLLECTION)
+        if collections is not None and self.collection not in collections:
+            raise ValueError(f"View {name} : collection {self.collection} is not a document of the fields settings")
+        self.group_by = params[GROUP_BY]
+        for fieldname in self.group_by:
+            if fieldname not in fields or fields[fieldname].get_param(TYPE) not in GROUP_TYPES:
+                raise ValueError(f"View {name} : group field {fieldname} must be a {' or '.join(GROUP_TYPES)} field of the fields settings")
+        self.measures = [(ROWS, COUNT, None)]
+        for measure, spec in (params.get(MEASURES) or {}).items():
+            fieldname = spec.get(MEASURE_FIELD)
+            if spec.get(MEASURE_FUNCTION) not in (COUNT, SUM) or (fieldname is None and spec[MEASURE_FUNCTION] == SUM):
+                raise ValueError(f"View {name} : measure {measure} must be a count or the sum of a field")
+            if fieldname is not None and (fieldname not in fields or (spec[MEASURE_FUNCTION] == SUM and fields[fieldname].get_param(TYPE) not in SUM_TYPES)):
+                raise ValueError(f"View {name} : measure {measure} on unknown or non numeric field {fieldname}")
+            self.measures.append((measure, spec[MEASURE_FUNCTION], fieldname))
+        self.group_names = [fields[fieldname].camel_name for fieldname in self.group_by]
+
+    def get_contributions(self, df:pd.DataFrame):
+        """
+        Get the contribution of each row : its group key (JSON list) and its measures.
+        """
+        columns = []
+        for fieldname in self.group_by:
+            column = df[fieldname].astype(object)
+            columns.append(column.where(df[fieldname].notna(), None).tolist())
+        groups = [json.dumps(list(key)) for key in zip(*columns)]
+        measures = np.empty((len(df), len(self.measures)), dtype=float)
+        for i, (_, function, fieldname) in enumerate(self.measures):
+            if fieldname is None:
+                measures[:, i] = 1
+            elif function == COUNT:
+                measures[:, i] = df[fieldname].notna().to_numpy()
+            else:
+                measures[:, i] = pd.to_numeric(df[fieldname]).astype(float).fillna(0).to_numpy()
+        return groups, measures
+
+    def get_deltas(self, ids:list, groups:list, measures:np.ndarray, previous:dict):
+        """
+        Get the change of the measures of each group : new contributions minus the previous ones of the same rows.
+        """
+        names = [name for name, _, _ in self.measures]
+        new = pd.DataFrame(measures, columns=names)
+        new[GROUP] = groups
+        old = [previous[id] for id in ids if id in previous]
+        if old:
+            old_frame = -pd.DataFrame([values for _, values in old], columns=names)
+            old_frame[GROUP] = [grp for grp, _ in old]
+            new = pd.concat([new, old_frame], ignore_index=True)
+        deltas = new.groupby(GROUP, sort=False).sum()
+        return deltas[~np.isclose(deltas.to_numpy(), 0).all(axis=1)]
+
+    def get_operations(self, deltas:pd.DataFrame):
+        """
+        Get the bulk operations applying deltas : $inc of the measures of each group, then deletion of empty groups.
+        """
+        operations = []
+        integers = [function == COUNT for _, function, _ in self.measures]
+        for grp, values in zip(deltas.index, deltas.to_numpy()):
+            group = dict(zip(self.group_names, json.loads(grp)))
+            inc = {name: int(round(value)) if integer else float(value)
+                   for (name, _, _), value, integer in zip(self.measures, values, integers)}
+            operations.append(UpdateOne({PK_ID: group}, {"$inc": inc, "$setOnInsert": group}, upsert=True))
+        if operations:
+            operations.append(DeleteMany({ROWS: {"$lte": 0}}))
+        return operations
+
+
+class ViewManager():
+    """
+    Views of a settings file, maintained from the stored contributions of each row (ViewContributions).
+    """
+
+    def __init__(self, filepath:str, fields:dict, store=None, collections:list=None):
+        """
+        Load the views settings.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.views = [View(name, params, fields, collections) for name, params in (load_yaml(filepath) or {}).items()]
+        self.store = store
+        self.stats = {view.name: {GROUPS: 0, CHANGED: 0, FAILED: 0} for view in self.views}
+        self.log.info(f"{len(self.views)} views loaded from {filepath} : {', '.join(view.name for view in self.views)}")
+
+    def get_collections(self):
+        """
+        Get the collections identifying the rows of the views.
+        """
+        return sorted({view.collection for view in self.views})
+
+    def get_updates(self, df:pd.DataFrame, ids:dict, unwritten:dict=None):
+        """
+        Get, for each view, the operations applying the rows of a DataFrame and their contributions to store.
+        ids are the row _id of each view collection, rows whose document was not written (unwritten _id) are left out.
+        """
+        updates = {}
+        for view in self.views:
+            rows, view_ids = df, ids[view.collection]
+            skipped = (unwritten or {}).get(view.collection)
+            if skipped:
+                kept = [id not in skipped for id in view_ids]
+                rows, view_ids = df[kept], [id for id, keep in zip(view_ids, kept) if keep]
+            groups, measures = view.get_contributions(rows)
+            previous = self.store.get(view.name, view_ids) if self.store is not None else {}
+            deltas = view.get_deltas(view_ids, groups, measures, previous)
+            changed = [(id, grp, values.tolist()) for id, grp, values in zip(view_ids, groups, measures)
+                       if previous.get(id) != (grp, values.tolist())]
+            self.stats[view.name][GROUPS] += len(deltas)
+            self.stats[view.name][CHANGED] += len(changed)
+            updates[view.name] = (view.get_operations(deltas), changed)
+        return updates
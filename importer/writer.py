@@ -0,0 +1,270 @@
+#importer/writer.py
+
+from importer.manager import PK_ID
+from importer.controller import RETRY
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError, PyMongoError
+import pandas as pd
+import logging
+import time
+
+INSERTED = "inserted"
+UPDATED = "updated"
+ERRORS = "errors"
+UNCHANGED = "unchanged"
+SKIPPED = "skipped"
+EXPORTED = "exported"
+INVALID = "invalid"
+
+DUPLICATE_KEY = 11000
+FAILED_WRITE = "write"
+FAILED_ACTION = "not written"
+
+
+def new_stats():
+    """
+    Return an empty counter dictionary for one collection.
+    """
+    return {INSERTED: 0, UPDATED: 0, UNCHANGED: 0, SKIPPED: 0, EXPORTED: 0, ERRORS: 0, INVALID: 0}
+
+
+class BulkWriter():
+    """
+    Buffers upserts for one MongoDB collection and sends them in bulk_write batches.
+    """
+
+    def __init__(self, collection, batch_size, ordered=True, stats=None, manifest=None, metrics=None, id_index=None, controller=None, failures=None):
+        """
+        Initialize the writer for a collection with a batch size and an ordering mode.
+        Fingerprints of written documents are saved in the manifest, the batch latencies in the metrics, when given.
+        With an _id index, new documents are inserted and only existing ones replaced.
+        A BatchController adapts the batch size and retries transient errors, documents still not written go to the failures sink.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.ordered = ordered
+        self.manifest = manifest
+        self.metrics = metrics
+        self.id_index = id_index
+        self.controller = controller
+        self.failures = failures
+        self.last_error = None
+        # _id of the documents not written, until collected by the engine
+        self.failed_ids = set()
+        self.documents = []
+        self.ops = []
+        self.pks = []
+        self.fingerprints = []
+        self.stats = stats if stats is not None else new_stats()
+
+    def add(self, document:dict, pk:str, fingerprint=None):
+        """
+        Queue a document upsert, flushing the batch when it is full.
+        """
+        self.documents.append(document)
+        self.ops.append(ReplaceOne({PK_ID: document[PK_ID]}, document, upsert=True))
+        self.pks.append(pk)
+        self.fingerprints.append((document[PK_ID], fingerprint))
+        if len(self.ops) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Send the queued operations and update inserted/updated/error counters.
+        """
+        if not self.ops:
+            return self.stats
+        started = time.perf_counter()
+        retries = self.controller.decisions[RETRY] if self.controller is not None else 0
+        if self.id_index is not None:
+            failed = self.insert_or_replace()
+        else:
+            failed = self.replace(list(range(len(self.ops))))
+        self.record_latency(started, len(self.ops))
+        self.save_fingerprints(self.fingerprints, failed)
+        self.save_failures([self.documents[i][PK_ID] for i in sorted(failed)], [self.pks[i] for i in sorted(failed)])
+        self.update_batch_size(started, len(self.ops), len(failed), retries)
+        self.log.debug("%s collection : batch of %d documents flushed, totals %s", self.collection.name, len(self.ops), self.stats)
+        self.documents = []
+        self.ops = []
+        self.pks = []
+        self.fingerprints = []
+        return self.stats
+
+    def replace(self, indexes:list):
+        """
+        Send the upserts of the queued documents at indexes, return the indexes of the documents not written.
+        """
+        try:
+            ops = [self.ops[i] for i in indexes]
+            result = self.call(lambda: self.collection.bulk_write(ops, ordered=self.ordered))
+            self.record_result(result)
+            return set()
+        except BulkWriteError as e:
+            failed = self.record_bulk_error(e, [self.pks[i] for i in indexes])
+        except PyMongoError as e:
+            failed = self.record_failure(e, len(indexes))
+        return {indexes[i] for i in failed}
+
+    def insert_or_replace(self):
+        """
+        Insert the queued documents missing from the _id index and replace the others.
+        Inserts failing on a duplicate key (index out of date) are replaced, return the indexes of the documents not written.
+        """
+        ids = [document[PK_ID] for document in self.documents]
+        existing = self.id_index.get_existing(self.collection.name, ids)
+        new = [i for i, id in enumerate(ids) if id not in existing]
+        failed = set()
+        retry = []
+        if new:
+            documents = [self.documents[i] for i in new]
+            try:
+                # a replayed insert fails on the documents already inserted, they are replaced
+                result = self.call(lambda: self.collection.insert_many(documents, ordered=self.ordered))
+                self.stats[INSERTED] += len(result.inserted_ids)
+            except BulkWriteError as e:
+                retry, errors = self.record_insert_error(e, new)
+                failed.update(errors)
+            except PyMongoError as e:
+                failed.update(new[i] for i in self.record_failure(e, len(new)))
+        new_ids = set(new)
+        replaced = sorted([i for i in range(len(ids)) if i not in new_ids] + retry)
+        if replaced:
+            failed.update(self.replace(replaced))
+        self.id_index.add(self.collection.name, [id for i, id in enumerate(ids) if i not in failed])
+        self.log.debug("%s collection : %d inserted, %d replaced with the _id index", self.collection.name, len(new) - len(retry), len(replaced))
+        return failed
+
+    def record_insert_error(self, e:BulkWriteError, new:list):
+        """
+        Count the documents inserted before a BulkWriteError.
+        Return the indexes to replace (duplicate keys, not sent in ordered mode) and the indexes of the failed documents.
+        """
+        details = e.details
+        self.stats[INSERTED] += details.get("nInserted", 0)
+        write_errors = details.get("writeErrors", [])
+        retry = []
+        failed = []
+        for error in write_errors:
+            index = new[error["index"]]
+            if error.get("code") == DUPLICATE_KEY:
+                retry.append(index)
+            else:
+                failed.append(index)
+                self.stats[ERRORS] += 1
+                self.last_error = error.get('errmsg')
+                self.log.warning(f"{self.collection.name} collection : error inserting document {error['index']} of batch : {error.get('errmsg')} /n{self.pks[index]}")
+        if self.ordered and write_errors:
+            # ordered insert stops at the first error, following documents are sent as replaces
+            retry.extend(new[write_errors[0]["index"] + 1:])
+        return retry, failed
+
+    def call(self, operation):
+        """
+        Run a write through the controller, replayed on transient errors, or once without controller.
+        """
+        return self.controller.call(operation) if self.controller is not None else operation()
+
+    def update_batch_size(self, started:float, count:int, errors:int, retries:int):
+        """
+        Let the controller adapt the batch size to the latency and errors (failed documents and retries) of a batch.
+        """
+        if self.controller is not None:
+            errors += self.controller.decisions[RETRY] - retries
+            self.batch_size = self.controller.update(count, time.perf_counter() - started, errors)
+
+    def save_failures(self, ids:list, pks:list):
+        """
+        Record the _id of the documents not written, append them to the failures sink with their primary key and last error.
+        """
+        self.failed_ids.update(ids)
+        if self.failures is not None and ids:
+            self.failures.add(pd.DataFrame({PK_ID: ids, "pk": pks}), self.collection.name, FAILED_WRITE, self.last_error, FAILED_ACTION)
+
+    def record_latency(self, started:float, count:int):
+        """
+        Record the latency of a batch sent at started (perf_counter) in the metrics.
+        """
+        if self.metrics is not None:
+            self.metrics.record_write(self.collection.name, time.perf_counter() - started, count)
+
+    def save_fingerprints(self, fingerprints:list, failed:set):
+        """
+        Save the fingerprints of the documents of a batch which have been written.
+        """
+        if self.manifest is not None:
+            self.manifest.save(self.collection.name, [item for index, item in enumerate(fingerprints) if index not in failed])
+
+    def record_result(self, result):
+        """
+        Count inserted and updated documents of a BulkWriteResult.
+        """
+        self.stats[INSERTED] += result.upserted_count
+        self.stats[UPDATED] += result.matched_count
+
+    def record_bulk_error(self, e:BulkWriteError, pks:list):
+        """
+        Count the documents written before a BulkWriteError and log its per document errors.
+        Return the batch indexes of the documents not written.
+        """
+        name = self.collection.name
+        details = e.details
+        self.stats[INSERTED] += details.get("nUpserted", 0)
+        self.stats[UPDATED] += details.get("nMatched", 0)
+        write_errors = details.get("writeErrors", [])
+        failed = set()
+        for error in write_errors:
+            index = error["index"]
+            failed.add(index)
+            self.stats[ERRORS] += 1
+            self.last_error = error.get('errmsg')
+            self.log.warning(f"{name} collection : error upserting document {index} of batch : {error.get('errmsg')} /n{pks[index]}")
+        if self.ordered and write_errors:
+            # ordered bulk stops at the first error, following operations are not sent
+            first = write_errors[0]["index"]
+            not_sent = len(pks) - first - 1
+            failed.update(range(first, len(pks)))
+            if not_sent:
+                self.stats[ERRORS] += not_sent
+                self.log.warning(f"{name} collection : {not_sent} documents not sent after ordered batch error.")
+        return failed
+
+    def record_failure(self, e:Exception, count:int):
+        """
+        Count a whole batch as failed, return the batch indexes of the documents not written.
+        """
+        self.stats[ERRORS] += count
+        self.last_error = str(e)
+        self.log.warning(f"{self.collection.name} collection : batch of {count} documents failed {e}")
+        return set(range(count))
+
+
+class AsyncBulkWriter(BulkWriter):
+    """
+    Sends whole batches to one collection of PyMongo's async client, several batches may be in flight.
+    """
+
+    async def send(self, documents:list, pks:list, fingerprints:list):
+        """
+        Upsert a batch of documents with one bulk_write and update the counters.
+        """
+        ops = [ReplaceOne({PK_ID: document[PK_ID]}, document, upsert=True) for document in documents]
+        failed = set()
+        started = time.perf_counter()
+        retries = self.controller.decisions[RETRY] if self.controller is not None else 0
+        try:
+            if self.controller is not None:
+                result = await self.controller.acall(lambda: self.collection.bulk_write(ops, ordered=self.ordered))
+            else:
+                result = await self.collection.bulk_write(ops, ordered=self.ordered)
+            self.record_result(result)
+        except BulkWriteError as e:
+            failed = self.record_bulk_error(e, pks)
+        except PyMongoError as e:
+            failed = self.record_failure(e, len(ops))
+        self.record_latency(started, len(ops))
+        self.save_fingerprints([(document[PK_ID], fingerprint) for document, fingerprint in zip(documents, fingerprints)], failed)
+        self.save_failures([documents[i][PK_ID] for i in sorted(failed)], [pks[i] for i in sorted(failed)])
+        self.update_batch_size(started, len(ops), len(failed), retries)
+        return self.stats
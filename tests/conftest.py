@@ -0,0 +1,54 @@
+# tests/conftest.py
+
+
+from importer.engine import *
+import pytest
+
+@pytest.fixture(scope="session")
+def env_config():
+   # settings of .env/.test.env, read once
+   return Config.from_env()
+
+@pytest.fixture
+def config(env_config):
+   # each test changes its own copy of the settings
+   return env_config.copy()
+
+@pytest.fixture
+def importer(config):
+   return Engine(config)
+
+@pytest.fixture
+def memory_engine(config, tmp_path):
+   # engine factory : the in-memory database stands for MongoDB, the run state is kept in the test directory
+   def make(db, settings=None, engine_class=Engine):
+      config.update({STATE_DIR: str(tmp_path), VIEWS_SETTINGS: "", TRACE_ONLY: False, CLEAN_DB: False, **(settings or {})})
+      engine = engine_class(config.copy())
+      engine.initialize_db = lambda: None
+      if hasattr(engine, "connect_async"):
+         # the writer tasks use the database of the async client
+         engine.connect_db = lambda: None
+         engine.connect_async = lambda: setattr(engine, "adb", db)
+      else:
+         engine.connect_db = lambda: setattr(engine, "db", db)
+      return engine
+   return make
+
+@pytest.fixture
+def input_dict():
+   # four valid rows of the source columns, as loaded by load_df : tests change the values they check
+   return {'Name': {0: 'LesLie TErRy', 1: 'DaNnY sMitH', 2: 'andrEw waTtS', 3: 'adrIENNE bEll'},
+           'Age': {0: '62', 1: '76', 2: '28', 3: '43'},
+           'Gender': {0: 'Male', 1: 'Female', 2: 'Female', 3: 'Female'},
+           'Blood Type': {0: 'A+', 1: 'A-', 2: 'O+', 3: 'AB+'},
+           'Medical Condition': {0: 'Obesity', 1: 'Obesity', 2: 'Diabetes', 3: 'Cancer'},
+           'Date of Admission': {0: '2019-08-20', 1: '2022-09-22', 2: '2020-11-18', 3: '2022-09-19'},
+           'Doctor': {0: 'Samantha Davies', 1: 'Tiffany Mitchell', 2: 'Kevin Wells', 3: 'Kathleen Hanna'},
+           'Hospital': {0: 'Kim Inc', 1: 'Cook PLC', 2: 'Hernandez Rogers and Vang,', 3: 'White-White'},
+           'Insurance Provider': {0: 'Medicare', 1: 'Aetna', 2: 'Medicare', 3: 'Aetna'},
+           'Billing Amount': {0: '33643.327286577885', 1: '27955.096078842456', 2: '37909.78240987528', 3: '14238.317813937623'},
+           'Room Number': {0: '265', 1: '205', 2: '450', 3: '458'},
+           'Admission Type': {0: 'Emergency', 1: 'Emergency', 2: 'Elective', 3: 'Urgent'},
+           'Discharge Date': {0: '2019-08-26', 1: '2022-10-07', 2: '2020-12-18', 3: '2022-10-09'},
+           'Medication': {0: 'Ibuprofen', 1: 'Aspirin', 2: 'Ibuprofen', 3: 'Penicillin'},
+           'Test Results': {0: 'Inconclusive', 1: 'Normal', 2: 'Abnormal', 3: 'Abnormal'}}
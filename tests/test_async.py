@@ -0,0 +1,87 @@
+# tests/test_async.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+from importer.async_engine import AsyncEngine
+from pymongo.results import BulkWriteResult
+import asyncio
+import pandas as pd
+import pytest
+
+class AsyncCollection():
+   # stand-in of a collection of PyMongo's async client
+   def __init__(self, name):
+      self.name = name
+      self.documents = {}
+
+   async def bulk_write(self, ops, ordered=True):
+      await asyncio.sleep(0)
+      upserted = 0
+      for op in ops:
+         upserted += op._filter[PK_ID] not in self.documents
+         self.documents[op._filter[PK_ID]] = op._doc
+      return BulkWriteResult({"nUpserted": upserted, "nMatched": len(ops) - upserted, "upserted": []}, True)
+
+class AsyncDatabase(dict):
+   def __missing__(self, name):
+      self[name] = AsyncCollection(name)
+      return self[name]
+
+   def get_collection(self, name, **options):
+      return self[name]
+
+def write_rows(filepath, count, duplicates):
+   # rows of the sample dataset repeated with distinct names, the first duplicates rows are repeated at the end with another room
+   sample = pd.read_csv("tests/sample_dataset.csv", dtype=str)
+   rows = pd.concat([sample] * (count // len(sample)), ignore_index=True)
+   rows["Name"] = [f"{name} {i}" for i, name in enumerate(rows["Name"])]
+   latest = rows[:duplicates].copy()
+   latest["Room Number"] = "999"
+   pd.concat([rows, latest], ignore_index=True).to_csv(filepath, index=False)
+
+def test_import_async(importer, memory_engine, tmp_path):
+   source = str(tmp_path / "dataset.csv")
+   write_rows(source, 100, 20)
+   adb = AsyncDatabase()
+   engine = memory_engine(adb, {CHUNK_SIZE: 25, BATCH_SIZE: 10, WRITERS: 3, QUEUE_SIZE: 2}, AsyncEngine)
+
+   # the pipeline events : chunks turned into documents, and drains with the batches left unwritten
+   events = []
+   get_docs = engine.fm.get_docs
+   def docs(df):
+      events.append("docs")
+      return get_docs(df)
+   engine.fm.get_docs = docs
+   drain = engine.drain
+   async def drained():
+      await drain()
+      events.append(("drain", sum(engine.queues[name]._unfinished_tasks for name in engine.async_writers)))
+   engine.drain = drained
+
+   # every writer task stops on its end marker, otherwise the run never ends
+   asyncio.run(asyncio.wait_for(engine.import_async(source), 30))
+   assert all(engine.queues[name].empty() and engine.in_flight[name] == 0 for name in engine.async_writers)
+
+   # cross chunk duplicates : the batches of the previous chunks are written before the chunk is built
+   drains = [position for position, event in enumerate(events) if event != "docs"]
+   assert drains and all(events[position] == ("drain", 0) and events[position + 1] == "docs" for position in drains)
+
+   # every collection holds the latest version of each row, as a single run over the whole file
+   importer.load_df(source)
+   importer.clean_df()
+   importer.make_unic_df()
+   expected = get_docs(importer.df)[0]
+   for document_name in ["care", "billing", "observation"]:
+      assert adb[document_name].documents == {document[PK_ID]: document for document in expected[document_name]}
+      assert engine.stats[document_name][INSERTED] == len(expected[document_name])
+      assert engine.stats[document_name][UPDATED] == 20
+
+def test_resume_refused(memory_engine, tmp_path):
+   # without checkpoint, a resumed async run would import the whole file again
+   source = str(tmp_path / "dataset.csv")
+   write_rows(source, 8, 0)
+   engine = memory_engine(AsyncDatabase(), {RESUME: True}, AsyncEngine)
+   with pytest.raises(SystemExit):
+      asyncio.run(engine.import_async(source))
@@ -0,0 +1,30 @@
+# tests/test_bench.py
+
+
+from importer.engine import *
+from importer.bench import *
+import pandas as pd
+
+def test_benchmark_memory(importer, tmp_path):
+   source = str(tmp_path / "dataset.csv")
+   generate_dataset(source, 500, duplicate_ratio=0.1, invalid_ratio=0.1, seed=1)
+   df = pd.read_csv(source, dtype=str)
+   assert len(df) == 500
+   assert sorted(df.columns) == sorted(name for name in importer.fm.fields if not name.startswith(PK_ID))
+
+   engine = Engine(bench_config(100))
+   engine.db = MemoryDatabase()
+   stages = Benchmark(engine).run(source)
+   assert [stage["stage"] for stage in stages] == ["load_df", "clean_df", "make_unic_df", "build_docs", "write"]
+   assert stages[0]["rows"] == 500 and stages[-1]["rows"] == len(engine.df) * len(set(importer.fm.get_masterdoc_list()))
+   # invalid values and duplicates are removed before writing
+   assert len(engine.df) < 500
+   # documents missing required values are rejected by the schema check before the write
+   for document_name in importer.fm.get_masterdoc_list():
+      assert len(engine.db[document_name].documents) + engine.stats[document_name][INVALID] == len(engine.df)
+   assert engine.stats["care"][INVALID] > 0
+
+def test_bench_database():
+   # the benchmark drops its own database only, on request
+   assert bench_config(100)[DBNAME] == BENCH_DB and not bench_config(100)[CLEAN_DB]
+   assert bench_config(100, clean=True)[CLEAN_DB]
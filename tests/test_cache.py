@@ -0,0 +1,36 @@
+# tests/test_cache.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+import os
+
+def test_snapshot_cache(importer, config, tmp_path):
+   csv_filepath = "tests/sample_dataset.csv"
+   saved = {key: config[key] for key in (CACHE_DIR, CACHE_SIZE, CLEAR_CACHE)}
+   config[CACHE_DIR], config[CACHE_SIZE], config[CLEAR_CACHE] = str(tmp_path), 1, False
+   try:
+      # first load : no snapshot, cleaned then saved
+      importer.load_source(csv_filepath)
+      assert not importer.cleaned
+      importer.clean_df()
+      df = importer.make_unic_df()
+      importer.save_snapshot()
+      assert len(importer.cache.list_snapshots()) == 1
+
+      # second load : cleaned snapshot, same frame
+      importer.load_source(csv_filepath)
+      assert importer.cleaned
+      assert importer.df.equals(df)
+      assert importer.df.dtypes.equals(df.dtypes)
+
+      # least recently used snapshot evicted above the size limit
+      size = importer.cache.list_snapshots()[0][1]
+      importer.cache.max_bytes = size
+      importer.cache.save("other", df)
+      assert [os.path.basename(path) for _, _, path in importer.cache.list_snapshots()] == ["snapshot_other.feather"]
+      assert importer.cache.clear() == 1
+   finally:
+      config.update(saved)
+      importer.cache = None
@@ -0,0 +1,98 @@
+# tests/test_checkpoint.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+from importer.bench import MemoryDatabase
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def stream_settings():
+   # streamed runs by chunks of 50 rows
+   return {DELTA_MODE: False, RESUME: False, WORKERS: 1, CHUNK_SIZE: 50, BATCH_SIZE: 20, START: 0, LIMIT: 0}
+
+def write_rows(filepath, count):
+   # rows of the sample dataset repeated with distinct names
+   sample = pd.read_csv("tests/sample_dataset.csv", dtype=str)
+   rows = pd.concat([sample] * (count // len(sample)), ignore_index=True)
+   rows["Name"] = [f"{name} {i}" for i, name in enumerate(rows["Name"])]
+   rows.to_csv(filepath, index=False)
+
+def record_chunks(engine, starts, stop_after=None):
+   # the offsets read by the engine, the run is interrupted after stop_after chunks
+   iter_chunks = engine.iter_chunks
+   def chunks(source, chunksize=None, start=None, limit=None):
+      starts.append(start)
+      for count, chunk in enumerate(iter_chunks(source, chunksize, start, limit)):
+         if count == stop_after:
+            raise RuntimeError("interrupted")
+         yield chunk
+   engine.iter_chunks = chunks
+
+def test_checkpoint_file(tmp_path):
+   checkpoint = Checkpoint(str(tmp_path / "state" / "checkpoint.json"))
+   assert checkpoint.load() is None
+   state = {"offset": 150, "rows": 140, "stats": {"care": new_stats()}, "complete": False}
+   checkpoint.save(state)
+   # written through a temporary file replaced at once
+   assert os.listdir(tmp_path / "state") == ["checkpoint.json"]
+   assert checkpoint.load() == state and "updated" in state
+   state["offset"] = 200
+   checkpoint.save(state)
+   assert checkpoint.load()["offset"] == 200
+
+def test_resume_refused(memory_engine, stream_settings, tmp_path):
+   source = str(tmp_path / "dataset.csv")
+   write_rows(source, 20)
+   engine = memory_engine(MemoryDatabase(), {**stream_settings, RESUME: True})
+   checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+   state = engine.get_stream_state(checkpoint, source)
+   checkpoint.save({**state, "offset": 10, "rows": 10})
+   assert engine.get_stream_state(checkpoint, source)["offset"] == 10
+
+   # another fields settings
+   checkpoint.save({**state, "settings_hash": "other"})
+   with pytest.raises(SystemExit):
+      engine.get_stream_state(checkpoint, source)
+   # the source file changed
+   checkpoint.save(state)
+   with open(source, "a") as f:
+      f.write(open(source).readlines()[1])
+   with pytest.raises(SystemExit):
+      engine.get_stream_state(checkpoint, source)
+
+def test_resume_from_offset(memory_engine, config, stream_settings, tmp_path):
+   source = str(tmp_path / "dataset.csv")
+   write_rows(source, 232)
+   db = MemoryDatabase()
+
+   engine = memory_engine(db, stream_settings)
+   starts = []
+   record_chunks(engine, starts, stop_after=2)
+   with pytest.raises(RuntimeError):
+      engine.import_stream(source)
+   state = Checkpoint(str(tmp_path / f"checkpoint_{config[DBNAME]}.json")).load()
+   assert (state["offset"], state["complete"]) == (100, False)
+   assert state["stats"]["care"][INSERTED] == state["rows"] == len(db["care"].documents)
+
+   stream_settings[RESUME] = True
+   engine = memory_engine(db, stream_settings)
+   starts = []
+   record_chunks(engine, starts)
+   engine.import_stream(source)
+   # the rows of the first run are not read again, its counters are restored
+   assert starts == [100]
+   state = Checkpoint(str(tmp_path / f"checkpoint_{config[DBNAME]}.json")).load()
+   assert (state["offset"], state["complete"]) == (232, True)
+   for document_name in ["care", "billing", "observation"]:
+      assert len(db[document_name].documents) == 232
+      assert engine.stats[document_name][INSERTED] == 232
+
+   # a complete migration is not resumed again
+   engine = memory_engine(db, stream_settings)
+   starts = []
+   record_chunks(engine, starts)
+   engine.import_stream(source)
+   assert starts == []
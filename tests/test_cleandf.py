@@ -3,11 +3,11 @@
 ## check .test.env START and LIMIT are set to 0 to get full df
 
 
-from importer.importer import *
+from importer.engine import *
 from datetime import datetime
 import pandas as pd
 
-def test_importer_cleaner():
+def test_importer_cleaner(importer):
 # same dataset in csv in datapath
    input_dict1= {'Name': {0: 'LesLie TErRy', 1: 'DaNnY sMitH', 2: 'andrEw waTtS', 3: 'adrIENNE bEll'}, 
                'Age': {0: '62', 1: '0' , 2: None, 3: 761}, 
@@ -0,0 +1,61 @@
+# tests/test_cli.py
+
+
+from importer.importer import *
+from importer.manager import FieldManager, SETTINGS_CACHE
+import pytest
+import subprocess
+import sys
+
+def test_config_validation():
+   config = Config(batch_size=500, username="user", password="pwd")
+   assert config[BATCH_SIZE] == 500 and config[WORKERS] == 1
+   assert config.validate() == []
+   config.update({WORKERS: 0, EXPORT_FORMAT: "xml", USERNAME: None})
+   errors = config.validate()
+   assert len(errors) == 3
+   # offline commands need no credentials
+   assert len(config.validate(connect=False)) == 2
+   # a resumed run keeps the rows committed before its checkpoint
+   assert Config(username="user", password="pwd", resume=True, clean_db=True).validate() == ["resume is not available with clean_db"]
+   assert Config(username="user", password="pwd", resume=True, async_mode=True).validate() == ["resume is not available in async mode"]
+   # the async pipeline writes from one process by bulk replaces of the chunks
+   async_config = Config(username="user", password="pwd", async_mode=True, id_index=True, cache_size=100, workers=4)
+   assert async_config.validate() == [f"{key} is not available in async mode" for key in [ID_INDEX, CACHE_SIZE, WORKERS]]
+   async_config[EXPORT_DIR] = "export"
+   assert async_config.validate() == []
+   # unacknowledged writes cannot be counted
+   assert Config(username="user", password="pwd", write_concern_w="0").validate() == ["write_concern_w must acknowledge the writes, not 0"]
+
+def test_commands(config):
+   args = get_parser().parse_args(["dry-run", "drops/*.csv.gz"])
+   dry_run = get_config(args, config.copy())
+   assert dry_run[DRY_RUN] and dry_run[TRACE_ONLY] and dry_run[SOURCE] == "drops/*.csv.gz"
+   args = get_parser().parse_args(["export", "--dir", "out", "--format", "bson"])
+   export = get_config(args, config.copy())
+   assert (export[EXPORT_DIR], export[EXPORT_FORMAT], export[SOURCE]) == ("out", "bson", config[SOURCE])
+   assert main(["--check"], Config(username="user", password="pwd"))[SOURCE] == DFT_SOURCE
+   # an async run would import the whole file again instead of resuming
+   with pytest.raises(SystemExit) as exit:
+      main(["import", "--resume", "--check"], Config(username="user", password="pwd", async_mode=True))
+   assert exit.value.code == 2
+
+def test_lazy_imports():
+   # neither pandas, pymongo nor the fields settings are loaded to parse the command line
+   code = "import sys, importer.importer; print(sorted({'pandas', 'pymongo', 'yaml'} & set(sys.modules)))"
+   output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+   assert output.strip() == "[]"
+
+def test_settings_cache(importer):
+   # fields settings are parsed once per file content
+   assert FieldManager().fields["Name"] is importer.fm.fields["Name"]
+   assert SETTINGS_CACHE[importer.fm.settings_hash] is not importer.fm.fields
+
+def test_bench_exit_code(monkeypatch):
+   # a regression reported by the benchmark is the exit code of the command
+   import importer.bench
+   monkeypatch.setattr(importer.bench, "main", lambda argv: 1 if argv == ["--compare", "previous.json"] else 0)
+   assert main(["bench", "--compare", "previous.json"]) == 1 and main(["bench"]) == 0
+   code = ("import runpy, sys, importer.bench; importer.bench.main = lambda argv: 1; "
+           "sys.argv = ['importer.py', 'bench']; runpy.run_module('importer.importer', run_name='__main__')")
+   assert subprocess.run([sys.executable, "-c", code], capture_output=True).returncode == 1
@@ -0,0 +1,36 @@
+# tests/test_client.py
+
+
+from importer.engine import *
+from importer.bench import MemoryDatabase
+
+def test_client_options(config):
+   config.update({LOAD_PROFILE: "", MAX_POOL_SIZE: 50, MIN_POOL_SIZE: None, SOCKET_TIMEOUT: 20000,
+      SERVER_SELECTION_TIMEOUT: None, COMPRESSORS: "zlib, unknown", WRITE_CONCERN_W: None, JOURNAL: None, WTIMEOUT: None})
+   engine = Engine(config)
+   # unset options keep the driver defaults, unknown compressors are skipped
+   assert engine.get_client_options() == {"maxPoolSize": 50, "socketTimeoutMS": 20000, "compressors": "zlib"}
+   assert engine.get_write_concern().document == {}
+
+def test_load_profiles(config):
+   config.update({LOAD_PROFILE: "bulk", WRITE_CONCERN_W: None, JOURNAL: None, WTIMEOUT: None})
+   engine = Engine(config)
+   assert engine.get_write_concern().document == {"w": 1, "j": False}
+   config[LOAD_PROFILE] = "incremental"
+   assert engine.get_write_concern().document == {"w": "majority", "j": True, "wtimeout": 10000}
+   # explicit settings take precedence over the profile
+   config[WRITE_CONCERN_W] = "2"
+   assert engine.get_write_concern().document == {"w": 2, "j": True, "wtimeout": 10000}
+
+def test_collection_handles(config):
+   engine = Engine(config)
+   engine.get_write_concern()
+   engine.get_client_options()
+   # settings lookups are not timed, only the connection is
+   assert "connect_db" not in engine.metrics.stages
+   assert hasattr(Engine.connect_db, "__wrapped__")
+   engine.db = MemoryDatabase()
+   assert engine.get_collection("care") is engine.get_collection("care")
+   # a new database gets new handles
+   engine.db = MemoryDatabase()
+   assert engine.get_collection("care") is engine.db["care"]
@@ -0,0 +1,88 @@
+# tests/test_controller.py
+
+
+from importer.engine import *
+from importer.bench import MemoryCollection
+from pymongo.errors import AutoReconnect, OperationFailure
+
+def test_batch_size_adaptation():
+   controller = BatchController("care", 1000, min_size=100, max_size=2000, target_latency=0.5)
+   # fast full batches grow up to the maximum
+   assert controller.update(1000, 0.1) == 1500
+   assert controller.update(1500, 0.1) == 2000
+   assert controller.update(2000, 0.1) == 2000
+   # slow batches or errors halve down to the minimum
+   assert controller.update(2000, 1.0) == 1000
+   assert controller.update(1000, 0.3, errors=1) == 500
+   for _ in range(5):
+      controller.update(500, 1.0)
+   assert controller.batch_size == 100
+   assert controller.decisions[GROW] == 2
+   assert controller.sizes == [100, 2000]
+
+def test_transient_retry():
+   controller = BatchController("care", 10, backoff=0, max_retries=2)
+   calls = []
+   def flaky():
+      calls.append(1)
+      if len(calls) < 3:
+         raise AutoReconnect("primary stepped down")
+      return "ok"
+   assert controller.call(flaky) == "ok"
+   assert controller.decisions[RETRY] == 2
+
+   # permanent errors are raised at once, transient ones after max_retries
+   def invalid():
+      raise OperationFailure("Document failed validation", code=121)
+   try:
+      controller.call(invalid)
+      assert False
+   except OperationFailure:
+      assert controller.decisions[RETRY] == 2
+   def unreachable():
+      raise AutoReconnect("no primary")
+   try:
+      controller.call(unreachable)
+      assert False
+   except AutoReconnect:
+      assert controller.decisions[GIVE_UP] == 1
+
+def test_writer_replays_batch():
+   collection = MemoryCollection("care")
+   send = collection.bulk_write
+   failures = []
+   def flaky_bulk_write(ops, ordered=True):
+      if not failures:
+         failures.append(1)
+         raise AutoReconnect("connection reset")
+      return send(ops, ordered=ordered)
+   collection.bulk_write = flaky_bulk_write
+   controller = BatchController("care", 2, backoff=0)
+   writer = BulkWriter(collection, 2, controller=controller)
+   for i in range(4):
+      writer.add({PK_ID: str(i)}, f"pk{i}")
+   writer.flush()
+   assert len(collection.documents) == 4
+   assert writer.stats[INSERTED] == 4 and writer.stats[ERRORS] == 0
+   assert controller.decisions[RETRY] == 1
+
+class Done():
+   # future of a worker partition already written
+   def __init__(self, result):
+      self.value = result
+
+   def result(self):
+      return self.value
+
+def test_worker_failures(importer, tmp_path):
+   # failed writes of the workers are returned with each partition and written once, by the run sink
+   filepath = str(tmp_path / "failed_writes.parquet")
+   importer.failures = RejectSink(filepath, "parquet")
+   for chunk in range(2):
+      failures = RejectSink(None)
+      failures.add(pd.DataFrame({PK_ID: [f"id{chunk}"], "pk": [f"pk{chunk}"]}), "care", FAILED_WRITE, "timeout", FAILED_ACTION)
+      importer.collect_partitions([Done((1, 1, {}, ({}, {}), [], failures.frames, {"care": {f"id{chunk}"}}))])
+   importer.close_reject_sink()
+   assert pd.read_parquet(filepath)[PK_ID].tolist() == ["id0", "id1"]
+   # the rows of the failed documents are left out of the views
+   assert importer.pop_unwritten() == {"care": {"id0", "id1"}}
@@ -0,0 +1,26 @@
+# tests/test_convertdf.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+import pandas as pd
+
+def test_vectorized_conversion(importer):
+   # vectorized conversion must give the same values as the scalar converters
+   input_values = {'Age': ['62', '0', None, 761, ' 7 ', '6.5', 'x', 62.9, '62'],
+                   'Billing Amount': ['1.5', None, 'abc', 3, 'nan', '33643.327286577885'],
+                   'Date of Admission': ['2019-08-20', '22-09-22', 45581, '2022-19-19', None, '2019-08-20']}
+   converters = {'int': importer.fm.convert_to_int,
+                 'float': importer.fm.convert_to_float,
+                 'date': importer.fm.convert_to_date}
+
+   for field, values in input_values.items():
+      df = pd.DataFrame({field: values}, dtype=object)
+      ftype = importer.fm.fields[field].get_param(TYPE)
+      wanted = df[field].apply(converters[ftype])
+      # numbers are held in nullable dtypes
+      wanted = wanted.astype(NULLABLE_DTYPES.get(ftype, wanted.dtype))
+      df = importer.fm.convert_df_values(df, field)
+      assert df[field].dtype == wanted.dtype
+      assert df[field].equals(wanted)
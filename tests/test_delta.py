@@ -0,0 +1,50 @@
+# tests/test_delta.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+from importer.bench import MemoryDatabase
+import pandas as pd
+
+def test_delta_manifest(importer, tmp_path):
+   importer.load_df("tests/sample_dataset.csv")
+   df = importer.clean_df()
+   jsondocs, pks = importer.fm.get_docs(df)
+   documents = jsondocs['care']
+
+   importer.manifest = DocumentManifest(str(tmp_path / "manifest.sqlite"))
+   importer.stats = {}
+   try:
+      # first run : every document is new
+      kept, kept_pks, fingerprints = importer.select_changed('care', documents, pks)
+      assert len(kept) == len(documents)
+      importer.manifest.save('care', [(document[PK_ID], fingerprint) for document, fingerprint in zip(kept, fingerprints)])
+
+      # second run : only the modified document is kept
+      df.loc[df.index[1], 'Room Number'] = 999
+      jsondocs, pks = importer.fm.get_docs(df)
+      kept, kept_pks, fingerprints = importer.select_changed('care', jsondocs['care'], pks)
+      assert [document[PK_ID] for document in kept] == [jsondocs['care'][1][PK_ID]]
+      assert importer.stats['care'][UNCHANGED] == len(documents) - 1
+   finally:
+      importer.manifest.close()
+      importer.manifest = None
+      importer.stats = {}
+
+def test_manifest_refresh(config, tmp_path):
+   config[DELTA_MODE], config[STATE_DIR] = True, str(tmp_path)
+   manifest = DocumentManifest(str(tmp_path / f"manifest_{config[DBNAME]}.sqlite"))
+   manifest.save("care", [("id0", "fp0"), ("id1", "fp1")])
+   manifest.save("billing", [("id0", "fp0")])
+   manifest.close()
+
+   # the care collection lost documents since the fingerprints were saved : they are forgotten
+   engine = Engine(config)
+   engine.db = MemoryDatabase()
+   engine.db["care"].documents = {"id0": {PK_ID: "id0"}}
+   engine.db["billing"].documents = {"id0": {PK_ID: "id0"}, "id1": {PK_ID: "id1"}}
+   engine.open_manifest()
+   assert engine.manifest.count("care") == 0
+   assert engine.manifest.get_fingerprints("billing", ["id0"]) == {"id0": "fp0"}
+   engine.manifest.close()
@@ -0,0 +1,63 @@
+# tests/test_export.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+from importer.importer import run_import
+from bson import json_util
+import bson
+import gzip
+import json
+import pandas as pd
+
+def test_export(importer, config, tmp_path):
+   csv_filepath = "tests/sample_dataset.csv"
+   saved = {key: config[key] for key in (EXPORT_DIR, EXPORT_FORMAT, EXPORT_PART_SIZE, REJECTS_FORMAT, METRICS_DIR)}
+   try:
+      for fmt in [JSONL, BSON]:
+         config[EXPORT_DIR], config[EXPORT_FORMAT], config[EXPORT_PART_SIZE] = str(tmp_path), fmt, 2
+         config[REJECTS_FORMAT], config[METRICS_DIR] = "", ""
+         importer.stats = {}
+         importer.load_df(csv_filepath)
+         importer.import_df()
+         jsondocs, pks = importer.fm.get_docs(importer.df)
+
+         directory = tmp_path / config[DBNAME]
+         manifest = json.load(open(directory / MANIFEST_FILE))
+         for document_name, documents in jsondocs.items():
+            collection = manifest["collections"][document_name]
+            assert collection["documents"] == len(documents) == importer.stats[document_name][EXPORTED]
+            assert [part["documents"] for part in collection["parts"]] == [2] * (len(documents) // 2) + [len(documents) % 2] * (len(documents) % 2)
+            if fmt == BSON:
+               # mongorestore takes the collection of a BSON part from its file name
+               assert [part["file"] for part in collection["parts"]] == [f"{n + 1:04d}/{document_name}.bson.gz" for n in range(len(collection["parts"]))]
+            exported = []
+            for part in collection["parts"]:
+               assert part["sha256"] == get_file_hash(str(directory / part["file"]))
+               data = gzip.open(directory / part["file"]).read()
+               if fmt == BSON:
+                  exported.extend(bson.decode_all(data))
+               else:
+                  exported.extend(json_util.loads(line) for line in data.decode("utf-8").splitlines())
+            assert exported == documents
+   finally:
+      config.update(saved)
+
+def test_export_chunks(config, tmp_path):
+   # rows repeated at the end of the file with another room, in a later chunk
+   source = str(tmp_path / "dataset.csv")
+   sample = pd.read_csv("tests/sample_dataset.csv", dtype=str)
+   latest = sample[:5].copy()
+   latest["Room Number"] = "999"
+   pd.concat([sample, latest], ignore_index=True).to_csv(source, index=False)
+   config.update({SOURCE: source, EXPORT_DIR: str(tmp_path), CHUNK_SIZE: 4, REJECTS_FORMAT: "", METRICS_DIR: "", VIEWS_SETTINGS: ""})
+   engine = run_import(config)
+
+   # the export is a full load : each _id is written once, with the latest row
+   directory = tmp_path / config[DBNAME]
+   manifest = json.load(open(directory / MANIFEST_FILE))
+   for document_name, collection in manifest["collections"].items():
+      exported = [json_util.loads(line) for part in collection["parts"] for line in gzip.open(directory / part["file"]).read().decode("utf-8").splitlines()]
+      ids = [document[PK_ID] for document in exported]
+      assert len(ids) == len(set(ids)) == engine.stats[document_name][EXPORTED]
@@ -0,0 +1,30 @@
+# tests/test_getdocs.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+import pandas as pd
+
+def missing_as_none(document):
+   # get_doc keeps the missing values of the row (NaN, NA, NaT), get_docs writes them as None
+   return {key: missing_as_none(value) if isinstance(value, dict) else (None if pd.isna(value) else value) for key, value in document.items()}
+
+def test_columnar_documents(importer, input_dict):
+   # columnar builder must produce the same documents as get_doc row by row
+   input_dict['Age'].update({1: '0', 3: 761})
+   input_dict['Blood Type'].update({1: 'Z-', 3: 'AB'})
+   input_dict['Insurance Provider'][2] = None
+   input_dict['Discharge Date'][2] = 'unknown'
+
+   for source in ["tests/sample_dataset.csv", input_dict]:
+      importer.load_df(source)
+      df = importer.clean_df()
+      jsondocs, pks = importer.fm.get_docs(df)
+
+      for position, (i, row) in enumerate(df.iterrows()):
+         jsondoc, pk = importer.fm.get_doc(row.to_dict())
+         assert pk == pks[position]
+         for document_name, document in jsondoc.items():
+            # repr comparison keeps key order and nan values comparable
+            assert repr(missing_as_none(document)) == repr(jsondocs[document_name][position])
@@ -0,0 +1,27 @@
+# tests/test_idindex.py
+
+
+from importer.engine import *
+from importer.bench import MemoryCollection
+
+def test_id_index_writer(tmp_path):
+   id_index = IdIndex(str(tmp_path / "ids.sqlite"))
+   collection = MemoryCollection("care")
+   collection.documents = {"a": {PK_ID: "a"}, "b": {PK_ID: "b"}}
+   assert id_index.rebuild("care", (document[PK_ID] for document in collection.find({}, {PK_ID: 1}))) == 2
+
+   # c is missing from the index but already in the collection : insert rejected, replaced
+   collection.documents["c"] = {PK_ID: "c"}
+   for ordered in [False, True]:
+      writer = BulkWriter(collection, 10, ordered=ordered, id_index=id_index)
+      for id in ["a", "c", "d", "e"]:
+         writer.add({PK_ID: id, "ordered": ordered}, id)
+      stats = writer.flush()
+      if not ordered:
+         assert stats == {**new_stats(), INSERTED: 2, UPDATED: 2}
+      else:
+         # everything is already indexed after the first run
+         assert stats == {**new_stats(), UPDATED: 4}
+      assert id_index.get_existing("care", ["a", "b", "c", "d", "e", "f"]) == {"a", "b", "c", "d", "e"}
+      assert all(collection.documents[id]["ordered"] == ordered for id in ["a", "c", "d", "e"])
+   id_index.close()
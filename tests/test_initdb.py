@@ -0,0 +1,61 @@
+# tests/test_initdb.py
+
+
+from importer.engine import *
+
+class FakeCollection():
+   def __init__(self, db, name, validator=None):
+      self.db = db
+      self.name = name
+      self.validator = validator
+
+   def options(self):
+      return {"validator": self.validator} if self.validator else {}
+
+   def create_indexes(self, indexes):
+      self.db.calls.append(("create_indexes", self.name, len(indexes)))
+
+   def count_documents(self, filter):
+      return 0
+
+class FakeDatabase(dict):
+   def __init__(self, collections):
+      super().__init__((name, FakeCollection(self, name, validator)) for name, validator in collections.items())
+      self.calls = []
+
+   def __missing__(self, name):
+      return FakeCollection(self, name)
+
+   def list_collection_names(self):
+      return list(self.keys())
+
+   def create_collection(self, name, validator=None):
+      self[name] = FakeCollection(self, name, validator)
+      self.calls.append(("create_collection", name, validator is not None))
+
+   def command(self, command, *args, **kwargs):
+      if command == "collMod":
+         self[args[0]].validator = kwargs["validator"]
+         self.calls.append(("collMod", args[0], kwargs["validationLevel"]))
+
+def test_bulk_load_initialization(importer, config):
+   saved = {key: config[key] for key in (TRACE_ONLY, CLEAN_DB, BULK_LOAD)}
+   saved_db = importer.db
+   config[TRACE_ONLY], config[CLEAN_DB], config[BULK_LOAD] = False, False, True
+   try:
+      # care : interrupted bulk load, billing : new, observation : already initialized
+      importer.db = FakeDatabase({"care": None, "observation": {"$jsonSchema": {}}})
+      importer.initialize_db()
+      assert importer.deferred == ["care", "billing"]
+      assert importer.db.calls == [("create_collection", "billing", False)]
+
+      importer.db.calls = []
+      importer.finalize_db()
+      # billing has no index
+      assert importer.db.calls == [("create_indexes", "care", len(importer.fm.get_indexes("care"))),
+                                   ("collMod", "care", VALIDATION_LEVEL),
+                                   ("collMod", "billing", VALIDATION_LEVEL)]
+      assert importer.deferred == []
+   finally:
+      config.update(saved)
+      importer.db = saved_db
@@ -3,10 +3,10 @@
 ## check .test.env START and LIMIT are set to 0 to get full df
 
 
-from importer.importer import *
+from importer.engine import *
 import pandas as pd
 
-def test_importer_loader():
+def test_importer_loader(importer):
    # same dataset in csv in datapath
     input_dict1= {'Name': {1: 'LesLie TErRy', 2: 'DaNnY sMitH', 3: 'andrEw waTtS', 4: 'adrIENNE bEll'}, 
                 'Age': {1: '62', 2: '76', 3: '28', 4: '43'}, 
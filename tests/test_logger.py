@@ -0,0 +1,54 @@
+# tests/test_logger.py
+
+
+from importer.engine import *
+from importer.logger import LOG_FORMAT, start_logging, stop_logging
+from logging.handlers import QueueHandler
+import multiprocessing
+
+def test_progress(caplog):
+   log = logging.getLogger("test_progress")
+   progress = Progress(log, interval=3600, sample_every=3)
+   progress.start(total=20)
+   with caplog.at_level(logging.INFO, logger="test_progress"):
+      for _ in range(9):
+         progress.update("care")
+      progress.update("billing", 5)
+      # no record before the interval, a line every 3 documents sampled
+      assert not caplog.records
+      assert sum(progress.is_sampled() for _ in range(9)) == 3
+      progress.report()
+   assert progress.counts == {"care": 9, "billing": 5}
+   message = caplog.records[-1].getMessage()
+   assert message.startswith("Progress : 14/20 documents (70.0%)") and "ETA" in message
+
+   progress = Progress(log, interval=0)
+   with caplog.at_level(logging.INFO, logger="test_progress"):
+      progress.update("care", 10)
+   assert caplog.records[-1].getMessage().startswith("Progress : 10 documents,")
+   assert not Progress(log).is_sampled()
+
+def log_in_worker():
+   logging.getLogger("worker").warning("from worker %d", os.getpid())
+
+def test_queue_logging(tmp_path):
+   filename = str(tmp_path / "run.log")
+   root = logging.getLogger()
+   level = root.level
+   listener = start_logging(filename, logging.INFO, LOG_FORMAT)
+   try:
+      assert any(isinstance(handler, QueueHandler) for handler in root.handlers)
+      logging.getLogger("test").debug("not formatted %s", object())
+      logging.getLogger("test").info("queued %d", 1)
+      # a forked worker has no listener thread, it writes to the file directly
+      worker = multiprocessing.get_context("fork").Process(target=log_in_worker)
+      worker.start()
+      worker.join()
+   finally:
+      stop_logging()
+      root.setLevel(level)
+   assert not any(isinstance(handler, QueueHandler) for handler in root.handlers)
+   lines = open(filename).read().splitlines()
+   assert any(line.endswith("INFO - queued 1") for line in lines)
+   assert any(f"from worker {worker.pid}" in line for line in lines)
+   assert not any("not formatted" in line for line in lines)
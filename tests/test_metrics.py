@@ -0,0 +1,82 @@
+# tests/test_metrics.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+import json
+import threading
+
+def test_run_metrics(importer, tmp_path, input_dict):
+
+   importer.metrics = RunMetrics()
+   importer.load_df(input_dict)
+   importer.clean_df()
+   importer.make_unic_df()
+   for seconds in [0.1, 0.2, 0.3, 0.4]:
+      importer.metrics.record_write("care", seconds, 10)
+
+   report = importer.metrics.get_report()
+   assert list(report["stages"]) == ["load_df", "clean_df", "make_unic_df"]
+   assert report["stages"]["clean_df"][ROWS] == 4
+   assert report["stages"]["clean_df"][CALLS] == 1
+   assert report["writes"]["care"]["documents"] == 40
+   assert report["writes"]["care"]["latency_s"]["p50"] == 0.2
+   assert report["writes"]["care"]["max_s"] == 0.4
+
+   importer.metrics.write_json(str(tmp_path / "metrics.json"))
+   assert json.load(open(tmp_path / "metrics.json"))["writes"]["care"]["calls"] == 4
+   prom = importer.metrics.write_prometheus(str(tmp_path / PROM_FILE), {"care": new_stats()})
+   lines = open(prom).read().splitlines()
+   assert 'importer_stage_rows{stage="clean_df"} 4' in lines
+   assert 'importer_write_latency_seconds{collection="care",quantile="0.5"} 0.2' in lines
+   assert 'importer_documents{collection="care",operation="inserted"} 0' in lines
+
+def test_thread_stage_cpu():
+   # a stage waiting in a thread is not charged with the CPU spent meanwhile by the main thread
+   class Stages():
+      df = None
+      metrics = RunMetrics()
+
+      @timed_stage("wait")
+      def wait(self, event):
+         event.wait(5)
+
+   stages = Stages()
+   event = threading.Event()
+   thread = threading.Thread(target=stages.wait, args=(event,))
+   thread.start()
+   started = time.perf_counter()
+   while time.perf_counter() - started < 0.2:
+      pass
+   event.set()
+   thread.join()
+   stage = stages.metrics.stages["wait"]
+   assert stage[WALL] >= 0.2 and stage[CPU] < 0.1
+
+def test_nested_stages():
+   # a stage run by another one is counted once, in the outer stage, database stages count no rows
+   class Stages():
+      df = [1, 2, 3]
+      metrics = RunMetrics()
+
+      @timed_stage("write_df")
+      def inner(self):
+         return len(self.df)
+
+      @timed_stage("upsert_rows")
+      def outer(self):
+         return self.inner()
+
+      @timed_stage("connect_db", data=False)
+      def connect(self):
+         pass
+
+   stages = Stages()
+   stages.outer()
+   stages.connect()
+   assert list(stages.metrics.stages) == ["upsert_rows", "connect_db"]
+   assert stages.metrics.stages["upsert_rows"][ROWS] == 3
+   assert stages.metrics.stages["connect_db"][ROWS] == 0
+   stages.inner()
+   assert stages.metrics.stages["write_df"][CALLS] == 1
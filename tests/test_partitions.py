@@ -0,0 +1,69 @@
+# tests/test_partitions.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+from array import array
+import pandas as pd
+
+class Done():
+   # future of a worker partition already written
+   def __init__(self, result):
+      self.value = result
+
+   def result(self):
+      return self.value
+
+class Executor():
+   # records the partitions instead of sending them to worker processes
+   def __init__(self):
+      self.parts = []
+
+   def submit(self, function, config, part):
+      self.parts.append(part)
+      return Done(None)
+
+def sample_rows(count):
+   # rows of the sample dataset repeated with distinct names
+   sample = pd.read_csv("tests/sample_dataset.csv", dtype=str)
+   rows = pd.concat([sample] * (count // len(sample)), ignore_index=True)
+   rows["Name"] = [f"{name} {i}" for i, name in enumerate(rows["Name"])]
+   return rows.to_dict()
+
+def test_partitions(importer):
+   importer.load_df(sample_rows(200))
+   importer.clean_df()
+   importer.make_unic_df()
+   parts = importer.partition_df(3)
+   assert len(parts) == 3 and all(len(part) for part in parts)
+
+   # disjoint partitions covering every row, each _id in exactly one of them
+   index = [label for part in parts for label in part.index]
+   assert sorted(index) == sorted(importer.df.index)
+   all_docs = importer.fm.get_docs(importer.df)[0]
+   for document_name, documents in all_docs.items():
+      ids = [{document[PK_ID] for document in importer.fm.get_docs(part)[0][document_name]} for part in parts]
+      assert sum(len(part_ids) for part_ids in ids) == len(set.union(*ids)) == len({document[PK_ID] for document in documents})
+
+   importer.cfg[WORKERS] = 3
+   executor = Executor()
+   assert len(importer.submit_partitions(executor)) == 3
+   assert [len(part) for part in executor.parts] == [len(part) for part in parts]
+
+def test_collect_partitions(importer):
+   importer.stats = {"care": {**new_stats(), INSERTED: 1}}
+   importer.metrics = RunMetrics()
+   importer.metrics.merge_latencies({"care": array("d", [0.5])}, {"care": 10})
+   worker_stats = [{"care": {**new_stats(), INSERTED: 5, UPDATED: 2, ERRORS: 1}, "billing": {**new_stats(), INSERTED: 7}},
+                   {"care": {**new_stats(), INSERTED: 3, INVALID: 1}}]
+   futures = [Done((101, 8, worker_stats[0], ({"care": array("d", [0.1, 0.2])}, {"care": 8}), [], [], {})),
+              Done((102, 4, worker_stats[1], ({"care": array("d", [0.3])}, {"care": 4}), [], [], {"care": {"id1"}}))]
+   importer.collect_partitions(futures)
+
+   assert importer.stats["care"] == {**new_stats(), INSERTED: 9, UPDATED: 2, ERRORS: 1, INVALID: 1}
+   assert importer.stats["billing"] == {**new_stats(), INSERTED: 7}
+   assert list(importer.metrics.latencies["care"]) == [0.5, 0.1, 0.2, 0.3]
+   assert importer.metrics.documents == {"care": 22}
+   assert importer.progress.counts == {"care": 12, "billing": 8}
+   assert importer.unwritten == {"care": {"id1"}}
@@ -0,0 +1,26 @@
+# tests/test_rejects.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+import pandas as pd
+
+def test_reject_sink(importer, tmp_path, input_dict):
+   input_dict['Age'][1] = '0'
+   input_dict['Gender'][1] = 'Unknown'
+
+   filepath = str(tmp_path / "rejects.csv")
+   importer.fm.reject_sink = RejectSink(filepath)
+   try:
+      importer.load_df(input_dict)
+      importer.clean_df()
+      assert importer.fm.reject_sink.close() == 2
+   finally:
+      importer.fm.reject_sink = None
+
+   rejects = pd.read_csv(filepath, dtype=str)
+   assert rejects[ROW].tolist() == ['1', '1']
+   assert rejects[FIELD].tolist() == ['Age', 'Gender']
+   assert rejects[ACTION].tolist() == ['replaced', 'excluded']
+   assert rejects[FUNCTION].tolist() == ['is_inrange', 'is_in']
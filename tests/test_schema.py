@@ -0,0 +1,69 @@
+# tests/test_schema.py
+
+
+from importer.engine import *
+from importer.schema import compile_node
+from importer.bench import generate_dataset
+from importer import importer as cli
+import pytest
+
+def test_schema_validator(importer):
+   validator = SchemaValidator("care", importer.fm.build_mongodb_schema()["care"])
+   document = {PK_ID: "a1",
+               "patient": {"name": "Jane", "age": 42, "gender": "Female", "bloodType": "A+"},
+               "admission": {"dateOfAdmission": pd.Timestamp("2024-01-02"), "doctor": "Doe", "hospital": "Kim Inc",
+                             "roomNumber": 101, "admissionType": "Urgent", "dischargeDate": datetime(2024, 1, 5)}}
+   assert validator.validate(document) == []
+
+   document["patient"]["age"] = None
+   document["admission"]["roomNumber"] = 2 ** 40
+   document["admission"]["dischargeDate"] = pd.NaT
+   del document["patient"]["gender"]
+   errors = dict(validator.validate(document))
+   assert sorted(errors) == ["admission.dischargeDate", "admission.roomNumber", "patient.age", "patient.gender"]
+   assert errors["patient.gender"] == "required field missing"
+   assert sorted(validator.validate({PK_ID: 1})) == [(PK_ID, "bsonType string expected, not int"), ("admission", "required field missing"), ("patient", "required field missing")]
+
+   assert validator.validate_batch([document, {}]).keys() == {0, 1}
+   assert (validator.count, validator.invalid) == (2, 2)
+   check = compile_node({"bsonType": ["double", "null"]})
+   assert check(None, []) == [] and check(1.5, []) == [] and check(True, [])
+   with pytest.raises(ValueError):
+      compile_node({"properties": {"id": {"bsonType": "uuid"}}})
+
+def test_schema_check(importer, tmp_path):
+   source = str(tmp_path / "dataset.csv")
+   generate_dataset(source, 300, duplicate_ratio=0, invalid_ratio=0.1, seed=4)
+   importer.load_df(source)
+   importer.clean_df()
+   importer.make_unic_df()
+   importer.cfg[TRACE_ONLY] = True
+   importer.fm.reject_sink = RejectSink(None)
+   importer.write_df()
+
+   # missing required values are caught before anything is sent
+   stats = importer.stats
+   assert stats["care"][INVALID] > 0 and stats["billing"][INVALID] > 0
+   for document_name in importer.validators:
+      assert stats[document_name][SKIPPED] + stats[document_name][INVALID] == len(importer.df)
+   rejects = pd.concat(importer.fm.reject_sink.frames)
+   assert set(rejects[FUNCTION]) == {JSON_SCHEMA_CHECK}
+   assert len(rejects) >= stats["care"][INVALID] + stats["billing"][INVALID]
+   assert set(rejects[ROW]) <= set(importer.df.index)
+   assert "care.patient.age" in set(rejects[FIELD]) and PK_ID not in rejects.columns
+
+   importer.cfg[SCHEMA_CHECK] = False
+   importer.stats = {}
+   importer.write_df()
+   assert importer.stats["care"][SKIPPED] == len(importer.df)
+
+def test_validate_command(config, tmp_path, capsys):
+   source = str(tmp_path / "dataset.csv")
+   generate_dataset(source, 200, invalid_ratio=0, seed=5)
+   config[REJECTS_FORMAT], config[METRICS_DIR], config[STATE_DIR] = "", str(tmp_path), str(tmp_path)
+   cli.main(["validate", source], config)
+   assert "invalid" in capsys.readouterr().out
+   generate_dataset(source, 200, invalid_ratio=0.1, seed=5)
+   with pytest.raises(SystemExit) as exit:
+      cli.main(["validate", source], config.copy())
+   assert exit.value.code == 1
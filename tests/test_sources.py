@@ -0,0 +1,53 @@
+# tests/test_sources.py
+
+
+from importer.engine import *
+from importer.bench import generate_dataset
+import pandas as pd
+
+def write_sources(tmp_path):
+   source = str(tmp_path / "dataset.csv")
+   generate_dataset(source, 300, duplicate_ratio=0.1, invalid_ratio=0.1, seed=2)
+   df = pd.read_csv(source, dtype=str)
+   # a later file updates rows of an earlier one
+   update = df.iloc[:20].copy()
+   update["Medication"] = "Aspirin"
+   parts = [df.iloc[:100], df.iloc[100:300], update]
+   directory = tmp_path / "drops"
+   directory.mkdir()
+   for i, (part, ext) in enumerate(zip(parts, [".csv", ".csv.gz", ".csv"])):
+      part.to_csv(directory / f"day_{i}{ext}", index=False)
+   (directory / "readme.txt").write_text("not a CSV")
+   return str(directory), pd.concat(parts, ignore_index=True)
+
+def load_sources(importer, source, workers):
+   importer.cfg[WORKERS], importer.cfg[REJECTS_FORMAT], importer.cfg[START], importer.cfg[LIMIT] = workers, "", 0, 0
+   importer.file_stats = []
+   return importer.load_sources(source), importer.file_stats
+
+def test_multiple_sources(importer, tmp_path):
+   directory, merged = write_sources(tmp_path)
+   assert [os.path.basename(path) for path in get_source_files(directory)] == ["day_0.csv", "day_1.csv.gz", "day_2.csv"]
+   assert get_source_files(os.path.join(directory, "day_*.csv")) == [os.path.join(directory, "day_0.csv"), os.path.join(directory, "day_2.csv")]
+
+   df, stats = load_sources(importer, directory, 1)
+   assert importer.cleaned
+   assert [stat[LOADED] for stat in stats] == [100, 200, 20]
+   # the rows of the last file supersede their first version
+   assert stats[2][KEPT] == stats[2][LOADED] - stats[2][EXCLUDED] - stats[2][DUPLICATES]
+   assert stats[0][SUPERSEDED] > 0
+   assert sum(stat[KEPT] for stat in stats) == len(df)
+
+   # same rows as the cleaning of the concatenated files, latest version kept
+   importer.load_df(merged)
+   importer.clean_df()
+   expected = importer.make_unic_df()
+   key = importer.fm.get_id_field("care")
+   assert sorted(df[key]) == sorted(expected[key])
+   medication = dict(zip(expected[key], expected["Medication"].astype(str)))
+   assert all(medication[k] == m for k, m in zip(df[key], df["Medication"].astype(str)))
+
+   # files cleaned in worker processes give the same frame
+   parallel, parallel_stats = load_sources(importer, directory, 2)
+   assert parallel_stats == stats
+   assert parallel[key].tolist() == df[key].tolist()
@@ -0,0 +1,34 @@
+# tests/test_streamdf.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+import pandas as pd
+
+def test_importer_stream(importer, config):
+   csv_filepath = "tests/sample_dataset.csv"
+   saved = {key: config[key] for key in (START, LIMIT, CHUNK_SIZE)}
+   try:
+      # chunks must rebuild the full load, row labels included
+      config[START], config[LIMIT], config[CHUNK_SIZE] = 1, 2, 1
+      loaded_df = importer.load_df(csv_filepath)
+      chunks = list(importer.iter_chunks(csv_filepath))
+      assert len(chunks) == 2
+      # categories are chunk specific, values are compared
+      assert pd.concat(chunks).astype(object).equals(loaded_df.astype(object))
+
+      # a row already seen in a previous chunk is reported as duplicate
+      config[START], config[LIMIT], config[CHUNK_SIZE] = 0, 0, 2
+      importer.seen_keys = set()
+      counts = []
+      for chunk in importer.iter_chunks(csv_filepath):
+         importer.df = chunk
+         importer.clean_df()
+         counts.append(importer.mark_seen_keys())
+      importer.df = chunks[0]
+      importer.clean_df()
+      counts.append(importer.mark_seen_keys())
+      assert counts == [0, 0, 1]
+   finally:
+      config.update(saved)
@@ -0,0 +1,28 @@
+# tests/test_unicdf.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+import hashlib
+
+def test_key_columns(importer):
+   csv_filepath = "tests/sample_dataset.csv"
+   importer.load_df(csv_filepath)
+   count_rows = len(importer.clean_df())
+
+   # first row duplicated at the end of the file, latest is retained
+   df = importer.load_df(csv_filepath)
+   importer.df = pd.concat([df, df.iloc[[0]]], ignore_index=True)
+   importer.clean_df()
+   df = importer.make_unic_df()
+   assert len(df) == count_rows
+   assert 0 not in df.index
+   assert df[importer.fm.get_id_field('care')].is_unique
+
+   # key columns are the _id of the documents
+   jsondocs, pks = importer.fm.get_docs(df)
+   for position, pk in enumerate(pks):
+      assert pk == df['_id_care' + KEY_SUFFIX].iloc[position]
+      for document_name, documents in jsondocs.items():
+         assert documents[position][PK_ID] == hashlib.sha256(pk.encode("utf-8")).hexdigest()
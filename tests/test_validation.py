@@ -0,0 +1,40 @@
+# tests/test_validation.py
+### !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+## check .test.env START and LIMIT are set to 0 to get full df
+
+
+from importer.engine import *
+import pandas as pd
+
+def test_validation_plan(importer, input_dict):
+   input_dict['Age'].update({1: '0', 2: None, 3: 761})
+   input_dict['Gender'].update({1: 'Unknown', 2: 'female'})
+   input_dict['Blood Type'].update({1: 'Z-', 3: 'AB'})
+   input_dict['Date of Admission'].update({1: '22-09-22', 2: 45581, 3: '2022-19-19'})
+
+   # field by field cleaning, as reference
+   wanted = importer.load_df(input_dict).copy()
+   for fieldname in importer.fm.fields:
+      if not fieldname.startswith(PK_ID):
+         importer.fm.convert_df_values(wanted, fieldname)
+         importer.fm.apply_mask(wanted, fieldname)
+
+   rejects = []
+   class Sink():
+      def add(self, rows, fieldname, mask_func, reason, action):
+         rejects.append((fieldname, rows.index.tolist(), action))
+
+   importer.load_df(input_dict)
+   importer.fm.reject_sink = Sink()
+   try:
+      df = importer.clean_df()
+   finally:
+      importer.fm.reject_sink = None
+
+   assert df.equals(wanted)
+   assert df.index.tolist() == [0]
+   # row 1 and 2 are excluded on Gender, so not counted again on Date of Admission
+   assert rejects == [('Age', [1, 2, 3], 'replaced'),
+                      ('Gender', [1, 2], 'excluded'),
+                      ('Blood Type', [3], 'replaced'),
+                      ('Date of Admission', [3], 'excluded')]
@@ -0,0 +1,135 @@
+# tests/test_views.py
+
+
+from importer.engine import *
+from importer.bench import generate_dataset
+import pandas as pd
+import pytest
+
+class ViewCollection():
+   # applies the $inc / $setOnInsert upserts and the deletion of empty groups of the views
+   def __init__(self):
+      self.documents = {}
+
+   def bulk_write(self, operations, ordered=True):
+      for op in operations:
+         if isinstance(op, DeleteMany):
+            self.documents = {key: doc for key, doc in self.documents.items() if doc[ROWS] > 0}
+            continue
+         key = json.dumps(op._filter[PK_ID])
+         document = self.documents.setdefault(key, {PK_ID: op._filter[PK_ID], **op._doc["$setOnInsert"]})
+         for name, value in op._doc["$inc"].items():
+            document[name] = document.get(name, 0) + value
+
+class FailingCollection(ViewCollection):
+   # rejects the first group update of a bulk
+   def bulk_write(self, operations, ordered=True):
+      raise BulkWriteError({"nUpserted": 0, "nMatched": 0, "writeErrors": [{"index": 0, "code": 121, "errmsg": "failed validation"}]})
+
+class ViewDatabase(dict):
+   def __missing__(self, name):
+      self[name] = ViewCollection()
+      return self[name]
+
+   def get_collection(self, name, **options):
+      return self[name]
+
+   def drop_collection(self, name):
+      self.pop(name, None)
+
+def open_engine(config, tmp_path, db):
+   config[STATE_DIR], config[TRACE_ONLY], config[CLEAN_DB], config[VIEWS_SETTINGS] = str(tmp_path), False, False, DFT_VIEWS_SETTINGS
+   engine = Engine(config)
+   engine.db = db
+   engine.open_views()
+   return engine
+
+def get_clean_df(engine, df):
+   engine.load_df(df)
+   engine.clean_df()
+   return engine.make_unic_df()
+
+def get_billing(db):
+   return {doc[PK_ID]["insuranceProvider"]: (doc[ROWS], round(doc["totalBilling"], 2))
+           for doc in db["billingByInsurance"].documents.values()}
+
+def expected_billing(df):
+   groups = df.groupby("Insurance Provider", observed=True)["Billing Amount"]
+   return {str(provider): (len(values), round(float(values.sum()), 2)) for provider, values in groups}
+
+def test_views_deltas(config, tmp_path):
+   source = str(tmp_path / "dataset.csv")
+   generate_dataset(source, 200, duplicate_ratio=0, invalid_ratio=0, seed=3)
+   raw = pd.read_csv(source, dtype=str)
+   db = ViewDatabase()
+
+   engine = open_engine(config, tmp_path, db)
+   df = get_clean_df(engine, raw)
+   engine.update_views(df)
+   assert get_billing(db) == expected_billing(df)
+   admissions = db["admissionsByHospital"].documents.values()
+   assert sum(doc[ROWS] for doc in admissions) == len(df)
+   engine.close_views()
+
+   # same rows again : no group changes
+   engine = open_engine(config, tmp_path, db)
+   assert "billingByInsurance" in db
+   engine.update_views(get_clean_df(engine, raw))
+   assert engine.views.stats["billingByInsurance"] == {GROUPS: 0, CHANGED: 0, FAILED: 0}
+   engine.close_views()
+
+   # rows moving to another group : deltas only, the emptied group is deleted
+   provider = raw["Insurance Provider"].iloc[0]
+   changed = raw[raw["Insurance Provider"] == provider].copy()
+   changed["Insurance Provider"] = "Nobody"
+   changed["Billing Amount"] = "100.0"
+   engine = open_engine(config, tmp_path, db)
+   engine.update_views(get_clean_df(engine, changed))
+   assert engine.views.stats["billingByInsurance"][CHANGED] == len(changed)
+   engine.close_views()
+   updated = get_clean_df(engine, pd.concat([raw[raw["Insurance Provider"] != provider], changed]))
+   billing = get_billing(db)
+   assert provider not in billing
+   assert billing == expected_billing(updated)
+
+   # without stored contributions the view is rebuilt
+   os.remove(tmp_path / f"views_{config[DBNAME]}.sqlite")
+   engine = open_engine(config, tmp_path, db)
+   assert "billingByInsurance" not in db
+   engine.close_views()
+
+def test_views_written_rows(config, tmp_path):
+   source = str(tmp_path / "dataset.csv")
+   generate_dataset(source, 50, duplicate_ratio=0, invalid_ratio=0, seed=4)
+   db = ViewDatabase()
+   engine = open_engine(config, tmp_path, db)
+   df = engine.fm.add_key_columns(get_clean_df(engine, pd.read_csv(source, dtype=str)))
+
+   # the rows whose care document was not written are left out of the views
+   failed = df[engine.fm.get_id_field("care")].iloc[:5].tolist()
+   engine.unwritten = {"care": set(failed[:3])}
+   engine.get_writer("care").failed_ids.update(failed[3:])
+   engine.update_views(df)
+   assert sum(doc[ROWS] for doc in db["admissionsByHospital"].documents.values()) == len(df) - 5
+   assert engine.views.store.count("admissionsByHospital") == len(df) - 5
+   assert engine.unwritten == {} and not engine.writers["care"].failed_ids
+
+   # a failed view update is reported, its contributions are not stored
+   engine.collections["conditionsByTestResults"] = FailingCollection()
+   engine.update_views(df)
+   assert engine.views.stats["conditionsByTestResults"][FAILED] == 5
+   assert engine.views.store.count("conditionsByTestResults") == len(df) - 5
+   engine.close_views()
+
+def test_views_settings(config):
+   fields = FieldManager().fields
+   with pytest.raises(ValueError):
+      View("wrong", {GROUP_BY: ["Billing Amount"]}, fields)
+   with pytest.raises(ValueError):
+      View("wrong", {GROUP_BY: ["Hospital"], MEASURES: {"total": {MEASURE_FUNCTION: SUM, MEASURE_FIELD: "Hospital"}}}, fields)
+   with pytest.raises(ValueError):
+      View("wrong", {GROUP_BY: ["Hospital"], VIEW_COLLECTION: "patients"}, fields, ["care", "billing"])
+   view = View("byGender", {GROUP_BY: ["Gender"], MEASURES: {"ages": {MEASURE_FUNCTION: SUM, MEASURE_FIELD: "Age"}}}, fields)
+   assert [name for name, _, _ in view.measures] == [ROWS, "ages"]
+   assert view.collection == DFT_VIEW_COLLECTION
+   assert View("byHospital", {GROUP_BY: ["Hospital"], VIEW_COLLECTION: "billing"}, fields, ["care", "billing"]).collection == "billing"
@@ -0,0 +1,90 @@
+# tests/test_writer.py
+
+
+from importer.engine import *
+from pymongo.errors import AutoReconnect, BulkWriteError
+from pymongo.results import BulkWriteResult
+
+class StubCollection():
+   # answers each bulk_write with the next result, raised when it is an exception
+   def __init__(self, results):
+      self.name = "care"
+      self.results = results
+      self.sent = []
+
+   def bulk_write(self, ops, ordered=True):
+      self.sent.append(([op._filter[PK_ID] for op in ops], ordered))
+      result = self.results.pop(0)
+      if isinstance(result, Exception):
+         raise result
+      return result
+
+class Manifest():
+   # fingerprints saved for the documents written
+   def __init__(self):
+      self.saved = []
+
+   def save(self, name, fingerprints):
+      self.saved.extend(id for id, fingerprint in fingerprints)
+
+class Failures():
+   # documents not written, as sent to the failures sink
+   def __init__(self):
+      self.ids = []
+
+   def add(self, rows, fieldname, mask_func, reason, action):
+      self.ids.extend(rows[PK_ID])
+
+def bulk_error(errors, upserted=0, matched=0):
+   return BulkWriteError({"nUpserted": upserted, "nMatched": matched,
+                          "writeErrors": [{"index": index, "code": 121, "errmsg": f"failed validation {index}"} for index in errors]})
+
+def make_writer(results, ordered, batch_size=5):
+   collection = StubCollection(results)
+   writer = BulkWriter(collection, batch_size, ordered=ordered, manifest=Manifest(), failures=Failures())
+   return writer, collection
+
+def add_documents(writer, count):
+   for i in range(count):
+      writer.add({PK_ID: f"id{i}"}, f"pk{i}", f"fp{i}")
+
+def test_bulk_result():
+   writer, collection = make_writer([BulkWriteResult({"nUpserted": 2, "nMatched": 1, "upserted": []}, True),
+                                     BulkWriteResult({"nUpserted": 1, "nMatched": 1, "upserted": []}, True)], True, batch_size=3)
+   add_documents(writer, 5)
+   writer.flush()
+   assert [ids for ids, ordered in collection.sent] == [["id0", "id1", "id2"], ["id3", "id4"]]
+   assert writer.stats == {**new_stats(), INSERTED: 3, UPDATED: 2}
+   assert writer.manifest.saved == [f"id{i}" for i in range(5)] and writer.failures.ids == []
+
+def test_ordered_bulk_error():
+   # the first operation is written, the second fails, the 3 following ones are not sent
+   writer, collection = make_writer([bulk_error([1], upserted=1)], True)
+   add_documents(writer, 5)
+   assert collection.sent == [(["id0", "id1", "id2", "id3", "id4"], True)]
+   assert writer.stats == {**new_stats(), INSERTED: 1, ERRORS: 4}
+   # only the written documents get a fingerprint
+   assert writer.manifest.saved == ["id0"]
+   assert writer.failures.ids == ["id1", "id2", "id3", "id4"]
+   assert writer.last_error == "failed validation 1"
+
+   # an ordered error at the last operation leaves nothing unsent
+   writer, collection = make_writer([bulk_error([2], upserted=2)], True, batch_size=3)
+   add_documents(writer, 3)
+   assert writer.stats == {**new_stats(), INSERTED: 2, ERRORS: 1}
+   assert writer.manifest.saved == ["id0", "id1"] and writer.failures.ids == ["id2"]
+
+def test_unordered_bulk_error():
+   # every operation is sent, only the failing ones are not written
+   writer, collection = make_writer([bulk_error([1, 3], upserted=2, matched=1)], False)
+   add_documents(writer, 5)
+   assert collection.sent == [(["id0", "id1", "id2", "id3", "id4"], False)]
+   assert writer.stats == {**new_stats(), INSERTED: 2, UPDATED: 1, ERRORS: 2}
+   assert writer.manifest.saved == ["id0", "id2", "id4"]
+   assert writer.failures.ids == ["id1", "id3"]
+
+def test_batch_failure():
+   writer, collection = make_writer([AutoReconnect("no primary")], True, batch_size=4)
+   add_documents(writer, 4)
+   assert writer.stats == {**new_stats(), ERRORS: 4}
+   assert writer.manifest.saved == [] and writer.failures.ids == ["id0", "id1", "id2", "id3"]